@@ -0,0 +1,187 @@
+"""
+Admission control and load shedding.
+
+Every routed request belongs to a class: analyst (/api/analyst/...), read
+(GET) or write. Each class has a per-worker concurrency limit, a bounded
+wait queue and a deadline (ADMISSION_<CLASS>=limit,queue,deadline_ms). A
+request that finds the queue full, or waits past the deadline, gets 503
+with Retry-After instead of piling up behind a slow database. A request
+whose pool wait passes DB_POOL_TIMEOUT is turned into the same 503.
+
+Expensive endpoints (analyst aggregates, bulk operations) also have
+per-client token buckets (RATE_LIMIT_<BUCKET>=per_minute,burst); over the
+limit they get 429 with Retry-After. Clients are keyed by request.remote_addr,
+which honours X-Forwarded-For only for TRUSTED_PROXY_HOPS proxies (app.py);
+ids in the query or body are client-supplied and never used. Limits are per
+worker process.
+"""
+import math
+import os
+import threading
+import time
+from flask import g, jsonify, request
+from cache import TTLCache
+from db import POOL_TIMEOUT_KEY, release_connections
+from metrics import ADMISSION_REJECTED
+
+
+def _triple(name, default):
+    limit, queue, deadline_ms = (int(v) for v in os.getenv(name, default).split(","))
+    return limit, queue, deadline_ms / 1000
+
+
+def _pair(name, default):
+    per_minute, burst = (float(v) for v in os.getenv(name, default).split(","))
+    return per_minute / 60, burst
+
+
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "1") == "1"
+CLASSES = {
+    "read": _triple("ADMISSION_READ", "64,256,2000"),
+    "write": _triple("ADMISSION_WRITE", "32,128,3000"),
+    "analyst": _triple("ADMISSION_ANALYST", "4,16,5000"),
+}
+BUCKETS = {
+    "analyst": _pair("RATE_LIMIT_ANALYST", "60,20"),
+    "bulk": _pair("RATE_LIMIT_BULK", "20,5"),
+}
+RATE_LIMITED = {
+    "/api/analyst/query": "analyst",
+    "/api/analyst/export/<dataset>": "analyst",
+    "/api/analyst/trends": "analyst",
+    "/api/analyst/funnel": "analyst",
+    "/api/analyst/cohorts": "analyst",
+    "/api/analyst/active-students": "analyst",
+    "/api/analyst/grade-histogram": "analyst",
+    "/api/batch": "bulk",
+    "/api/admin/stats/recount": "bulk",
+    "/api/admin/analytics/refresh": "bulk",
+}
+# Probes, scrapes and long-lived streams are never queued
+EXEMPT = {"/api/health", "/api/metrics", "/api/events", "/api/admin/profiles/<name>"}
+RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+_SLOT_KEY = "app.admission"
+
+
+class Gate:
+    """Concurrency limit with a bounded, deadline-limited wait queue"""
+
+    def __init__(self, limit, max_waiting, deadline):
+        self.slots = threading.BoundedSemaphore(limit)
+        self.max_waiting = max_waiting
+        self.deadline = deadline
+        self.waiting = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        """None once admitted, else the rejection reason"""
+        if self.slots.acquire(blocking=False):
+            return None
+        with self._lock:
+            if self.waiting >= self.max_waiting:
+                return "queue_full"
+            self.waiting += 1
+        try:
+            return None if self.slots.acquire(timeout=self.deadline) else "deadline"
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+    def leave(self):
+        self.slots.release()
+
+
+class TokenBuckets:
+    """Per-key token buckets; idle keys expire from the cache"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._state = TTLCache(ttl=max(60, burst / rate * 2), maxsize=50000)
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """0 if a token was taken, else seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._state.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self._state.set(key, (tokens - 1, now))
+                return 0
+            self._state.set(key, (tokens, now))
+            return (1 - tokens) / self.rate
+
+
+_gates = {name: Gate(*settings) for name, settings in CLASSES.items()}
+_buckets = {name: TokenBuckets(*settings) for name, settings in BUCKETS.items()}
+
+
+def route_class(rule, method):
+    if rule.startswith("/api/analyst/"):
+        return "analyst"
+    return "read" if method in ("GET", "HEAD") else "write"
+
+
+def _client_key():
+    return f"addr:{request.remote_addr}"
+
+
+def _reject(status, message, retry_after, klass, reason):
+    ADMISSION_REJECTED.labels(klass, reason).inc()
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def admit():
+    rule = request.url_rule.rule if request.url_rule is not None else None
+    if rule is None or rule in EXEMPT:
+        return None
+    klass = route_class(rule, request.method)
+
+    bucket = RATE_LIMITED.get(rule)
+    if bucket:
+        wait = _buckets[bucket].take((bucket, _client_key()))
+        if wait:
+            return _reject(429, "Rate limit exceeded, retry later", wait, klass, "rate_limited")
+
+    # /api/batch sub-requests run inside the outer request's slot
+    if g.get("_admission_held"):
+        return None
+    gate = _gates[klass]
+    reason = gate.enter()
+    if reason:
+        return _reject(503, "Server busy, retry shortly", RETRY_AFTER, klass, reason)
+    g._admission_held = True
+    request.environ[_SLOT_KEY] = gate
+    return None
+
+
+def shed_pool_timeouts(response):
+    """Turn a route's error from an exhausted pool wait into 503 + Retry-After"""
+    if request.environ.get(POOL_TIMEOUT_KEY):
+        rule = request.url_rule.rule if request.url_rule is not None else ""
+        return _reject(503, "Database busy, retry shortly", RETRY_AFTER,
+                       route_class(rule, request.method), "pool_timeout")
+    return response
+
+
+def release(exc=None):
+    gate = request.environ.pop(_SLOT_KEY, None)
+    if gate is not None:
+        # Hand the request's connections back before admitting the next one
+        release_connections()
+        g.pop("_admission_held", None)
+        gate.leave()
+
+
+def init_app(app):
+    """Install admission control; with ADMISSION_CONTROL=0 only pool timeouts become 503s"""
+    app.after_request(shed_pool_timeouts)
+    if not ADMISSION_CONTROL:
+        return
+    app.before_request(admit)
+    app.teardown_request(release)
@@ -0,0 +1,477 @@
+import os
+import threading
+from datetime import date, timedelta
+import numpy as np
+import psycopg2
+import jobs
+from db import connection_params, get_connection
+
+# Ad-hoc analyst questions are answered from an in-process columnar copy of
+# enrolled_in, course and university rather than by new SQL routes. Each
+# worker loads its snapshot in the background at startup (warm(), or on the
+# first query with ANALYTICS_SNAPSHOT_WARM=0) and then only pulls rows
+# changed since (enrolled_in.updated_at plus enrolled_in_deleted).
+ANALYTICS_SNAPSHOT_SECONDS = int(os.getenv("ANALYTICS_SNAPSHOT_SECONDS", "60"))
+ANALYTICS_SNAPSHOT_WARM = os.getenv("ANALYTICS_SNAPSHOT_WARM", "1") == "1"
+# Rows committed late can carry an older updated_at; re-read this far back
+SNAPSHOT_OVERLAP_SECONDS = 300
+# Deletion log retention. A snapshot older than this reloads in full.
+DELETED_RETENTION_SECONDS = 86400
+FETCH_BATCH = 10000
+QUERY_MAX_ROWS = 5000
+
+NULL_DAY = np.iinfo(np.int32).min
+EPOCH = date(1970, 1, 1)
+
+
+class QueryError(ValueError):
+    """Invalid query spec; the message is safe to return to the client"""
+
+
+class Dictionary:
+    """
+    Dictionary encoding for a categorical column. Code 0 is NULL.
+    Append-only, so codes held by older snapshots stay valid.
+    """
+
+    def __init__(self):
+        self.values = [None]
+        self.index = {None: 0}
+
+    def encode(self, value):
+        code = self.index.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.index[value] = code
+        return code
+
+    def codes(self, values):
+        return [self.index[v] for v in values if v in self.index]
+
+
+def _day(value):
+    return (value - EPOCH).days if value is not None else NULL_DAY
+
+
+def _parse_day(value):
+    try:
+        return (date.fromisoformat(str(value)) - EPOCH).days
+    except ValueError:
+        raise QueryError(f"Invalid date: {value}")
+
+
+class Snapshot:
+    """Immutable column arrays. Refreshes build a new Snapshot and swap it in"""
+
+    def __init__(self, rows, courses, synced_at):
+        self.rows = rows
+        self.courses = courses
+        # Database time the load started; the next refresh reads changes since
+        self.synced_at = synced_at
+        self.size = len(rows["course"])
+
+    @property
+    def keys(self):
+        return (self.rows["user"].astype(np.int64) << 32) | self.rows["course"].astype(np.int64)
+
+
+ROW_COLUMNS = {
+    "user": np.int32,
+    "course": np.int32,
+    "status": np.int16,
+    "grade": np.int16,
+    "enroll_day": np.int32,
+    "completion_day": np.int32,
+}
+
+
+class Engine:
+    """Loads, refreshes and queries the enrollment snapshot"""
+
+    def __init__(self):
+        self.dicts = {name: Dictionary() for name in
+                      ("user", "course", "status", "grade", "title", "level", "university", "program")}
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    # ---------- loading ----------
+
+    def _connect(self):
+        params = connection_params()
+        # Point at a read replica to keep snapshot loads off the primary
+        params["host"] = os.getenv("ANALYTICS_DB_HOST", params["host"])
+        params["port"] = os.getenv("ANALYTICS_DB_PORT", params["port"])
+        return psycopg2.connect(**params)
+
+    def _load_courses(self, cur):
+        cur.execute("""
+            SELECT c.course_id::text, c.title, c.level, u.name, c.program, c.fees
+            FROM public.course c
+            LEFT JOIN public.university u ON u.university_id = c.university_id
+        """)
+        rows = cur.fetchall()
+        d = self.dicts
+        for row in rows:
+            d["course"].encode(row[0])
+        size = len(d["course"].values)
+        courses = {
+            "title": np.zeros(size, np.int32),
+            "level": np.zeros(size, np.int32),
+            "university": np.zeros(size, np.int32),
+            "program": np.zeros(size, np.int32),
+            "fees": np.full(size, np.nan),
+        }
+        for course_id, title, level, university, program, fees in rows:
+            code = d["course"].index[course_id]
+            courses["title"][code] = d["title"].encode(title)
+            courses["level"][code] = d["level"].encode(level)
+            courses["university"][code] = d["university"].encode(university)
+            courses["program"][code] = d["program"].encode(program)
+            if fees is not None:
+                courses["fees"][code] = float(fees)
+        return courses
+
+    def _encode_rows(self, cur):
+        # Each fetched batch goes straight into typed arrays, so a full load
+        # never holds per-row Python ints for the whole table
+        d = self.dicts
+        encoders = {
+            "user": lambda r: d["user"].encode(r[0]),
+            "course": lambda r: d["course"].encode(r[1]),
+            "status": lambda r: d["status"].encode(r[2]),
+            "grade": lambda r: d["grade"].encode(r[3] or None),
+            "enroll_day": lambda r: _day(r[4]),
+            "completion_day": lambda r: _day(r[5]),
+        }
+        chunks = {name: [] for name in ROW_COLUMNS}
+        while True:
+            batch = cur.fetchmany(FETCH_BATCH)
+            if not batch:
+                break
+            for name, dtype in ROW_COLUMNS.items():
+                chunks[name].append(np.fromiter(map(encoders[name], batch), dtype, len(batch)))
+        return {name: np.concatenate(chunks[name]) if chunks[name] else np.zeros(0, dtype)
+                for name, dtype in ROW_COLUMNS.items()}
+
+    def _fetch_rows(self, conn, since=None):
+        # Server-side cursor so a full load never holds the whole result in libpq
+        cur = conn.cursor(name="analytics_snapshot")
+        cur.itersize = FETCH_BATCH
+        query = """
+            SELECT user_id::text, course_id::text, status, grade,
+                   enroll_date, completion_date
+            FROM public.enrolled_in
+        """
+        if since is None:
+            cur.execute(query)
+        else:
+            cur.execute(query + " WHERE updated_at > %s", (since,))
+        rows = self._encode_rows(cur)
+        cur.close()
+        return rows
+
+    def _fetch_deleted_keys(self, cur, since):
+        cur.execute("""
+            SELECT user_id::text, course_id::text FROM public.enrolled_in_deleted
+            WHERE deleted_at > %s
+        """, (since,))
+        users, courses = self.dicts["user"].index, self.dicts["course"].index
+        keys = [(users[u] << 32) | courses[c] for u, c in cur.fetchall()
+                if u in users and c in courses]
+        return np.array(keys, np.int64)
+
+    def refresh(self, full=False):
+        """Reload the snapshot, incrementally unless full or the deletion log has expired"""
+        with self._lock:
+            return self._refresh(full)
+
+    def _refresh(self, full):
+        prev = self._snapshot
+        if prev is None:
+            full = True
+
+        conn = self._connect()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT now()")
+            synced_at = cur.fetchone()[0]
+            if not full and synced_at - prev.synced_at > timedelta(
+                    seconds=DELETED_RETENTION_SECONDS - SNAPSHOT_OVERLAP_SECONDS):
+                full = True
+
+            if full:
+                rows = self._fetch_rows(conn)
+            else:
+                since = prev.synced_at - timedelta(seconds=SNAPSHOT_OVERLAP_SECONDS)
+                delta = self._fetch_rows(conn, since)
+                deleted = self._fetch_deleted_keys(cur, since)
+                delta_keys = (delta["user"].astype(np.int64) << 32) | delta["course"].astype(np.int64)
+                # Changed rows are replaced, deleted ones dropped
+                keep = ~np.isin(prev.keys, np.concatenate([delta_keys, deleted]))
+                rows = {name: np.concatenate([prev.rows[name][keep], delta[name]])
+                        for name in ROW_COLUMNS}
+            # After the rows, so every course code they reference has a slot
+            courses = self._load_courses(cur)
+            cur.close()
+            conn.rollback()
+        finally:
+            conn.close()
+
+        self._snapshot = Snapshot(rows, courses, synced_at)
+        return self._snapshot
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            # A query racing the warm-up load waits for it instead of loading again
+            with self._lock:
+                snapshot = self._snapshot or self._refresh(True)
+        return snapshot
+
+    def refresh_if_loaded(self):
+        if self._snapshot is not None:
+            self.refresh()
+
+    # ---------- querying ----------
+
+    def _column(self, snap, field):
+        """(values, kind) for a field: kind is a dictionary name, 'number' or 'day'"""
+        rows, courses = snap.rows, snap.courses
+        if field in ("status", "grade"):
+            return rows[field], field
+        if field == "course_id":
+            return rows["course"], "course"
+        if field in ("title", "level", "university", "program"):
+            return courses[field][rows["course"]], field
+        if field == "fees":
+            return courses["fees"][rows["course"]], "number"
+        if field in ("enroll_date", "completion_date"):
+            return rows[field.replace("_date", "_day")], "day"
+        raise QueryError(f"Unknown field: {field}")
+
+    def _filter(self, snap, spec):
+        field, op, value = spec.get("field"), spec.get("op", "eq"), spec.get("value")
+        values, kind = self._column(snap, field)
+        if kind in self.dicts:
+            if op in ("eq", "ne"):
+                value = [value]
+            elif op not in ("in", "not_in") or not isinstance(value, list):
+                raise QueryError(f"{field} supports eq, ne, in and not_in (with a list)")
+            mask = np.isin(values, self.dicts[kind].codes(value))
+            return ~mask if op in ("ne", "not_in") else mask
+
+        convert = _parse_day if kind == "day" else float
+        try:
+            if op == "between":
+                low, high = (convert(v) for v in value)
+            else:
+                operand = [convert(v) for v in value] if op in ("in", "not_in") else convert(value)
+        except (TypeError, ValueError) as e:
+            raise QueryError(f"Invalid value for {field}: {e}")
+        present = ~np.isnan(values) if kind == "number" else values != NULL_DAY
+        if op == "between":
+            return present & (values >= low) & (values <= high)
+        if op in ("in", "not_in"):
+            mask = np.isin(values, operand)
+            return present & (~mask if op == "not_in" else mask)
+        compare = {"eq": np.equal, "ne": np.not_equal, "gt": np.greater, "gte": np.greater_equal,
+                   "lt": np.less, "lte": np.less_equal}.get(op)
+        if compare is None:
+            raise QueryError(f"Unknown op: {op}")
+        return present & compare(values, operand)
+
+    def _group_key(self, snap, field, mask, fee_bands):
+        """(int codes for the masked rows, code -> label)"""
+        if field == "fee_band":
+            fees = snap.courses["fees"][snap.rows["course"][mask]]
+            codes = np.where(np.isnan(fees), -1, np.digitize(fees, fee_bands))
+            labels = [f"<{fee_bands[0]:g}"]
+            labels += [f"{lo:g}-{hi:g}" for lo, hi in zip(fee_bands, fee_bands[1:])]
+            labels.append(f">={fee_bands[-1]:g}")
+            return codes + 1, lambda c: labels[c - 1] if c else None
+        if field in ("enroll_month", "completion_month", "enroll_year"):
+            days = snap.rows["completion_day" if field == "completion_month" else "enroll_day"][mask]
+            unit = "Y" if field == "enroll_year" else "M"
+            periods = days.astype("datetime64[D]").astype(f"datetime64[{unit}]").astype(np.int64)
+            codes = np.where(days == NULL_DAY, np.iinfo(np.int64).min, periods)
+            label = lambda c: None if c == np.iinfo(np.int64).min else str(np.datetime64(int(c), unit))
+            return codes, label
+
+        values, kind = self._column(snap, field)
+        if kind not in self.dicts:
+            raise QueryError(f"Cannot group by {field}; use fee_band or a *_month field")
+        names = self.dicts[kind].values
+        return values[mask], lambda c: names[c]
+
+    def query(self, spec):
+        """
+        Filter/group/aggregate over the snapshot.
+        spec: {filters: [{field, op, value}], group_by: [field], metrics: [name],
+               fee_bands: [edges], order_by: metric, limit: n}
+        """
+        if not isinstance(spec, dict):
+            raise QueryError("The query must be a JSON object")
+        filters = spec.get("filters") or []
+        group_by = spec.get("group_by") or []
+        metrics = spec.get("metrics") or ["count"]
+        fee_bands = spec.get("fee_bands") or [0, 500, 1000, 5000]
+        if not isinstance(filters, list) or not isinstance(group_by, list) or not isinstance(metrics, list):
+            raise QueryError("filters, group_by and metrics must be lists")
+        if not all(isinstance(f, dict) for f in filters):
+            raise QueryError("Each filter must be an object with field, op and value")
+        if not all(isinstance(name, str) for name in group_by + metrics):
+            raise QueryError("group_by and metrics must be lists of names")
+        try:
+            fee_bands = sorted(float(b) for b in fee_bands)
+        except (TypeError, ValueError):
+            raise QueryError("fee_bands must be a list of numbers")
+        unknown = [m for m in metrics if m not in METRICS]
+        if unknown:
+            raise QueryError(f"Unknown metrics: {', '.join(unknown)}")
+        try:
+            limit = int(spec.get("limit", QUERY_MAX_ROWS))
+        except (TypeError, ValueError):
+            limit = 0
+        if limit < 1:
+            raise QueryError("limit must be a positive integer")
+        limit = min(limit, QUERY_MAX_ROWS)
+
+        snap = self.snapshot()
+
+        mask = np.ones(snap.size, bool)
+        for f in filters:
+            mask &= self._filter(snap, f)
+
+        # Compress each key to 0..k-1, then combine into one group id per row
+        inverse = np.zeros(int(mask.sum()), np.int64)
+        key_columns = []
+        for field in group_by:
+            codes, label = self._group_key(snap, field, mask, fee_bands)
+            uniques, codes = np.unique(codes, return_inverse=True)
+            codes = codes.ravel()
+            inverse = inverse * len(uniques) + codes
+            key_columns.append((field, uniques, label))
+        groups, inverse = np.unique(inverse, return_inverse=True)
+        inverse = inverse.ravel()
+
+        status = snap.rows["status"][mask]
+        ctx = {
+            "n": len(groups),
+            "inverse": inverse,
+            "status": {name: status == self.dicts["status"].index.get(name, -1)
+                       for name in ("ongoing", "completed", "dropped")},
+            "snap": snap,
+            "mask": mask,
+        }
+        results = {m: METRICS[m](ctx) for m in metrics}
+
+        # Decode each group id back into its key values
+        out = []
+        remaining = groups.copy()
+        decoded = []
+        for field, uniques, label in reversed(key_columns):
+            decoded.append((field, uniques[remaining % len(uniques)], label))
+            remaining //= len(uniques)
+        decoded.reverse()
+        for i in range(len(groups)):
+            row = {field: label(codes[i]) for field, codes, label in decoded}
+            for m in metrics:
+                value = float(results[m][i])
+                if np.isnan(value):
+                    row[m] = None
+                else:
+                    row[m] = int(value) if value.is_integer() else round(value, 2)
+            out.append(row)
+
+        order_by = spec.get("order_by")
+        if order_by:
+            if order_by not in metrics:
+                raise QueryError("order_by must be one of the requested metrics")
+            out.sort(key=lambda r: (r[order_by] is None, -(r[order_by] or 0)))
+
+        return {
+            "columns": group_by + metrics,
+            "rows": out[:limit],
+            "total_groups": len(out),
+            "matched_rows": int(mask.sum()),
+            "snapshot": {
+                "rows": snap.size,
+                "synced_at": snap.synced_at.isoformat(),
+            },
+        }
+
+
+def _count(ctx, weights=None):
+    return np.bincount(ctx["inverse"], weights=weights, minlength=ctx["n"]).astype(float)
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+def _avg_fees(ctx):
+    snap, mask = ctx["snap"], ctx["mask"]
+    fees = snap.courses["fees"][snap.rows["course"][mask]]
+    known = ~np.isnan(fees)
+    return _ratio(_count(ctx, np.where(known, fees, 0)), _count(ctx, known))
+
+
+def _avg_days_to_complete(ctx):
+    snap, mask = ctx["snap"], ctx["mask"]
+    start, end = snap.rows["enroll_day"][mask], snap.rows["completion_day"][mask]
+    done = ctx["status"]["completed"] & (start != NULL_DAY) & (end != NULL_DAY)
+    days = np.where(done, end.astype(np.int64) - start, 0)
+    return _ratio(_count(ctx, days), _count(ctx, done))
+
+
+def _students(ctx):
+    users = ctx["snap"].rows["user"][ctx["mask"]].astype(np.int64)
+    base = int(users.max(initial=0)) + 1
+    pairs = np.unique(ctx["inverse"] * base + users)
+    return np.bincount(pairs // base, minlength=ctx["n"]).astype(float)
+
+
+# enrolled = not dropped, matching the completion rate on the SQL routes
+METRICS = {
+    "count": lambda ctx: _count(ctx),
+    "students": _students,
+    "enrolled": lambda ctx: _count(ctx, ~ctx["status"]["dropped"]),
+    "ongoing": lambda ctx: _count(ctx, ctx["status"]["ongoing"]),
+    "completed": lambda ctx: _count(ctx, ctx["status"]["completed"]),
+    "dropped": lambda ctx: _count(ctx, ctx["status"]["dropped"]),
+    "completion_rate": lambda ctx: _ratio(_count(ctx, ctx["status"]["completed"]),
+                                          _count(ctx, ~ctx["status"]["dropped"])) * 100,
+    "retention_rate": lambda ctx: _ratio(_count(ctx, ~ctx["status"]["dropped"]), _count(ctx)) * 100,
+    "avg_fees": _avg_fees,
+    "avg_days_to_complete": _avg_days_to_complete,
+}
+
+
+engine = Engine()
+
+
+def warm():
+    """Load this worker's snapshot in the background (gunicorn post_worker_init)"""
+    if ANALYTICS_SNAPSHOT_WARM:
+        jobs.run_in_background(engine.snapshot)
+
+
+@jobs.every(ANALYTICS_SNAPSHOT_SECONDS, name="analytics_snapshot")
+def refresh_snapshot():
+    engine.refresh_if_loaded()
+
+
+@jobs.every(3600, name="analytics_prune_deleted")
+def prune_deleted_log():
+    """Drop deletion-log entries no snapshot can still need"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM public.enrolled_in_deleted WHERE deleted_at < now() - make_interval(secs => %s)",
+                    (DELETED_RETENTION_SECONDS,))
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
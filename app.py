@@ -1,16 +1,49 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from db import get_connection
+from werkzeug.middleware.proxy_fix import ProxyFix
+from db import get_connection, release_connections, shared_connection
+from cache import TTLCache
+from events import broker, notify
+import jobs
+import analytics
+import export
+import hll
+import metrics
+import slowlog
+import nplusone
+import profiling
+import traffic
+import admission
+import budgets
+from functools import wraps
 import os
 from dotenv import load_dotenv
 import requests
 import json
+import uuid
+import base64
+import queue
+from datetime import datetime, date, timedelta
 
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "change-me-in-production")
+# X-Forwarded-For is only trusted for the proxies we run behind, so clients
+# cannot pick their own request.remote_addr (rate limits key on it)
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS, x_proto=TRUSTED_PROXY_HOPS)
 CORS(app,supports_credentials=True)  # Enable CORS for React frontend
+app.teardown_request(release_connections)  # Return pooled DB connections
+app.before_request(jobs.start)  # Background jobs, once per worker process
+metrics.init_app(app)  # Per-route latency/DB metrics at /api/metrics
+slowlog.install()  # Statements over SLOW_QUERY_MS -> SLOW_QUERY_LOG
+nplusone.install()  # Repeated SELECTs per request, per NPLUSONE_MODE
+profiling.init_app(app)  # Opt-in per-request profiles (PROFILE_TOKEN)
+traffic.init_app(app)  # Request capture for bench/replay.py (TRAFFIC_CAPTURE_DIR)
+admission.init_app(app)  # Per-class queues, rate limits and 503 shedding
+budgets.init_app(app)  # Per-route DB time budgets; analyst routes use their own pool
 
 def require_admin(user_id):
     """Verify user has administrator role. Returns (ok, error_response)."""
@@ -26,12 +59,88 @@ def require_admin(user_id):
         return False, (jsonify({"error": "Unauthorized: admin access required"}), 403)
     return True, None
 
+
+# Instructor -> set of course_ids they teach. Entries are dropped by
+# assign_instructor / remove_course_instructor in this process; other
+# workers pick up changes once the TTL expires.
+TEACHES_CACHE_TTL = int(os.getenv("TEACHES_CACHE_TTL", "30"))
+_teaching_cache = TTLCache(ttl=TEACHES_CACHE_TTL, maxsize=4096)
+
+
+def _uuid_str(value):
+    """Canonical string form of a UUID, or None if value is not a UUID."""
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+def get_teaching_courses(instructor_id):
+    """Return the frozenset of course_ids taught by an instructor (cached)."""
+    key = _uuid_str(instructor_id) or str(instructor_id)
+    courses = _teaching_cache.get(key)
+    if courses is None:
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT course_id FROM public.teaches WHERE instructor_id = %s::uuid", (instructor_id,))
+        courses = frozenset(str(row[0]) for row in cur.fetchall())
+        cur.close()
+        conn.close()
+        _teaching_cache.set(key, courses)
+    return courses
+
+
+def invalidate_teaching_cache(instructor_id=None):
+    """Drop cached teaching sets (one instructor, or all when instructor_id is None)."""
+    if instructor_id is None:
+        _teaching_cache.clear()
+    else:
+        _teaching_cache.pop(_uuid_str(instructor_id) or str(instructor_id))
+
+
+def require_teaches(view):
+    """
+    Route decorator: returns 403 unless instructor_id teaches course_id.
+    instructor_id is read where the route reads it: the query string for GET,
+    the JSON body otherwise. course_id comes from the URL or JSON body.
+    Missing ids are left to the route's own validation.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            if request.method in ("GET", "HEAD"):
+                body = {}
+                instructor_id = request.args.get("instructor_id")
+            else:
+                body = request.get_json(silent=True)
+                body = body if isinstance(body, dict) else {}
+                instructor_id = body.get("instructor_id")
+            course_id = kwargs.get("course_id") or body.get("course_id")
+            if instructor_id and course_id:
+                if _uuid_str(course_id) not in get_teaching_courses(instructor_id):
+                    return jsonify({"error": "You don't teach this course"}), 403
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        return view(*args, **kwargs)
+    return wrapper
+
+# course_id -> (content_version, serialized module tree). Students hit the
+# cache when the version read with their enrollment check matches.
+MODULE_TREE_CACHE_TTL = int(os.getenv("MODULE_TREE_CACHE_TTL", "600"))
+_module_tree_cache = TTLCache(ttl=MODULE_TREE_CACHE_TTL, maxsize=2048)
+
 # Supabase Auth URL (get from your Supabase project settings)
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY", "")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY", "")
 
 
+def supabase_request(operation, method, url, **kwargs):
+    """Call the Supabase Auth API, timed per route for /api/metrics"""
+    with metrics.supabase_timer(operation):
+        return requests.request(method, url, **kwargs)
+
+
 # =============================
 # AUTHENTICATION
 # =============================
@@ -55,7 +164,7 @@ def login():
                 "Content-Type": "application/json"
             }
             payload = {"email": email, "password": password}
-            auth_response = requests.post(auth_url, headers=headers, json=payload)
+            auth_response = supabase_request("token", "POST", auth_url, headers=headers, json=payload)
             if auth_response.status_code != 200:
                 return jsonify({"error": "Invalid email or password"}), 401
             auth_data = auth_response.json()
@@ -127,7 +236,7 @@ def signup():
                 }
             }
 
-            response = requests.post(auth_url, headers=headers, json=payload)
+            response = supabase_request("create_user", "POST", auth_url, headers=headers, json=payload)
             
             if response.status_code not in [200, 201]:
                 error_msg = response.json().get("msg", "Failed to create user")
@@ -142,7 +251,7 @@ def signup():
                     if not row:
                         # Email not in our DB -> orphan auth user; delete from Auth and retry once
                         list_url = f"{SUPABASE_URL}/auth/v1/admin/users?per_page=1000"
-                        list_resp = requests.get(list_url, headers=headers)
+                        list_resp = supabase_request("list_users", "GET", list_url, headers=headers)
                         if list_resp.status_code == 200:
                             data = list_resp.json()
                             users_list = data if isinstance(data, list) else (data.get("users") or []) if isinstance(data, dict) else []
@@ -150,11 +259,12 @@ def signup():
                                     if isinstance(u, dict) and (u.get("email") or "").lower() == email.lower():
                                         orphan_id = u.get("id")
                                         if orphan_id:
-                                            requests.delete(
+                                            supabase_request(
+                                                "delete_user", "DELETE",
                                                 f"{SUPABASE_URL}/auth/v1/admin/users/{orphan_id}",
                                                 headers=headers
                                             )
-                                        response = requests.post(auth_url, headers=headers, json=payload)
+                                        response = supabase_request("create_user", "POST", auth_url, headers=headers, json=payload)
                                         break
                 if response.status_code not in [200, 201]:
                     error_msg = response.json().get("msg", "Failed to create user") if response.text else error_msg
@@ -258,6 +368,50 @@ def signup():
 # DASHBOARD DATA
 # =============================
 
+def fetch_dashboard_data(cur, user_id, role):
+    """Dashboard counts for a role, or None if the role is invalid"""
+    if role == "student":
+        # Compute counts dynamically from enrolled_in
+        cur.execute("""
+            SELECT 
+                COUNT(*) FILTER (WHERE status != 'dropped') as enrolled,
+                COUNT(*) FILTER (WHERE status = 'completed') as completed
+            FROM public.enrolled_in
+            WHERE user_id = %s
+        """, (user_id,))
+        data = cur.fetchone()
+        return {
+            "enrolled_count": data[0] if data else 0,
+            "completed_count": data[1] if data else 0
+        }
+
+    if role == "instructor":
+        # Compute total courses dynamically from teaches
+        cur.execute("""
+            SELECT COUNT(*) FROM public.teaches
+            WHERE instructor_id = %s
+        """, (user_id,))
+        data = cur.fetchone()
+        return {
+            "total_courses": data[0] if data else 0
+        }
+
+    if role == "administrator":
+        stats = fetch_platform_stats(cur)
+        return {
+            "total_users": stats["total_users"],
+            "total_courses": stats["total_courses"]
+        }
+
+    if role == "data_analyst":
+        stats = fetch_platform_stats(cur)
+        return {
+            "total_enrollments": stats["total_enrollment_rows"]
+        }
+
+    return None
+
+
 @app.route("/api/dashboard", methods=["GET"])
 def dashboard():
     """Get dashboard data based on user role"""
@@ -265,56 +419,79 @@ def dashboard():
         user_id = request.args.get("user_id")
         role = request.args.get("role")
 
+        if not user_id or not role:
+            return jsonify({"error": "user_id and role are required"}), 400
+
+        conn = get_connection()
+        cur = conn.cursor()
+        result = fetch_dashboard_data(cur, user_id, role)
+        cur.close()
+        conn.close()
+
+        if result is None:
+            return jsonify({"error": "Invalid role"}), 400
+
+        return jsonify({"success": True, "data": result})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/bootstrap", methods=["GET"])
+def bootstrap():
+    """Everything a role's dashboard needs on first paint, over one connection"""
+    try:
+        user_id = request.args.get("user_id")
+        role = request.args.get("role")
+
         if not user_id or not role:
             return jsonify({"error": "user_id and role are required"}), 400
 
         conn = get_connection()
         cur = conn.cursor()
 
+        # Counts are derived from the lists where the lists already cover them
         if role == "student":
-            # Compute counts dynamically from enrolled_in
-            cur.execute("""
-                SELECT 
-                    COUNT(*) FILTER (WHERE status != 'dropped') as enrolled,
-                    COUNT(*) FILTER (WHERE status = 'completed') as completed
-                FROM public.enrolled_in
-                WHERE user_id = %s
-            """, (user_id,))
-            data = cur.fetchone()
+            my_courses_list = fetch_my_courses(cur, user_id)
             result = {
-                "enrolled_count": data[0] if data else 0,
-                "completed_count": data[1] if data else 0
+                "dashboard": {
+                    "enrolled_count": sum(1 for c in my_courses_list if c["status"] != "dropped"),
+                    "completed_count": sum(1 for c in my_courses_list if c["status"] == "completed")
+                },
+                "courses": fetch_courses(cur),
+                "my_courses": my_courses_list,
+                "profile": fetch_student_profile(cur, user_id)
             }
 
         elif role == "instructor":
-            # Compute total courses dynamically from teaches
-            cur.execute("""
-                SELECT COUNT(*) FROM public.teaches
-                WHERE instructor_id = %s
-            """, (user_id,))
-            data = cur.fetchone()
+            courses_list = fetch_instructor_courses(cur, user_id)
             result = {
-                "total_courses": data[0] if data else 0
+                "dashboard": {"total_courses": len(courses_list)},
+                "courses": courses_list,
+                "profile": fetch_instructor_profile(cur, user_id)
             }
 
         elif role == "administrator":
-            cur.execute("SELECT COUNT(*) FROM public.users")
-            total_users = cur.fetchone()[0]
-            cur.execute("SELECT COUNT(*) FROM public.course")
-            total_courses = cur.fetchone()[0]
+            users_list = fetch_users(cur)
+            courses_list = fetch_courses(cur)
             result = {
-                "total_users": total_users,
-                "total_courses": total_courses
+                "dashboard": {"total_users": len(users_list), "total_courses": len(courses_list)},
+                "users": users_list,
+                "courses": courses_list,
+                "instructors": fetch_instructors(cur)
             }
 
         elif role == "data_analyst":
-            cur.execute("SELECT COUNT(*) FROM public.enrolled_in")
-            total_enrollments = cur.fetchone()[0]
             result = {
-                "total_enrollments": total_enrollments
+                "dashboard": fetch_dashboard_data(cur, user_id, role),
+                "overview": fetch_analyst_overview(cur),
+                "courses": fetch_analyst_courses(cur),
+                "insights": fetch_analyst_insights(cur)
             }
 
         else:
+            cur.close()
+            conn.close()
             return jsonify({"error": "Invalid role"}), 400
 
         cur.close()
@@ -326,47 +503,109 @@ def dashboard():
         return jsonify({"error": str(e)}), 500
 
 
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+
+
+def run_subrequest(sub, headers):
+    """Dispatch one batched request through the normal routing and return (status, body)"""
+    if not isinstance(sub, dict):
+        return 400, {"error": "Each request must be an object"}
+    method = (sub.get("method") or "GET").upper()
+    path = sub.get("path") or ""
+    if not path.startswith("/") or path.startswith("/batch"):
+        return 400, {"error": "path must be an API path such as /courses"}
+
+    # The caller's resolved address, so sub-requests share its rate limits
+    with app.test_request_context("/api" + path, method=method, query_string=sub.get("params"),
+                                  json=sub.get("body"), headers=headers,
+                                  environ_base={"REMOTE_ADDR": request.remote_addr}):
+        response = app.full_dispatch_request()
+        # Streams (events, exports) never end or may be huge; reading one here
+        # would hold the batch's connection and admission slot for all of it
+        if response.is_streamed:
+            response.close()
+            return 400, {"error": "Streaming endpoints cannot be batched"}
+    return response.status_code, response.get_json(silent=True)
+
+
+@app.route("/api/batch", methods=["POST"])
+def batch():
+    """Run several API requests in-process on one DB connection; responses come back in order"""
+    try:
+        data = request.get_json(silent=True) or {}
+        subrequests = data.get("requests")
+        if not isinstance(subrequests, list) or not subrequests:
+            return jsonify({"error": "requests must be a non-empty list"}), 400
+        if len(subrequests) > BATCH_MAX_REQUESTS:
+            return jsonify({"error": f"At most {BATCH_MAX_REQUESTS} requests per batch"}), 400
+
+        # Sub-requests see the caller's headers (auth, tracing) but carry their own bodies
+        headers = [(k, v) for k, v in request.headers if k.lower() not in ("content-type", "content-length")]
+
+        # One connection runs one statement at a time, so sub-requests run in sequence
+        responses = []
+        # Sub-requests share this request's g; hooks use the flag to tell them apart
+        g._batch_subrequest = True
+        try:
+            with shared_connection() as conn:
+                for sub in subrequests:
+                    status, body = run_subrequest(sub, headers)
+                    # End anything a sub-request left open (e.g. after an error)
+                    conn.rollback()
+                    responses.append({"status": status, "body": body})
+        finally:
+            g.pop("_batch_subrequest", None)
+
+        return jsonify({"success": True, "responses": responses})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 # =============================
 # COURSES
 # =============================
 
+def fetch_courses(cur):
+    """All courses with university and instructor(s)"""
+    cur.execute("""
+    SELECT c.course_id, c.title, c.duration, c.level, c.description, c.fees,
+           un.name AS university_name, un.ranking AS university_ranking,
+           (SELECT string_agg('Prof. ' || u.name, ', ')
+            FROM public.teaches t
+            JOIN public.users u ON t.instructor_id = u.user_id
+            WHERE t.course_id = c.course_id) AS instructor_names
+    FROM public.course c
+    LEFT JOIN public.university un ON c.university_id = un.university_id
+    ORDER BY c.title
+""")
+
+    courses_list = []
+    for course in cur.fetchall():
+        courses_list.append({
+            "course_id": str(course[0]),
+            "title": course[1],
+            "duration": course[2],
+            "level": course[3],
+            "description": course[4],
+            "fees": float(course[5]) if course[5] else None,
+            "university_name": course[6] or None,
+            "university_ranking": course[7] if course[7] is not None else None,
+            "instructor_names": course[8] or None
+        })
+    return courses_list
+
+
 @app.route("/api/courses", methods=["GET"])
 def courses():
     """Get all courses with university and instructor(s)"""
     try:
         conn = get_connection()
         cur = conn.cursor()
-
-        cur.execute("""
-            SELECT c.course_id, c.title, c.duration, c.level, c.description, c.fees,
-                   un.name AS university_name, un.ranking AS university_ranking,
-                   (SELECT string_agg('Prof. ' || u.name, ', ')
-                    FROM public.teaches t
-                    JOIN public.users u ON t.instructor_id = u.user_id
-                    WHERE t.course_id = c.course_id) AS instructor_names
-            FROM public.course c
-            LEFT JOIN public.university un ON c.university_id = un.university_id
-            ORDER BY c.title
-        """)
-
-        courses = cur.fetchall()
+        courses_list = fetch_courses(cur)
         cur.close()
         conn.close()
 
-        courses_list = []
-        for course in courses:
-            courses_list.append({
-                "course_id": str(course[0]),
-                "title": course[1],
-                "duration": course[2],
-                "level": course[3],
-                "description": course[4],
-                "fees": float(course[5]) if course[5] else None,
-                "university_name": course[6] or None,
-                "university_ranking": course[7] if course[7] is not None else None,
-                "instructor_names": course[8] or None
-            })
-
         return jsonify({"success": True, "courses": courses_list})
 
     except Exception as e:
@@ -407,6 +646,43 @@ def enroll():
         return jsonify({"error": str(e)}), 500
 
 
+def fetch_my_courses(cur, user_id, status=None):
+    """Enrolled courses for a user, optionally filtered by status"""
+    status_filter = "AND e.status = %s" if status else ""
+    params = (user_id, status) if status else (user_id,)
+    cur.execute(f"""
+        SELECT c.course_id, c.title, c.duration, c.level, e.status,
+               e.enroll_date, e.grade, e.completion_date,
+               un.name AS university_name, un.ranking AS university_ranking,
+               (SELECT string_agg('Prof. ' || u.name, ', ')
+                FROM public.teaches t
+                JOIN public.users u ON t.instructor_id = u.user_id
+                WHERE t.course_id = c.course_id) AS instructor_names
+        FROM public.enrolled_in e
+        JOIN public.course c ON c.course_id = e.course_id
+        LEFT JOIN public.university un ON c.university_id = un.university_id
+        WHERE e.user_id = %s {status_filter}
+        ORDER BY e.enroll_date DESC
+    """, params)
+
+    courses_list = []
+    for course in cur.fetchall():
+        courses_list.append({
+            "course_id": str(course[0]),
+            "title": course[1],
+            "duration": course[2],
+            "level": course[3],
+            "status": course[4],
+            "enroll_date": str(course[5]) if course[5] else None,
+            "grade": course[6],
+            "completion_date": str(course[7]) if course[7] else None,
+            "university_name": course[8] if len(course) > 8 else None,
+            "university_ranking": course[9] if len(course) > 9 else None,
+            "instructor_names": course[10] if len(course) > 10 else None
+        })
+    return courses_list
+
+
 @app.route("/api/courses/my-courses", methods=["GET"])
 def my_courses():
     """Get enrolled courses for a user"""
@@ -419,64 +695,40 @@ def my_courses():
 
         conn = get_connection()
         cur = conn.cursor()
-
-        if status:
-            cur.execute("""
-                SELECT c.course_id, c.title, c.duration, c.level, e.status,
-                       e.enroll_date, e.grade, e.completion_date,
-                       un.name AS university_name, un.ranking AS university_ranking,
-                       (SELECT string_agg('Prof. ' || u.name, ', ')
-                        FROM public.teaches t
-                        JOIN public.users u ON t.instructor_id = u.user_id
-                        WHERE t.course_id = c.course_id) AS instructor_names
-                FROM public.enrolled_in e
-                JOIN public.course c ON c.course_id = e.course_id
-                LEFT JOIN public.university un ON c.university_id = un.university_id
-                WHERE e.user_id = %s AND e.status = %s
-                ORDER BY e.enroll_date DESC
-            """, (user_id, status))
-        else:
-            cur.execute("""
-                SELECT c.course_id, c.title, c.duration, c.level, e.status,
-                       e.enroll_date, e.grade, e.completion_date,
-                       un.name AS university_name, un.ranking AS university_ranking,
-                       (SELECT string_agg('Prof. ' || u.name, ', ')
-                        FROM public.teaches t
-                        JOIN public.users u ON t.instructor_id = u.user_id
-                        WHERE t.course_id = c.course_id) AS instructor_names
-                FROM public.enrolled_in e
-                JOIN public.course c ON c.course_id = e.course_id
-                LEFT JOIN public.university un ON c.university_id = un.university_id
-                WHERE e.user_id = %s
-                ORDER BY e.enroll_date DESC
-            """, (user_id,))
-
-        courses = cur.fetchall()
+        courses_list = fetch_my_courses(cur, user_id, status)
         cur.close()
         conn.close()
 
-        courses_list = []
-        for course in courses:
-            courses_list.append({
-                "course_id": str(course[0]),
-                "title": course[1],
-                "duration": course[2],
-                "level": course[3],
-                "status": course[4],
-                "enroll_date": str(course[5]) if course[5] else None,
-                "grade": course[6],
-                "completion_date": str(course[7]) if course[7] else None,
-                "university_name": course[8] if len(course) > 8 else None,
-                "university_ranking": course[9] if len(course) > 9 else None,
-                "instructor_names": course[10] if len(course) > 10 else None
-            })
-
         return jsonify({"success": True, "courses": courses_list})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def fetch_student_profile(cur, user_id):
+    """Student personal information, or None if not a student"""
+    cur.execute("""
+        SELECT u.user_id, u.name, u.email, s.branch, s.country, s.dob, s.phone_number
+        FROM public.users u
+        JOIN public.student s ON s.user_id = u.user_id
+        WHERE u.user_id = %s
+    """, (user_id,))
+
+    student = cur.fetchone()
+    if not student:
+        return None
+
+    return {
+        "user_id": str(student[0]),
+        "name": student[1],
+        "email": student[2],
+        "branch": student[3],
+        "country": student[4],
+        "dob": str(student[5]) if student[5] else None,
+        "phone_number": student[6]
+    }
+
+
 @app.route("/api/student/profile", methods=["GET"])
 def get_student_profile():
     """Get student personal information"""
@@ -487,33 +739,14 @@ def get_student_profile():
 
         conn = get_connection()
         cur = conn.cursor()
-
-        cur.execute("""
-            SELECT u.user_id, u.name, u.email, s.branch, s.country, s.dob, s.phone_number
-            FROM public.users u
-            JOIN public.student s ON s.user_id = u.user_id
-            WHERE u.user_id = %s
-        """, (user_id,))
-
-        student = cur.fetchone()
+        profile = fetch_student_profile(cur, user_id)
         cur.close()
         conn.close()
 
-        if not student:
+        if not profile:
             return jsonify({"error": "Student not found"}), 404
 
-        return jsonify({
-            "success": True,
-            "profile": {
-                "user_id": str(student[0]),
-                "name": student[1],
-                "email": student[2],
-                "branch": student[3],
-                "country": student[4],
-                "dob": str(student[5]) if student[5] else None,
-                "phone_number": student[6]
-            }
-        })
+        return jsonify({"success": True, "profile": profile})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -579,33 +812,36 @@ def update_student_profile():
 # ADMIN ROUTES
 # =============================
 
+def fetch_users(cur):
+    """All users, newest first"""
+    cur.execute("""
+        SELECT user_id, name, email, role, COALESCE(approved, true)
+        FROM public.users
+        ORDER BY created_at DESC
+    """)
+
+    users_list = []
+    for user in cur.fetchall():
+        users_list.append({
+            "user_id": str(user[0]),
+            "name": user[1],
+            "email": user[2],
+            "role": user[3],
+            "approved": user[4]
+        })
+    return users_list
+
+
 @app.route("/api/admin/users", methods=["GET"])
 def get_users():
     """Get all users (admin only)"""
     try:
         conn = get_connection()
         cur = conn.cursor()
-
-        cur.execute("""
-            SELECT user_id, name, email, role, COALESCE(approved, true)
-            FROM public.users
-            ORDER BY created_at DESC
-        """)
-
-        users = cur.fetchall()
+        users_list = fetch_users(cur)
         cur.close()
         conn.close()
 
-        users_list = []
-        for user in users:
-            users_list.append({
-                "user_id": str(user[0]),
-                "name": user[1],
-                "email": user[2],
-                "role": user[3],
-                "approved": user[4]
-            })
-
         return jsonify({"success": True, "users": users_list})
 
     except Exception as e:
@@ -650,6 +886,7 @@ def delete_student(user_id):
         conn.commit()
         cur.close()
         conn.close()
+        invalidate_teaching_cache(user_id)
 
         # Delete from Supabase Auth so the same email can sign up again
         if SUPABASE_URL and SUPABASE_SERVICE_KEY:
@@ -658,7 +895,7 @@ def delete_student(user_id):
                 "apikey": SUPABASE_SERVICE_KEY,
                 "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
             }
-            auth_response = requests.delete(auth_delete_url, headers=headers)
+            auth_response = supabase_request("delete_user", "DELETE", auth_delete_url, headers=headers)
             # 200 or 404 (already gone) are both OK
             if auth_response.status_code not in (200, 204, 404):
                 # Log but don't fail - DB user is already removed
@@ -693,6 +930,7 @@ def assign_instructor():
         conn.commit()
         cur.close()
         conn.close()
+        invalidate_teaching_cache(instructor_id)
 
         return jsonify({"success": True, "message": "Instructor assigned"})
 
@@ -792,11 +1030,48 @@ def delete_course(course_id):
         conn.commit()
         cur.close()
         conn.close()
+        invalidate_teaching_cache()
         return jsonify({"success": True, "message": "Course deleted"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/admin/stats/recount", methods=["POST"])
+def recount_stats():
+    """Start an exact recount of the platform counters in the background (admin only)"""
+    try:
+        data = request.get_json() or {}
+        ok, err = require_admin(data.get("admin_user_id"))
+        if not ok:
+            return err
+
+        jobs.run_in_background(recount_platform_stats)
+        return jsonify({"success": True, "message": "Recount started"}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/admin/analytics/refresh", methods=["POST"])
+@budgets.db_budget(300_000)  # refreshes every materialized view inline
+def force_analytics_refresh():
+    """Refresh every analytics view now, dirty or not (admin only)"""
+    try:
+        data = request.get_json() or {}
+        ok, err = require_admin(data.get("admin_user_id"))
+        if not ok:
+            return err
+
+        refreshed = refresh_analytics_views(force=True)
+        conn = get_connection()
+        cur = conn.cursor()
+        freshness = fetch_view_freshness(cur, ANALYTICS_VIEWS)
+        cur.close()
+        conn.close()
+        return jsonify({"success": True, "refreshed": refreshed, "freshness": freshness})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route("/api/admin/courses/<course_id>/instructors", methods=["GET"])
 def get_course_instructors(course_id):
     """Get instructors assigned to a course (admin only)"""
@@ -847,6 +1122,7 @@ def remove_course_instructor(course_id, instructor_id):
         conn.commit()
         cur.close()
         conn.close()
+        invalidate_teaching_cache(instructor_id)
         return jsonify({"success": True, "message": "Instructor removed from course"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -939,34 +1215,37 @@ def update_course(course_id):
         return jsonify({"error": str(e)}), 500
 
 
+def fetch_instructors(cur):
+    """All instructors with details"""
+    cur.execute("""
+        SELECT u.user_id, u.name, u.email, i.branch, i.phone_number
+        FROM public.users u
+        JOIN public.instructor i ON i.user_id = u.user_id
+        ORDER BY u.name
+    """)
+
+    instructors_list = []
+    for instructor in cur.fetchall():
+        instructors_list.append({
+            "user_id": str(instructor[0]),
+            "name": instructor[1],
+            "email": instructor[2],
+            "branch": instructor[3] or "N/A",
+            "phone_number": instructor[4] or "N/A"
+        })
+    return instructors_list
+
+
 @app.route("/api/admin/instructors", methods=["GET"])
 def get_instructors():
     """Get all instructors with details (admin only)"""
     try:
         conn = get_connection()
         cur = conn.cursor()
-
-        cur.execute("""
-            SELECT u.user_id, u.name, u.email, i.branch, i.phone_number
-            FROM public.users u
-            JOIN public.instructor i ON i.user_id = u.user_id
-            ORDER BY u.name
-        """)
-
-        instructors = cur.fetchall()
+        instructors_list = fetch_instructors(cur)
         cur.close()
         conn.close()
 
-        instructors_list = []
-        for instructor in instructors:
-            instructors_list.append({
-                "user_id": str(instructor[0]),
-                "name": instructor[1],
-                "email": instructor[2],
-                "branch": instructor[3] or "N/A",
-                "phone_number": instructor[4] or "N/A"
-            })
-
         return jsonify({"success": True, "instructors": instructors_list})
 
     except Exception as e:
@@ -977,6 +1256,29 @@ def get_instructors():
 # INSTRUCTOR ROUTES
 # =============================
 
+def fetch_instructor_profile(cur, user_id):
+    """Instructor personal information, or None if not an instructor"""
+    cur.execute("""
+        SELECT u.user_id, u.name, u.email, i.branch, i.specialization, i.hire_year, i.phone_number
+        FROM public.users u
+        JOIN public.instructor i ON i.user_id = u.user_id
+        WHERE u.user_id = %s
+    """, (user_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+
+    return {
+        "user_id": str(row[0]),
+        "name": row[1],
+        "email": row[2],
+        "branch": row[3],
+        "specialization": row[4],
+        "hire_year": row[5],
+        "phone_number": row[6]
+    }
+
+
 @app.route("/api/instructor/profile", methods=["GET"])
 def get_instructor_profile():
     """Get instructor personal information"""
@@ -987,31 +1289,14 @@ def get_instructor_profile():
 
         conn = get_connection()
         cur = conn.cursor()
-        cur.execute("""
-            SELECT u.user_id, u.name, u.email, i.branch, i.specialization, i.hire_year, i.phone_number
-            FROM public.users u
-            JOIN public.instructor i ON i.user_id = u.user_id
-            WHERE u.user_id = %s
-        """, (user_id,))
-        row = cur.fetchone()
+        profile = fetch_instructor_profile(cur, user_id)
         cur.close()
         conn.close()
 
-        if not row:
+        if not profile:
             return jsonify({"error": "Instructor not found"}), 404
 
-        return jsonify({
-            "success": True,
-            "profile": {
-                "user_id": str(row[0]),
-                "name": row[1],
-                "email": row[2],
-                "branch": row[3],
-                "specialization": row[4],
-                "hire_year": row[5],
-                "phone_number": row[6]
-            }
-        })
+        return jsonify({"success": True, "profile": profile})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1062,6 +1347,32 @@ def update_instructor_profile():
         return jsonify({"error": str(e)}), 500
 
 
+def fetch_instructor_courses(cur, instructor_id):
+    """Courses taught by an instructor with their enrolled counts"""
+    cur.execute("""
+        SELECT c.course_id, c.title, c.duration, c.level, c.description,
+               COUNT(e.user_id) as enrolled_count
+        FROM public.teaches t
+        JOIN public.course c ON c.course_id = t.course_id
+        LEFT JOIN public.enrolled_in e ON e.course_id = c.course_id AND e.status != 'dropped'
+        WHERE t.instructor_id = %s
+        GROUP BY c.course_id, c.title, c.duration, c.level, c.description
+        ORDER BY c.title
+    """, (instructor_id,))
+
+    courses_list = []
+    for course in cur.fetchall():
+        courses_list.append({
+            "course_id": str(course[0]),
+            "title": course[1],
+            "duration": course[2],
+            "level": course[3],
+            "description": course[4],
+            "enrolled_count": course[5]
+        })
+    return courses_list
+
+
 @app.route("/api/instructor/courses", methods=["GET"])
 def get_instructor_courses():
     """Get all courses taught by an instructor"""
@@ -1072,33 +1383,10 @@ def get_instructor_courses():
 
         conn = get_connection()
         cur = conn.cursor()
-
-        cur.execute("""
-            SELECT c.course_id, c.title, c.duration, c.level, c.description,
-                   COUNT(e.user_id) as enrolled_count
-            FROM public.teaches t
-            JOIN public.course c ON c.course_id = t.course_id
-            LEFT JOIN public.enrolled_in e ON e.course_id = c.course_id AND e.status != 'dropped'
-            WHERE t.instructor_id = %s
-            GROUP BY c.course_id, c.title, c.duration, c.level, c.description
-            ORDER BY c.title
-        """, (instructor_id,))
-
-        courses = cur.fetchall()
+        courses_list = fetch_instructor_courses(cur, instructor_id)
         cur.close()
         conn.close()
 
-        courses_list = []
-        for course in courses:
-            courses_list.append({
-                "course_id": str(course[0]),
-                "title": course[1],
-                "duration": course[2],
-                "level": course[3],
-                "description": course[4],
-                "enrolled_count": course[5]
-            })
-
         return jsonify({"success": True, "courses": courses_list})
 
     except Exception as e:
@@ -1106,6 +1394,7 @@ def get_instructor_courses():
 
 
 @app.route("/api/instructor/courses/<course_id>/students", methods=["GET"])
+@require_teaches
 def get_course_students(course_id):
     """Get all students enrolled in a course (instructor only)"""
     try:
@@ -1117,14 +1406,6 @@ def get_course_students(course_id):
         conn = get_connection()
         cur = conn.cursor()
 
-        cur.execute("""
-            SELECT COUNT(*) FROM public.teaches
-            WHERE instructor_id = %s AND course_id = %s
-        """, (instructor_id, course_id))
-
-        if cur.fetchone()[0] == 0:
-            return jsonify({"error": "You don't teach this course"}), 403
-
         cur.execute("""
             SELECT u.user_id, u.name, u.email, e.status, e.grade, 
                    e.enroll_date, e.completion_date
@@ -1136,17 +1417,19 @@ def get_course_students(course_id):
 
         students = cur.fetchall()
 
+        # Assignment totals for every student in the course in one pass
+        cur.execute("""
+            SELECT s.student_id, COALESCE(SUM(s.marks_obtained), 0), COALESCE(SUM(a.max_marks), 0)
+            FROM public.assignment_submission s
+            JOIN public.assignment a ON a.assignment_id = s.assignment_id
+            WHERE a.course_id = %s
+            GROUP BY s.student_id
+        """, (course_id,))
+        totals = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+
         students_list = []
         for student in students:
-            cur.execute("""
-                SELECT COALESCE(SUM(s.marks_obtained), 0), COALESCE(SUM(a.max_marks), 0)
-                FROM public.assignment_submission s
-                JOIN public.assignment a ON a.assignment_id = s.assignment_id
-                WHERE s.student_id = %s AND a.course_id = %s
-            """, (student[0], course_id))
-            tot = cur.fetchone()
-            obtained = tot[0] or 0
-            possible = tot[1] or 0
+            obtained, possible = totals.get(student[0], (0, 0))
             percent = round(obtained / possible * 100, 1) if possible > 0 else 0
             students_list.append({
                 "user_id": str(student[0]),
@@ -1171,6 +1454,7 @@ def get_course_students(course_id):
 
 
 @app.route("/api/instructor/grade", methods=["POST"])
+@require_teaches
 def grade_student():
     """Grade a student (instructor only)"""
     try:
@@ -1187,33 +1471,32 @@ def grade_student():
         conn = get_connection()
         cur = conn.cursor()
 
-        # Verify instructor teaches this course
-        cur.execute("""
-            SELECT COUNT(*) FROM public.teaches
-            WHERE instructor_id = %s AND course_id = %s
-        """, (instructor_id, course_id))
-
-        if cur.fetchone()[0] == 0:
-            return jsonify({"error": "You don't teach this course"}), 403
-
-        # Update grade and status
+        # Update grade and status; grade_score is the grade normalized to 0-100
         cur.execute("""
             UPDATE public.enrolled_in
-            SET grade = %s, status = %s, completion_date = CURRENT_DATE
+            SET grade = %s, grade_score = public.grade_to_score(%s),
+                status = %s, completion_date = CURRENT_DATE
             WHERE user_id = %s AND course_id = %s
-        """, (grade, status, student_id, course_id))
+            RETURNING grade_score
+        """, (grade, grade, status, student_id, course_id))
+        row = cur.fetchone()
 
         conn.commit()
         cur.close()
         conn.close()
 
-        return jsonify({"success": True, "message": "Student graded successfully"})
+        return jsonify({
+            "success": True,
+            "message": "Student graded successfully",
+            "grade_score": float(row[0]) if row and row[0] is not None else None
+        })
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/instructor/remove-student", methods=["POST"])
+@require_teaches
 def remove_student_from_course():
     """Remove a student from course (instructor only)"""
     try:
@@ -1228,15 +1511,6 @@ def remove_student_from_course():
         conn = get_connection()
         cur = conn.cursor()
 
-        # Verify instructor teaches this course
-        cur.execute("""
-            SELECT COUNT(*) FROM public.teaches
-            WHERE instructor_id = %s AND course_id = %s
-        """, (instructor_id, course_id))
-
-        if cur.fetchone()[0] == 0:
-            return jsonify({"error": "You don't teach this course"}), 403
-
         # Update status to dropped
         cur.execute("""
             UPDATE public.enrolled_in
@@ -1255,6 +1529,7 @@ def remove_student_from_course():
 
 
 @app.route("/api/instructor/courses/<course_id>/modules", methods=["GET"])
+@require_teaches
 def get_course_modules(course_id):
     """Get all modules for a course"""
     try:
@@ -1265,15 +1540,6 @@ def get_course_modules(course_id):
         conn = get_connection()
         cur = conn.cursor()
 
-        # Verify instructor teaches this course
-        cur.execute("""
-            SELECT COUNT(*) FROM public.teaches
-            WHERE instructor_id = %s AND course_id = %s
-        """, (instructor_id, course_id))
-
-        if cur.fetchone()[0] == 0:
-            return jsonify({"error": "You don't teach this course"}), 403
-
         cur.execute("""
             SELECT module_number, name, duration
             FROM public.module
@@ -1299,32 +1565,96 @@ def get_course_modules(course_id):
         return jsonify({"error": str(e)}), 500
 
 
+ANNOUNCEMENTS_PAGE_SIZE = 50
+ANNOUNCEMENTS_MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at, announcement_id):
+    """Opaque pagination cursor for an announcement's (created_at, announcement_id)"""
+    raw = f"{created_at.isoformat()}|{announcement_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor. Raises ValueError for a malformed cursor"""
+    try:
+        created_at, announcement_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), str(uuid.UUID(announcement_id))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def read_page_args():
+    """(limit, cursor, since) from the query string; cursors are decoded"""
+    try:
+        limit = int(request.args.get("limit", ANNOUNCEMENTS_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    limit = min(max(limit, 1), ANNOUNCEMENTS_MAX_PAGE_SIZE)
+    cursor = request.args.get("cursor")
+    since = request.args.get("since")
+    if cursor and since:
+        raise ValueError("Use either cursor or since, not both")
+    return limit, decode_cursor(cursor) if cursor else None, decode_cursor(since) if since else None
+
+
+def fetch_announcement_page(cur, query, params, limit, cursor=None, since=None):
+    """
+    Keyset-paginate `query` (a SELECT over public.announcement aliased `a`,
+    whose first two columns are a.announcement_id, a.created_at, ending in a
+    WHERE clause). Pages are newest first; `cursor` continues to older items,
+    `since` returns only items newer than it. Rows with a NULL created_at
+    have no place in the (created_at, announcement_id) order and are skipped.
+    Returns (rows, page_info).
+    """
+    params = list(params)
+    query += " AND a.created_at IS NOT NULL"
+    if since:
+        # Walk forward from `since` so a client polling with latest_cursor never skips items
+        query += " AND (a.created_at, a.announcement_id) > (%s, %s::uuid) ORDER BY a.created_at, a.announcement_id LIMIT %s"
+        params += [since[0], since[1], limit + 1]
+    else:
+        if cursor:
+            query += " AND (a.created_at, a.announcement_id) < (%s, %s::uuid)"
+            params += [cursor[0], cursor[1]]
+        query += " ORDER BY a.created_at DESC, a.announcement_id DESC LIMIT %s"
+        params.append(limit + 1)
+
+    cur.execute(query, params)
+    rows = cur.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if since:
+        rows.reverse()
+
+    if rows:
+        latest_cursor = encode_cursor(rows[0][1], rows[0][0])
+    else:
+        latest_cursor = encode_cursor(*since) if since else None
+    next_cursor = encode_cursor(rows[-1][1], rows[-1][0]) if rows and has_more and not since else None
+    return rows, {"has_more": has_more, "next_cursor": next_cursor, "latest_cursor": latest_cursor}
+
+
 @app.route("/api/instructor/courses/<course_id>/announcements", methods=["GET"])
+@require_teaches
 def get_instructor_announcements(course_id):
-    """Get all announcements for a course (instructor)"""
+    """Get announcements for a course (instructor). Supports limit, cursor and since"""
     try:
         instructor_id = request.args.get("instructor_id")
         if not instructor_id:
             return jsonify({"error": "instructor_id is required"}), 400
+        try:
+            limit, cursor, since = read_page_args()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         conn = get_connection()
         cur = conn.cursor()
-        cur.execute("""
-            SELECT COUNT(*) FROM public.teaches
-            WHERE instructor_id = %s AND course_id = %s
-        """, (instructor_id, course_id))
-        if cur.fetchone()[0] == 0:
-            cur.close()
-            conn.close()
-            return jsonify({"error": "You don't teach this course"}), 403
-
-        cur.execute("""
-            SELECT announcement_id, course_id, instructor_id, title, content, created_at
-            FROM public.announcement
-            WHERE course_id = %s
-            ORDER BY created_at DESC
-        """, (course_id,))
-        rows = cur.fetchall()
+        rows, page = fetch_announcement_page(cur, """
+            SELECT a.announcement_id, a.created_at, a.course_id, a.instructor_id, a.title, a.content
+            FROM public.announcement a
+            WHERE a.course_id = %s
+        """, (course_id,), limit, cursor, since)
         cur.close()
         conn.close()
 
@@ -1332,18 +1662,19 @@ def get_instructor_announcements(course_id):
         for row in rows:
             announcements.append({
                 "announcement_id": str(row[0]),
-                "course_id": str(row[1]),
-                "instructor_id": str(row[2]),
-                "title": row[3],
-                "content": row[4],
-                "created_at": str(row[5]) if row[5] else None
+                "course_id": str(row[2]),
+                "instructor_id": str(row[3]),
+                "title": row[4],
+                "content": row[5],
+                "created_at": str(row[1]) if row[1] else None
             })
-        return jsonify({"success": True, "announcements": announcements})
+        return jsonify({"success": True, "announcements": announcements, **page})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/instructor/announcement", methods=["POST"])
+@require_teaches
 def create_announcement():
     """Create announcement for a course (instructor only)"""
     try:
@@ -1358,21 +1689,13 @@ def create_announcement():
 
         conn = get_connection()
         cur = conn.cursor()
-        cur.execute("""
-            SELECT COUNT(*) FROM public.teaches
-            WHERE instructor_id = %s AND course_id = %s
-        """, (instructor_id, course_id))
-        if cur.fetchone()[0] == 0:
-            cur.close()
-            conn.close()
-            return jsonify({"error": "You don't teach this course"}), 403
-
         cur.execute("""
             INSERT INTO public.announcement (course_id, instructor_id, title, content)
             VALUES (%s::uuid, %s::uuid, %s, %s)
             RETURNING announcement_id, title, content, created_at
         """, (course_id, instructor_id, title, content))
         row = cur.fetchone()
+        notify(cur, "announcement", course_id, announcement_id=row[0], title=title)
         conn.commit()
         cur.close()
         conn.close()
@@ -1392,6 +1715,7 @@ def create_announcement():
 
 
 @app.route("/api/instructor/module", methods=["POST"])
+@require_teaches
 def create_module():
     """Create a new module for a course (instructor only)"""
     try:
@@ -1408,31 +1732,20 @@ def create_module():
         conn = get_connection()
         cur = conn.cursor()
 
-        # Verify instructor teaches this course
-        cur.execute("""
-            SELECT COUNT(*) FROM public.teaches
-            WHERE instructor_id = %s AND course_id = %s
-        """, (instructor_id, course_id))
-
-        if cur.fetchone()[0] == 0:
-            return jsonify({"error": "You don't teach this course"}), 403
-
-        # Check if module number already exists
-        cur.execute("""
-            SELECT COUNT(*) FROM public.module
-            WHERE course_id = %s AND module_number = %s
-        """, (course_id, module_number))
-
-        if cur.fetchone()[0] > 0:
-            return jsonify({"error": "Module number already exists for this course"}), 400
-
-        # Insert module
+        # Insert module (no row returned if the module number already exists)
         cur.execute("""
             INSERT INTO public.module (course_id, module_number, name, duration)
             VALUES (%s, %s, %s, %s)
+            ON CONFLICT (course_id, module_number) DO NOTHING
             RETURNING course_id, module_number
         """, (course_id, module_number, name, duration))
 
+        if cur.rowcount == 0:
+            cur.close()
+            conn.close()
+            return jsonify({"error": "Module number already exists for this course"}), 400
+
+        cur.execute("UPDATE public.course SET content_version = content_version + 1 WHERE course_id = %s", (course_id,))
         conn.commit()
         cur.close()
         conn.close()
@@ -1447,6 +1760,7 @@ def create_module():
 
 
 @app.route("/api/instructor/module-content", methods=["POST"])
+@require_teaches
 def add_module_content():
     """Add content to a module (instructor only)"""
     try:
@@ -1464,32 +1778,23 @@ def add_module_content():
         conn = get_connection()
         cur = conn.cursor()
 
-        # Verify instructor teaches this course
-        cur.execute("""
-            SELECT COUNT(*) FROM public.teaches
-            WHERE instructor_id = %s AND course_id = %s
-        """, (instructor_id, course_id))
-
-        if cur.fetchone()[0] == 0:
-            return jsonify({"error": "You don't teach this course"}), 403
-
-        # Verify module exists
-        cur.execute("""
-            SELECT COUNT(*) FROM public.module
-            WHERE course_id = %s AND module_number = %s
-        """, (course_id, module_number))
-
-        if cur.fetchone()[0] == 0:
-            return jsonify({"error": "Module does not exist"}), 404
-
-        # Insert content
+        # Insert content (no row returned if the module does not exist)
         cur.execute("""
             INSERT INTO public.module_content (course_id, module_number, title, type, url)
-            VALUES (%s, %s, %s, %s, %s)
+            SELECT m.course_id, m.module_number, %s, %s, %s
+            FROM public.module m
+            WHERE m.course_id = %s AND m.module_number = %s
             RETURNING content_id
-        """, (course_id, module_number, title, content_type, url))
+        """, (title, content_type, url, course_id, module_number))
 
-        content_id = cur.fetchone()[0]
+        row = cur.fetchone()
+        if not row:
+            cur.close()
+            conn.close()
+            return jsonify({"error": "Module does not exist"}), 404
+
+        content_id = row[0]
+        cur.execute("UPDATE public.course SET content_version = content_version + 1 WHERE course_id = %s", (course_id,))
         conn.commit()
         cur.close()
         conn.close()
@@ -1509,6 +1814,7 @@ def add_module_content():
 # =============================
 
 @app.route("/api/instructor/assignment", methods=["POST"])
+@require_teaches
 def create_assignment():
     """Create assignment for a course (instructor only). Each assignment 20 marks, total 100."""
     try:
@@ -1528,15 +1834,6 @@ def create_assignment():
         conn = get_connection()
         cur = conn.cursor()
 
-        cur.execute("""
-            SELECT COUNT(*) FROM public.teaches
-            WHERE instructor_id = %s AND course_id = %s
-        """, (instructor_id, course_id))
-        if cur.fetchone()[0] == 0:
-            cur.close()
-            conn.close()
-            return jsonify({"error": "You don't teach this course"}), 403
-
         cur.execute("""
             INSERT INTO public.assignment 
             (course_id, module_number, instructor_id, title, description, assignment_url, due_date, max_marks)
@@ -1560,6 +1857,7 @@ def create_assignment():
 
 
 @app.route("/api/instructor/courses/<course_id>/assignments", methods=["GET"])
+@require_teaches
 def get_instructor_assignments(course_id):
     """Get assignments for a course (instructor)"""
     try:
@@ -1570,15 +1868,6 @@ def get_instructor_assignments(course_id):
         conn = get_connection()
         cur = conn.cursor()
 
-        cur.execute("""
-            SELECT COUNT(*) FROM public.teaches
-            WHERE instructor_id = %s AND course_id = %s
-        """, (instructor_id, course_id))
-        if cur.fetchone()[0] == 0:
-            cur.close()
-            conn.close()
-            return jsonify({"error": "You don't teach this course"}), 403
-
         cur.execute("""
             SELECT assignment_id, course_id, module_number, title, description,
                    assignment_url, due_date, max_marks, created_at
@@ -1734,17 +2023,15 @@ def get_assignment_submissions(assignment_id):
         cur = conn.cursor()
 
         cur.execute("""
-            SELECT COUNT(*) FROM public.assignment
+            SELECT course_id FROM public.assignment
             WHERE assignment_id = %s AND instructor_id = %s
         """, (assignment_id, instructor_id))
-        if cur.fetchone()[0] == 0:
+        course_id_row = cur.fetchone()
+        if not course_id_row:
             cur.close()
             conn.close()
             return jsonify({"error": "Assignment not found or you don't own it"}), 403
-
-        cur.execute("SELECT course_id FROM public.assignment WHERE assignment_id = %s", (assignment_id,))
-        course_id_row = cur.fetchone()
-        course_id = str(course_id_row[0]) if course_id_row else None
+        course_id = str(course_id_row[0])
 
         cur.execute("""
             SELECT s.submission_id, s.student_id, u.name, u.email, s.submission_url,
@@ -1759,21 +2046,20 @@ def get_assignment_submissions(assignment_id):
         rows = cur.fetchall()
 
         submissions = []
-        if course_id:
-            student_ids = list(set(row[1] for row in rows))
-            course_totals = {}
-            for sid in student_ids:
-                cur.execute("""
-                    SELECT COALESCE(SUM(s2.marks_obtained), 0), COALESCE(SUM(a2.max_marks), 0)
-                    FROM public.assignment_submission s2
-                    JOIN public.assignment a2 ON a2.assignment_id = s2.assignment_id
-                    WHERE s2.student_id = %s AND a2.course_id = %s
-                """, (sid, course_id))
-                tot = cur.fetchone()
-                obtained = tot[0] or 0
-                possible = tot[1] or 0
-                percent = round(obtained / possible * 100, 1) if possible > 0 else 0
-                course_totals[str(sid)] = {"obtained": obtained, "possible": possible, "percent": percent}
+        # Course totals for the submitting students in one pass
+        cur.execute("""
+            SELECT s2.student_id, COALESCE(SUM(s2.marks_obtained), 0), COALESCE(SUM(a2.max_marks), 0)
+            FROM public.assignment_submission s2
+            JOIN public.assignment a2 ON a2.assignment_id = s2.assignment_id
+            WHERE a2.course_id = %s
+              AND s2.student_id IN (SELECT student_id FROM public.assignment_submission
+                                    WHERE assignment_id = %s)
+            GROUP BY s2.student_id
+        """, (course_id, assignment_id))
+        course_totals = {}
+        for sid, obtained, possible in cur.fetchall():
+            percent = round(obtained / possible * 100, 1) if possible > 0 else 0
+            course_totals[str(sid)] = {"obtained": obtained, "possible": possible, "percent": percent}
 
         cur.close()
         conn.close()
@@ -1819,21 +2105,17 @@ def grade_submission():
         cur = conn.cursor()
 
         cur.execute("""
-            SELECT COUNT(*) FROM public.assignment_submission s
+            SELECT a.max_marks, s.student_id, a.course_id, a.assignment_id, a.title
+            FROM public.assignment_submission s
             JOIN public.assignment a ON a.assignment_id = s.assignment_id
             WHERE s.submission_id = %s AND a.instructor_id = %s
         """, (submission_id, instructor_id))
-        if cur.fetchone()[0] == 0:
+        owned = cur.fetchone()
+        if not owned:
             cur.close()
             conn.close()
             return jsonify({"error": "Submission not found or you cannot grade it"}), 403
-
-        cur.execute("""
-            SELECT max_marks FROM public.assignment a
-            JOIN public.assignment_submission s ON s.assignment_id = a.assignment_id
-            WHERE s.submission_id = %s
-        """, (submission_id,))
-        max_marks = cur.fetchone()[0]
+        max_marks, student_id, course_id, assignment_id, assignment_title = owned
         if marks_obtained < 0 or marks_obtained > max_marks:
             cur.close()
             conn.close()
@@ -1844,6 +2126,8 @@ def grade_submission():
             SET marks_obtained = %s, feedback = %s
             WHERE submission_id = %s
         """, (marks_obtained, feedback, submission_id))
+        notify(cur, "grade", course_id, user_id=student_id, assignment_id=assignment_id,
+               title=assignment_title, marks_obtained=marks_obtained, max_marks=max_marks)
 
         conn.commit()
         cur.close()
@@ -1870,15 +2154,29 @@ def get_student_course_modules(course_id):
         conn = get_connection()
         cur = conn.cursor()
 
-        # Verify student is enrolled in this course
+        # Verify student is enrolled in this course and read the tree's version
         cur.execute("""
-            SELECT COUNT(*) FROM public.enrolled_in
-            WHERE user_id = %s AND course_id = %s AND status != 'dropped'
+            SELECT c.content_version
+            FROM public.enrolled_in e
+            JOIN public.course c ON c.course_id = e.course_id
+            WHERE e.user_id = %s AND e.course_id = %s AND e.status != 'dropped'
         """, (user_id, course_id))
+        enrollment = cur.fetchone()
 
-        if cur.fetchone()[0] == 0:
+        if not enrollment:
+            cur.close()
+            conn.close()
             return jsonify({"error": "You are not enrolled in this course"}), 403
 
+        # The module tree is the same for every student in the course
+        cache_key = _uuid_str(course_id) or course_id
+        version = enrollment[0]
+        cached = _module_tree_cache.get(cache_key)
+        if cached and cached[0] == version:
+            cur.close()
+            conn.close()
+            return app.response_class(cached[1], mimetype="application/json")
+
         # Get modules with their content
         cur.execute("""
             SELECT m.module_number, m.name, m.duration,
@@ -1917,7 +2215,9 @@ def get_student_course_modules(course_id):
 
         modules_list = list(modules_dict.values())
 
-        return jsonify({"success": True, "modules": modules_list})
+        body = json.dumps({"success": True, "modules": modules_list})
+        _module_tree_cache.set(cache_key, (version, body))
+        return app.response_class(body, mimetype="application/json")
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1925,11 +2225,15 @@ def get_student_course_modules(course_id):
 
 @app.route("/api/student/courses/<course_id>/announcements", methods=["GET"])
 def get_student_announcements(course_id):
-    """Get announcements for a course (student - enrolled only)"""
+    """Get announcements for a course (student - enrolled only). Supports limit, cursor and since"""
     try:
         user_id = request.args.get("user_id")
         if not user_id:
             return jsonify({"error": "user_id is required"}), 400
+        try:
+            limit, cursor, since = read_page_args()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         conn = get_connection()
         cur = conn.cursor()
@@ -1942,13 +2246,11 @@ def get_student_announcements(course_id):
             conn.close()
             return jsonify({"error": "You are not enrolled in this course"}), 403
 
-        cur.execute("""
-            SELECT announcement_id, title, content, created_at
-            FROM public.announcement
-            WHERE course_id = %s
-            ORDER BY created_at DESC
-        """, (course_id,))
-        rows = cur.fetchall()
+        rows, page = fetch_announcement_page(cur, """
+            SELECT a.announcement_id, a.created_at, a.title, a.content
+            FROM public.announcement a
+            WHERE a.course_id = %s
+        """, (course_id,), limit, cursor, since)
         cur.close()
         conn.close()
 
@@ -1956,11 +2258,52 @@ def get_student_announcements(course_id):
         for row in rows:
             announcements.append({
                 "announcement_id": str(row[0]),
-                "title": row[1],
-                "content": row[2],
-                "created_at": str(row[3]) if row[3] else None
+                "title": row[2],
+                "content": row[3],
+                "created_at": str(row[1]) if row[1] else None
+            })
+        return jsonify({"success": True, "announcements": announcements, **page})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/student/announcements", methods=["GET"])
+def get_student_announcement_feed():
+    """Announcements across all of a student's enrolled courses, newest first. Supports limit, cursor and since"""
+    try:
+        user_id = request.args.get("user_id")
+        if not user_id:
+            return jsonify({"error": "user_id is required"}), 400
+        try:
+            limit, cursor, since = read_page_args()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        conn = get_connection()
+        cur = conn.cursor()
+        rows, page = fetch_announcement_page(cur, """
+            SELECT a.announcement_id, a.created_at, a.course_id, c.title, a.title, a.content
+            FROM public.announcement a
+            JOIN public.course c ON c.course_id = a.course_id
+            WHERE a.course_id IN (
+                SELECT e.course_id FROM public.enrolled_in e
+                WHERE e.user_id = %s AND e.status != 'dropped'
+            )
+        """, (user_id,), limit, cursor, since)
+        cur.close()
+        conn.close()
+
+        announcements = []
+        for row in rows:
+            announcements.append({
+                "announcement_id": str(row[0]),
+                "course_id": str(row[2]),
+                "course_title": row[3],
+                "title": row[4],
+                "content": row[5],
+                "created_at": str(row[1]) if row[1] else None
             })
-        return jsonify({"success": True, "announcements": announcements})
+        return jsonify({"success": True, "announcements": announcements, **page})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1969,42 +2312,201 @@ def get_student_announcements(course_id):
 # ANALYST ROUTES
 # =============================
 
+STATS_RECOUNT_SECONDS = int(os.getenv("STATS_RECOUNT_SECONDS", "3600"))
+
+
+def fetch_platform_stats(cur):
+    """Platform-wide counters summed from the trigger-maintained platform_stats shards"""
+    cur.execute("""
+        SELECT total_users, total_courses, total_enrollment_rows,
+               active_enrollments, completed_enrollments, total_assignments,
+               updated_at, recounted_at
+        FROM public.platform_stats
+    """)
+    row = cur.fetchone()
+    if row[6] is None:
+        raise RuntimeError("platform_stats is empty; run migrations/add_platform_stats.sql")
+    return {
+        "total_users": row[0],
+        "total_courses": row[1],
+        "total_enrollment_rows": row[2],
+        "active_enrollments": row[3],
+        "completed_enrollments": row[4],
+        "total_assignments": row[5],
+        "updated_at": row[6].isoformat() if row[6] else None,
+        "recounted_at": row[7].isoformat() if row[7] else None
+    }
+
+
+def recount_platform_stats(min_age_seconds=0):
+    """
+    Exact recount of platform_stats. False if another worker is already
+    recounting, or one finished less than min_age_seconds ago
+    """
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT public.recount_platform_stats(make_interval(secs => %s))", (min_age_seconds,))
+        recounted = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
+        return recounted
+    finally:
+        conn.close()
+
+
+@jobs.every(STATS_RECOUNT_SECONDS, name="recount_platform_stats")
+def scheduled_recount():
+    # Every worker wakes up each interval; the first takes the lock and the
+    # rest see a fresh recounted_at and skip
+    return recount_platform_stats(min_age_seconds=STATS_RECOUNT_SECONDS / 2)
+
+
+def fetch_analyst_overview(cur):
+    """Platform overview stats for analyst"""
+    stats = fetch_platform_stats(cur)
+    total_enrollments = stats["active_enrollments"]
+    completed_enrollments = stats["completed_enrollments"]
+
+    completion_rate = round(completed_enrollments / total_enrollments * 100, 1) if total_enrollments > 0 else 0
+
+    return {
+        "total_users": stats["total_users"],
+        "total_courses": stats["total_courses"],
+        "total_enrollments": total_enrollments,
+        "completed_enrollments": completed_enrollments,
+        "completion_rate": completion_rate,
+        "total_assignments": stats["total_assignments"],
+        "stats_updated_at": stats["updated_at"],
+        "stats_recounted_at": stats["recounted_at"]
+    }
+
+
 @app.route("/api/analyst/overview", methods=["GET"])
 def analyst_overview():
     """Get platform overview stats for analyst"""
     try:
         conn = get_connection()
         cur = conn.cursor()
+        data = fetch_analyst_overview(cur)
+        cur.close()
+        conn.close()
+
+        return jsonify({"success": True, "data": data})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 
-        cur.execute("SELECT COUNT(*) FROM public.users")
-        total_users = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM public.course")
-        total_courses = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM public.enrolled_in WHERE status != 'dropped'")
-        total_enrollments = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM public.enrolled_in WHERE status = 'completed'")
-        completed_enrollments = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM public.assignment")
-        total_assignments = cur.fetchone()[0]
+ANALYTICS_VIEWS = ("course_stats_mv", "level_enrollment_mv")
+ANALYTICS_REFRESH_SECONDS = int(os.getenv("ANALYTICS_REFRESH_SECONDS", "60"))
+# Refresh even without a recorded change once a view is this old
+ANALYTICS_MAX_STALENESS_SECONDS = int(os.getenv("ANALYTICS_MAX_STALENESS_SECONDS", "3600"))
+# A refresh lease older than this is taken to belong to a dead worker
+ANALYTICS_REFRESH_LEASE_SECONDS = int(os.getenv("ANALYTICS_REFRESH_LEASE_SECONDS", "1800"))
 
-        completion_rate = round(completed_enrollments / total_enrollments * 100, 1) if total_enrollments > 0 else 0
 
+@jobs.every(ANALYTICS_REFRESH_SECONDS)
+def refresh_analytics_views(force=False):
+    """Refresh dirty (or all, with force) analytics views. Returns the names refreshed"""
+    conn = get_connection()
+    refreshed = []
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT view_name FROM public.analytics_refresh
+            WHERE view_name = ANY(%s)
+              AND (%s OR dirty OR refreshed_at IS NULL
+                   OR refreshed_at < now() - make_interval(secs => %s))
+            ORDER BY view_name
+        """, (list(ANALYTICS_VIEWS), force, ANALYTICS_MAX_STALENESS_SECONDS))
+        names = [row[0] for row in cur.fetchall()]
+        conn.commit()
+
+        for name in names:
+            # One refresher per view across all workers: claim a lease and
+            # clear the flag in one short transaction. Writes committed during
+            # the refresh then see dirty = false and set it again, without
+            # waiting on this row for the whole refresh. A lease left by a
+            # crashed worker expires after ANALYTICS_REFRESH_LEASE_SECONDS
+            cur.execute("""
+                UPDATE public.analytics_refresh SET dirty = false, refreshing_since = now()
+                WHERE view_name = %s
+                  AND (refreshing_since IS NULL OR refreshing_since < now() - make_interval(secs => %s))
+                RETURNING 1
+            """, (name, ANALYTICS_REFRESH_LEASE_SECONDS))
+            claimed = cur.fetchone() is not None
+            conn.commit()
+            if not claimed:
+                continue
+            try:
+                cur.execute("SELECT clock_timestamp()")
+                started = cur.fetchone()[0]
+                cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY public.{name}")
+                cur.execute("""
+                    UPDATE public.analytics_refresh
+                    SET refreshed_at = %s, refreshing_since = NULL,
+                        duration_ms = (extract(epoch FROM clock_timestamp() - %s) * 1000)::int
+                    WHERE view_name = %s
+                """, (started, started, name))
+                conn.commit()
+            except Exception:
+                # The flag is already cleared; set it back so the next run retries
+                conn.rollback()
+                cur.execute("""
+                    UPDATE public.analytics_refresh SET dirty = true, refreshing_since = NULL
+                    WHERE view_name = %s
+                """, (name,))
+                conn.commit()
+                raise
+            refreshed.append(name)
         cur.close()
+        return refreshed
+    finally:
         conn.close()
 
-        return jsonify({
-            "success": True,
-            "data": {
-                "total_users": total_users,
-                "total_courses": total_courses,
-                "total_enrollments": total_enrollments,
-                "completed_enrollments": completed_enrollments,
-                "completion_rate": completion_rate,
-                "total_assignments": total_assignments
-            }
+
+def fetch_view_freshness(cur, names):
+    """Staleness metadata for the given analytics views"""
+    cur.execute("""
+        SELECT view_name, refreshed_at, dirty,
+               extract(epoch FROM now() - refreshed_at)
+        FROM public.analytics_refresh
+        WHERE view_name = ANY(%s)
+    """, (list(names),))
+    return {
+        row[0]: {
+            "refreshed_at": row[1].isoformat() if row[1] else None,
+            "age_seconds": round(row[3], 1) if row[3] is not None else None,
+            "stale": row[2]
+        }
+        for row in cur.fetchall()
+    }
+
+
+def fetch_analyst_courses(cur):
+    """All courses with enrollment and completion stats"""
+    cur.execute("""
+        SELECT course_id, title, level, duration, enrolled, completed, assignment_count
+        FROM public.course_stats_mv
+        ORDER BY enrolled DESC
+    """)
+
+    courses = []
+    for row in cur.fetchall():
+        enrolled = row[4] or 0
+        completed = row[5] or 0
+        rate = round(completed / enrolled * 100, 1) if enrolled > 0 else 0
+        courses.append({
+            "course_id": str(row[0]),
+            "title": row[1],
+            "level": row[2],
+            "duration": row[3],
+            "enrolled": enrolled,
+            "completed": completed,
+            "completion_rate": rate,
+            "assignment_count": row[6] or 0
         })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return courses
 
 
 @app.route("/api/analyst/courses", methods=["GET"])
@@ -2013,146 +2515,759 @@ def analyst_courses():
     try:
         conn = get_connection()
         cur = conn.cursor()
+        courses = fetch_analyst_courses(cur)
+        freshness = fetch_view_freshness(cur, ["course_stats_mv"])
+        cur.close()
+        conn.close()
 
-        cur.execute("""
-            SELECT c.course_id, c.title, c.level, c.duration,
-                   COUNT(e.user_id) FILTER (WHERE e.status != 'dropped') as enrolled,
-                   COUNT(e.user_id) FILTER (WHERE e.status = 'completed') as completed,
-                   (SELECT COUNT(*) FROM public.assignment WHERE course_id = c.course_id) as assignment_count
-            FROM public.course c
-            LEFT JOIN public.enrolled_in e ON e.course_id = c.course_id
-            GROUP BY c.course_id, c.title, c.level, c.duration
-            ORDER BY enrolled DESC
-        """)
+        return jsonify({"success": True, "courses": courses, "freshness": freshness})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def fetch_analyst_insights(cur):
+    """Enrollments by level, users by role and top courses"""
+    cur.execute("""
+        SELECT level, enrollments FROM public.level_enrollment_mv
+    """)
+    enrollments_by_level = [{"level": row[0], "count": row[1]} for row in cur.fetchall()]
+
+    cur.execute("""
+        SELECT u.role, COUNT(*) FROM public.users u GROUP BY u.role
+    """)
+    users_by_role = [{"role": row[0], "count": row[1]} for row in cur.fetchall()]
+
+    cur.execute("""
+        SELECT title, enrolled FROM public.course_stats_mv
+        ORDER BY enrolled DESC
+        LIMIT 5
+    """)
+    top_courses = [{"title": row[0], "enrollments": row[1]} for row in cur.fetchall()]
+
+    return {
+        "enrollments_by_level": enrollments_by_level,
+        "users_by_role": users_by_role,
+        "top_courses_by_enrollment": top_courses
+    }
+
+
+@app.route("/api/analyst/insights", methods=["GET"])
+def analyst_insights():
+    """Get analytical insights"""
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        insights = fetch_analyst_insights(cur)
+        freshness = fetch_view_freshness(cur, ANALYTICS_VIEWS)
+        cur.close()
+        conn.close()
+
+        return jsonify({"success": True, "insights": insights, "freshness": freshness})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
+
+def fetch_course_grade_distribution(cur, course_id):
+    """Completed enrollments per letter grade for one course"""
+    cur.execute("""
+        SELECT e.grade, COUNT(*) as cnt
+        FROM public.enrolled_in e
+        WHERE e.course_id = %s AND e.status = 'completed' AND e.grade IS NOT NULL AND e.grade != ''
+        GROUP BY e.grade
+        ORDER BY e.grade
+    """, (course_id,))
+    return [{"grade": row[0], "count": row[1]} for row in cur.fetchall()]
+
+
+def fetch_course_status_counts(cur, course_id):
+    """Enrolled (not dropped), completed and ongoing counts for one course"""
+    cur.execute("""
+        SELECT
+            COUNT(*) FILTER (WHERE status != 'dropped') as enrolled,
+            COUNT(*) FILTER (WHERE status = 'completed') as completed,
+            COUNT(*) FILTER (WHERE status = 'ongoing') as ongoing
+        FROM public.enrolled_in WHERE course_id = %s
+    """, (course_id,))
+    row = cur.fetchone()
+    return {"enrolled": row[0] or 0, "completed": row[1] or 0, "ongoing": row[2] or 0}
+
+
+@app.route("/api/analyst/courses/<course_id>/grade-distribution", methods=["GET"])
+def analyst_grade_distribution(course_id):
+    """Get grade distribution for a course (for analyst to post as insight)"""
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        data = fetch_course_grade_distribution(cur, course_id)
+        cur.close()
+        conn.close()
+        return jsonify({"success": True, "data": data})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/analyst/courses/<course_id>/stats", methods=["GET"])
+def analyst_course_stats(course_id):
+    """Get enrollment/completion stats for a course (for charts)"""
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        counts = fetch_course_status_counts(cur, course_id)
+        grade_distribution = fetch_course_grade_distribution(cur, course_id)
+        cur.close()
+        conn.close()
+        return jsonify({
+            "success": True,
+            "data": {**counts, "grade_distribution": grade_distribution}
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def read_date_range(default_days=90):
+    """(from, to) dates from the query string; ValueError if malformed or reversed"""
+    end = datetime.strptime(request.args["to"], "%Y-%m-%d").date() if request.args.get("to") else date.today()
+    start = datetime.strptime(request.args["from"], "%Y-%m-%d").date() if request.args.get("from") else end - timedelta(days=default_days)
+    if start > end:
+        raise ValueError("from must not be after to")
+    return start, end
+
+
+def read_course_ids():
+    """Repeatable course_id query parameter; ValueError on a malformed id"""
+    course_ids = [c for c in request.args.getlist("course_id") if c]
+    if any(_uuid_str(c) is None for c in course_ids):
+        raise ValueError("Invalid course_id")
+    return course_ids
+
+
+# group_by -> (key expression, label expression) over the rollup joined to course/university
+TREND_GROUPS = {
+    "none": ("'all'", "'All courses'"),
+    "course": ("c.course_id::text", "c.title"),
+    "university": ("COALESCE(u.university_id::text, 'none')", "COALESCE(u.name, 'No university')"),
+    "level": ("COALESCE(c.level, 'Unknown')", "COALESCE(c.level, 'Unknown')"),
+}
+# grain -> (rollup table, bucket column, bucket length)
+TREND_GRAINS = {
+    "day": ("enrollment_daily", "day", timedelta(days=1)),
+    "week": ("enrollment_weekly", "week", timedelta(weeks=1)),
+}
+TREND_MAX_WINDOW = 90
+# Triggers queue rollup deltas; this job folds them in, so trends trail
+# writes by up to this long
+ROLLUP_MERGE_SECONDS = int(os.getenv("ROLLUP_MERGE_SECONDS", "30"))
+ROLLUP_MERGE_BATCH = 50000
+
+
+@jobs.every(ROLLUP_MERGE_SECONDS, name="merge_enrollment_rollups")
+def merge_enrollment_rollups():
+    """Drain the rollup delta queue; one worker merges at a time"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        while True:
+            cur.execute("SELECT public.merge_enrollment_rollups(%s)", (ROLLUP_MERGE_BATCH,))
+            consumed = cur.fetchone()[0]
+            conn.commit()
+            if consumed < ROLLUP_MERGE_BATCH:
+                break
+        cur.close()
+    finally:
+        conn.close()
+
+
+@app.route("/api/analyst/trends", methods=["GET"])
+def analyst_trends():
+    """
+    Enrollment/completion time series from the rollup tables.
+    Query: metric=enrollments|completions, grain=day|week,
+    group_by=none|course|university|level, from/to (YYYY-MM-DD),
+    window (buckets in the moving average), course_id (repeatable).
+    Buckets with no activity are omitted; they count as zero in the average.
+    Writes reach the rollups within ROLLUP_MERGE_SECONDS.
+    """
+    try:
+        metric = request.args.get("metric", "enrollments")
+        grain = request.args.get("grain", "day")
+        group_by = request.args.get("group_by", "none")
+        if metric not in ("enrollments", "completions"):
+            return jsonify({"error": "metric must be enrollments or completions"}), 400
+        if grain not in TREND_GRAINS:
+            return jsonify({"error": "grain must be day or week"}), 400
+        if group_by not in TREND_GROUPS:
+            return jsonify({"error": "group_by must be none, course, university or level"}), 400
+
+        try:
+            start, end = read_date_range()
+            course_ids = read_course_ids()
+            window = int(request.args.get("window", "7"))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid query: {e}"}), 400
+        if not 1 <= window <= TREND_MAX_WINDOW:
+            return jsonify({"error": f"window must be between 1 and {TREND_MAX_WINDOW}"}), 400
+
+        table, bucket, step = TREND_GRAINS[grain]
+        key_expr, label_expr = TREND_GROUPS[group_by]
+        if grain == "week":
+            start = start - timedelta(days=start.weekday())
+        # Read window-1 extra buckets before `from` so the first averages are complete
+        lead_in = start - step * (window - 1)
+
+        course_filter = "AND r.course_id = ANY(%s::uuid[])" if course_ids else ""
+        params = [lead_in, end] + ([course_ids] if course_ids else [])
+        params += [step * (window - 1), window, start]
+
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute(f"""
+            WITH series AS (
+                SELECT {key_expr} AS key, MIN({label_expr}) AS label,
+                       r.{bucket} AS bucket, SUM(r.{metric}) AS value
+                FROM public.{table} r
+                JOIN public.course c ON c.course_id = r.course_id
+                LEFT JOIN public.university u ON u.university_id = c.university_id
+                WHERE r.{bucket} BETWEEN %s AND %s {course_filter}
+                GROUP BY 1, 3
+            ), averaged AS (
+                SELECT key, label, bucket, value,
+                       SUM(value) OVER (
+                           PARTITION BY key ORDER BY bucket
+                           RANGE BETWEEN %s::interval PRECEDING AND CURRENT ROW
+                       )::float / %s AS moving_avg
+                FROM series
+            )
+            SELECT key, label, bucket, value, moving_avg
+            FROM averaged
+            WHERE bucket >= %s
+            ORDER BY key, bucket
+        """, params)
         rows = cur.fetchall()
         cur.close()
         conn.close()
 
-        courses = []
+        series = {}
         for row in rows:
-            enrolled = row[4] or 0
-            completed = row[5] or 0
-            rate = round(completed / enrolled * 100, 1) if enrolled > 0 else 0
-            courses.append({
-                "course_id": str(row[0]),
-                "title": row[1],
-                "level": row[2],
-                "duration": row[3],
-                "enrolled": enrolled,
-                "completed": completed,
-                "completion_rate": rate,
-                "assignment_count": row[6] or 0
+            entry = series.setdefault(row[0], {"key": row[0], "label": row[1], "points": []})
+            entry["points"].append({
+                "bucket": row[2].isoformat(),
+                "value": int(row[3]),
+                "moving_avg": round(row[4], 2)
             })
 
-        return jsonify({"success": True, "courses": courses})
+        return jsonify({
+            "success": True,
+            "metric": metric,
+            "grain": grain,
+            "group_by": group_by,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "window": window,
+            "series": list(series.values())
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/analyst/insights", methods=["GET"])
-def analyst_insights():
-    """Get analytical insights"""
+@app.route("/api/analyst/query", methods=["POST"])
+def analyst_query():
+    """
+    Ad-hoc group-by/filter/aggregate over the in-process enrollment snapshot.
+    Body: {filters: [{field, op, value}], group_by: [...], metrics: [...],
+           fee_bands: [...], order_by, limit}. See analytics.Engine.query.
+    """
     try:
-        conn = get_connection()
-        cur = conn.cursor()
+        spec = request.get_json() or {}
+        return jsonify({"success": True, **analytics.engine.query(spec)})
+    except analytics.QueryError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        cur.execute("""
-            SELECT c.level, COUNT(*) as cnt
-            FROM public.enrolled_in e
-            JOIN public.course c ON c.course_id = e.course_id
-            WHERE e.status != 'dropped'
-            GROUP BY c.level
-        """)
-        enrollments_by_level = [{"level": row[0] or "Unknown", "count": row[1]} for row in cur.fetchall()]
 
-        cur.execute("""
-            SELECT u.role, COUNT(*) FROM public.users u GROUP BY u.role
-        """)
-        users_by_role = [{"role": row[0], "count": row[1]} for row in cur.fetchall()]
+@app.route("/api/analyst/export/<dataset>", methods=["GET"])
+@budgets.db_budget(600_000)  # full-table scans streamed to the client
+def analyst_export(dataset):
+    """
+    Stream a dataset (enrollments, submissions, courses, insights) as Parquet
+    or Arrow IPC. ?partition=course|month returns a zip of hive-style files.
+    """
+    try:
+        fmt = request.args.get("format", "parquet")
+        partition_by = request.args.get("partition") or None
+        if fmt not in export.FORMATS:
+            return jsonify({"error": "format must be parquet or arrow"}), 400
+        if partition_by and partition_by not in export.PARTITIONS:
+            return jsonify({"error": "partition must be course or month"}), 400
+        if dataset not in export.DATASETS:
+            return jsonify({"error": f"Unknown dataset: {dataset}"}), 404
+        if partition_by and not export.DATASETS[dataset].partition_columns.get(partition_by):
+            return jsonify({"error": f"{dataset} cannot be partitioned by {partition_by}"}), 400
+
+        def generate():
+            conn = get_connection()
+            try:
+                yield from export.stream_export(conn, dataset, fmt, partition_by)
+            finally:
+                conn.rollback()
+                conn.close()
+
+        if partition_by:
+            filename, mimetype = f"{dataset}-by-{partition_by}.zip", "application/zip"
+        else:
+            ext, mimetype = export.FORMATS[fmt]
+            filename = f"{dataset}.{ext}"
+        return Response(stream_with_context(generate()), mimetype=mimetype, headers={
+            "Content-Disposition": f"attachment; filename={filename}"
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        cur.execute("""
-            SELECT c.title, COUNT(e.user_id) as cnt
-            FROM public.course c
-            LEFT JOIN public.enrolled_in e ON e.course_id = c.course_id AND e.status != 'dropped'
-            GROUP BY c.course_id, c.title
-            ORDER BY cnt DESC
-            LIMIT 5
-        """)
-        top_courses = [{"title": row[0], "enrollments": row[1]} for row in cur.fetchall()]
 
+# group_by -> key/label expressions over enrolled_in e, course c, university u
+FUNNEL_GROUPS = dict(TREND_GROUPS)
+COHORT_MAX_WEEKS = 52
+
+
+@app.route("/api/analyst/funnel", methods=["GET"])
+def analyst_funnel():
+    """
+    Enrolled -> submitted a first assignment -> completed, for enrollments
+    made between from and to. Query: group_by=none|course|university|level,
+    from/to (YYYY-MM-DD), course_id (repeatable).
+    """
+    try:
+        group_by = request.args.get("group_by", "none")
+        if group_by not in FUNNEL_GROUPS:
+            return jsonify({"error": "group_by must be none, course, university or level"}), 400
+        try:
+            start, end = read_date_range(default_days=365)
+            course_ids = read_course_ids()
+        except ValueError as e:
+            return jsonify({"error": f"Invalid query: {e}"}), 400
+
+        key_expr, label_expr = FUNNEL_GROUPS[group_by]
+        enroll_filter = "AND e.course_id = ANY(%s::uuid[])" if course_ids else ""
+        assignment_filter = "WHERE a.course_id = ANY(%s::uuid[])" if course_ids else ""
+        params = [start, end] + ([course_ids] if course_ids else []) * 2
+
+        conn = get_connection()
+        cur = conn.cursor()
+        # One hash join of enrollments against each student's first submission per course
+        cur.execute(f"""
+            WITH base AS (
+                SELECT e.user_id, e.course_id, e.enroll_date, e.status,
+                       {key_expr} AS key, {label_expr} AS label
+                FROM public.enrolled_in e
+                JOIN public.course c ON c.course_id = e.course_id
+                LEFT JOIN public.university u ON u.university_id = c.university_id
+                WHERE e.enroll_date BETWEEN %s AND %s {enroll_filter}
+            ), first_submission AS (
+                SELECT s.student_id, a.course_id, MIN(s.submitted_at)::date AS first_at
+                FROM public.assignment_submission s
+                JOIN public.assignment a ON a.assignment_id = s.assignment_id
+                {assignment_filter}
+                GROUP BY s.student_id, a.course_id
+            )
+            SELECT b.key, MIN(b.label),
+                   COUNT(*) AS enrolled,
+                   COUNT(f.first_at) AS submitted,
+                   COUNT(*) FILTER (WHERE f.first_at IS NOT NULL AND b.status = 'completed') AS completed,
+                   COUNT(*) FILTER (WHERE b.status = 'completed') AS completed_any,
+                   COUNT(*) FILTER (WHERE b.status = 'dropped') AS dropped,
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY f.first_at - b.enroll_date)
+                       AS median_days_to_first_submission
+            FROM base b
+            LEFT JOIN first_submission f ON f.student_id = b.user_id AND f.course_id = b.course_id
+            GROUP BY b.key
+            ORDER BY enrolled DESC
+        """, params)
+        rows = cur.fetchall()
         cur.close()
         conn.close()
 
+        def rate(part, whole):
+            return round(part / whole * 100, 1) if whole else 0
+
+        groups = []
+        for row in rows:
+            enrolled, submitted, completed = row[2], row[3], row[4]
+            groups.append({
+                "key": row[0],
+                "label": row[1],
+                "stages": [
+                    {"stage": "enrolled", "count": enrolled, "rate": 100.0 if enrolled else 0},
+                    {"stage": "submitted_first_assignment", "count": submitted, "rate": rate(submitted, enrolled)},
+                    {"stage": "completed", "count": completed, "rate": rate(completed, submitted)},
+                ],
+                "completed_any": row[5],
+                "dropped": row[6],
+                "median_days_to_first_submission": row[7]
+            })
+
         return jsonify({
             "success": True,
-            "insights": {
-                "enrollments_by_level": enrollments_by_level,
-                "users_by_role": users_by_role,
-                "top_courses_by_enrollment": top_courses
-            }
+            "group_by": group_by,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "groups": groups
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/analyst/courses/<course_id>/grade-distribution", methods=["GET"])
-def analyst_grade_distribution(course_id):
-    """Get grade distribution for a course (for analyst to post as insight)"""
+@app.route("/api/analyst/cohorts", methods=["GET"])
+def analyst_cohorts():
+    """
+    Weekly enrollment cohorts. For each cohort and week since enrolling:
+    share of the cohort that submitted anything that week, and share that had
+    completed by then. Query: from/to, weeks (default 12), course_id (repeatable).
+    """
     try:
+        try:
+            start, end = read_date_range(default_days=182)
+            course_ids = read_course_ids()
+            weeks = int(request.args.get("weeks", "12"))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid query: {e}"}), 400
+        if not 1 <= weeks <= COHORT_MAX_WEEKS:
+            return jsonify({"error": f"weeks must be between 1 and {COHORT_MAX_WEEKS}"}), 400
+
+        enroll_filter = "AND e.course_id = ANY(%s::uuid[])" if course_ids else ""
+        params = [start, end] + ([course_ids] if course_ids else []) + [weeks, weeks - 1]
+
         conn = get_connection()
         cur = conn.cursor()
-        cur.execute("""
-            SELECT e.grade, COUNT(*) as cnt
-            FROM public.enrolled_in e
-            WHERE e.course_id = %s AND e.status = 'completed' AND e.grade IS NOT NULL AND e.grade != ''
-            GROUP BY e.grade
-            ORDER BY e.grade
-        """, (course_id,))
+        cur.execute(f"""
+            WITH cohort AS (
+                SELECT e.user_id, e.course_id, e.enroll_date, e.completion_date, e.status,
+                       date_trunc('week', e.enroll_date)::date AS cohort_week
+                FROM public.enrolled_in e
+                WHERE e.enroll_date BETWEEN %s AND %s {enroll_filter}
+            ), sizes AS (
+                SELECT cohort_week, COUNT(*) AS size FROM cohort GROUP BY cohort_week
+            ), active AS (
+                SELECT cohort_week, week_offset, COUNT(*) AS active
+                FROM (
+                    SELECT DISTINCT c.cohort_week, c.user_id, c.course_id,
+                           (s.submitted_at::date - c.enroll_date) / 7 AS week_offset
+                    FROM cohort c
+                    JOIN public.assignment a ON a.course_id = c.course_id
+                    JOIN public.assignment_submission s
+                      ON s.assignment_id = a.assignment_id AND s.student_id = c.user_id
+                    WHERE s.submitted_at::date >= c.enroll_date
+                ) activity
+                WHERE week_offset < %s
+                GROUP BY cohort_week, week_offset
+            ), completed AS (
+                SELECT cohort_week, (completion_date - enroll_date) / 7 AS week_offset, COUNT(*) AS n
+                FROM cohort
+                WHERE status = 'completed' AND completion_date >= enroll_date
+                GROUP BY cohort_week, week_offset
+            )
+            SELECT s.cohort_week, s.size, w.week_offset,
+                   COALESCE(a.active, 0),
+                   SUM(COALESCE(cm.n, 0)) OVER (PARTITION BY s.cohort_week ORDER BY w.week_offset)
+            FROM sizes s
+            CROSS JOIN generate_series(0, %s) AS w(week_offset)
+            LEFT JOIN active a ON a.cohort_week = s.cohort_week AND a.week_offset = w.week_offset
+            LEFT JOIN completed cm ON cm.cohort_week = s.cohort_week AND cm.week_offset = w.week_offset
+            ORDER BY s.cohort_week, w.week_offset
+        """, params)
         rows = cur.fetchall()
         cur.close()
         conn.close()
-        data = [{"grade": row[0], "count": row[1]} for row in rows]
-        return jsonify({"success": True, "data": data})
+
+        today = date.today()
+        cohorts = {}
+        for cohort_week, size, offset, active, completed in rows:
+            entry = cohorts.setdefault(cohort_week, {
+                "cohort_week": cohort_week.isoformat(), "size": size, "weeks": []
+            })
+            # Weeks that have not happened yet for this cohort are left out
+            if cohort_week + timedelta(weeks=offset) > today:
+                continue
+            entry["weeks"].append({
+                "week": offset,
+                "active": active,
+                "active_rate": round(active / size * 100, 1) if size else 0,
+                "completed": int(completed),
+                "completed_rate": round(int(completed) / size * 100, 1) if size else 0
+            })
+
+        return jsonify({
+            "success": True,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "weeks": weeks,
+            "cohorts": list(cohorts.values())
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/analyst/courses/<course_id>/stats", methods=["GET"])
-def analyst_course_stats(course_id):
-    """Get enrollment/completion stats for a course (for charts)"""
+ACTIVE_GROUPS = dict(TREND_GROUPS, day=("s.day::text", "s.day::text"))
+
+
+@app.route("/api/analyst/active-students", methods=["GET"])
+def analyst_active_students():
+    """
+    Distinct students active (enrolled or submitted) between from and to.
+    Query: group_by=none|course|university|level|day, from/to, course_id
+    (repeatable), mode=approx (default, merged HyperLogLog sketches, about
+    1.6% standard error) or exact (COUNT(DISTINCT) over raw activity).
+    """
     try:
+        group_by = request.args.get("group_by", "none")
+        mode = request.args.get("mode", "approx")
+        if group_by not in ACTIVE_GROUPS:
+            return jsonify({"error": "group_by must be none, course, university, level or day"}), 400
+        if mode not in ("approx", "exact"):
+            return jsonify({"error": "mode must be approx or exact"}), 400
+        try:
+            start, end = read_date_range(default_days=30)
+            course_ids = read_course_ids()
+        except ValueError as e:
+            return jsonify({"error": f"Invalid query: {e}"}), 400
+
+        key_expr, label_expr = ACTIVE_GROUPS[group_by]
+        course_filter = "AND s.course_id = ANY(%s::uuid[])" if course_ids else ""
+        joins = """
+            JOIN public.course c ON c.course_id = s.course_id
+            LEFT JOIN public.university u ON u.university_id = c.university_id
+        """
+
         conn = get_connection()
         cur = conn.cursor()
-        cur.execute("""
-            SELECT
-                COUNT(*) FILTER (WHERE status != 'dropped') as enrolled,
-                COUNT(*) FILTER (WHERE status = 'completed') as completed,
-                COUNT(*) FILTER (WHERE status = 'ongoing') as ongoing
-            FROM public.enrolled_in WHERE course_id = %s
-        """, (course_id,))
-        row = cur.fetchone()
-        cur.execute("""
-            SELECT e.grade, COUNT(*) FROM public.enrolled_in e
-            WHERE e.course_id = %s AND e.status = 'completed' AND e.grade IS NOT NULL AND e.grade != ''
-            GROUP BY e.grade ORDER BY e.grade
-        """, (course_id,))
-        grade_rows = cur.fetchall()
+        results = []
+        if mode == "exact":
+            cur.execute(f"""
+                SELECT {key_expr}, MIN({label_expr}), COUNT(DISTINCT s.user_id)
+                FROM public.student_activity s {joins}
+                WHERE s.day BETWEEN %s AND %s {course_filter}
+                GROUP BY 1
+                ORDER BY 1
+            """, [start, end] + ([course_ids] if course_ids else []))
+            results = [{"key": r[0], "label": r[1], "active_students": r[2]} for r in cur.fetchall()]
+        else:
+            # Whole weeks come from the weekly sketches, the ragged ends from daily ones
+            first_week = start + timedelta(days=(7 - start.weekday()) % 7)
+            last_week = end - timedelta(days=6) - timedelta(days=(end - timedelta(days=6)).weekday())
+            use_weeks = group_by != "day" and first_week <= last_week
+            filter_params = [course_ids] if course_ids else []
+            if use_weeks:
+                query = f"""
+                    SELECT {key_expr.replace("s.day", "s.week")}, {label_expr.replace("s.day", "s.week")}, s.sketch
+                    FROM public.active_students_weekly s {joins}
+                    WHERE s.week BETWEEN %s AND %s {course_filter}
+                    UNION ALL
+                    SELECT {key_expr}, {label_expr}, s.sketch
+                    FROM public.active_students_daily s {joins}
+                    WHERE s.day BETWEEN %s AND %s {course_filter}
+                      AND NOT s.day BETWEEN %s AND %s
+                """
+                params = [first_week, last_week] + filter_params
+                params += [start, end] + filter_params + [first_week, last_week + timedelta(days=6)]
+            else:
+                query = f"""
+                    SELECT {key_expr}, {label_expr}, s.sketch
+                    FROM public.active_students_daily s {joins}
+                    WHERE s.day BETWEEN %s AND %s {course_filter}
+                """
+                params = [start, end] + filter_params
+
+            # Server-side cursor: sketches are merged as they stream in
+            stream = conn.cursor(name="active_students")
+            stream.itersize = 2000
+            stream.execute(query, params)
+            groups = {}
+            for key, label, sketch in stream:
+                if key not in groups:
+                    groups[key] = (label, hll.empty())
+                hll.merge_into(groups[key][1], sketch)
+            stream.close()
+            for key in sorted(groups):
+                label, registers = groups[key]
+                value = hll.estimate(registers)
+                low, high = hll.error_bounds(value)
+                results.append({"key": key, "label": label, "active_students": value, "low": low, "high": high})
+        conn.rollback()
         cur.close()
         conn.close()
+
         return jsonify({
             "success": True,
-            "data": {
-                "enrolled": row[0] or 0,
-                "completed": row[1] or 0,
-                "ongoing": row[2] or 0,
-                "grade_distribution": [{"grade": r[0], "count": r[1]} for r in grade_rows]
+            "mode": mode,
+            "relative_standard_error": round(hll.RELATIVE_ERROR, 4) if mode == "approx" else 0,
+            "group_by": group_by,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "groups": results
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+GRADE_HISTOGRAM_MAX_BINS = 50
+GRADE_PERCENTILES = (0.25, 0.5, 0.75, 0.9)
+
+
+@app.route("/api/analyst/grade-histogram", methods=["GET"])
+def analyst_grade_histogram():
+    """
+    Histogram of grade_score (0-100) in equal-width bins plus percentiles,
+    for every course (or the given course_id values) and overall, in one query
+    """
+    try:
+        try:
+            bins = int(request.args.get("bins", "10"))
+        except ValueError:
+            return jsonify({"error": "bins must be an integer"}), 400
+        if not 1 <= bins <= GRADE_HISTOGRAM_MAX_BINS:
+            return jsonify({"error": f"bins must be between 1 and {GRADE_HISTOGRAM_MAX_BINS}"}), 400
+        try:
+            course_ids = read_course_ids()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        course_filter = "AND course_id = ANY(%s::uuid[])" if course_ids else ""
+        params = [bins, bins] + ([course_ids] if course_ids else []) + [list(GRADE_PERCENTILES)]
+
+        conn = get_connection()
+        cur = conn.cursor()
+        # GROUPING SETS add the all-courses row (course_id NULL) in the same pass
+        cur.execute(f"""
+            WITH scored AS (
+                SELECT course_id, grade_score,
+                       LEAST(width_bucket(grade_score, 0, 100, %s), %s) AS bucket
+                FROM public.enrolled_in
+                WHERE grade_score IS NOT NULL {course_filter}
+            ), hist AS (
+                SELECT course_id, jsonb_object_agg(bucket, n) AS counts
+                FROM (
+                    SELECT course_id, bucket, COUNT(*) AS n
+                    FROM scored
+                    GROUP BY GROUPING SETS ((course_id, bucket), (bucket))
+                ) b
+                GROUP BY course_id
+            ), stats AS (
+                SELECT course_id, COUNT(*) AS n, AVG(grade_score) AS mean,
+                       percentile_cont(%s::float8[]) WITHIN GROUP (ORDER BY grade_score) AS pct
+                FROM scored
+                GROUP BY GROUPING SETS ((course_id), ())
+            )
+            SELECT s.course_id, c.title, s.n, s.mean, s.pct, h.counts
+            FROM stats s
+            JOIN hist h ON h.course_id IS NOT DISTINCT FROM s.course_id
+            LEFT JOIN public.course c ON c.course_id = s.course_id
+            ORDER BY s.course_id NULLS FIRST
+        """, params)
+        rows = cur.fetchall()
+        cur.close()
+        conn.close()
+
+        width = 100 / bins
+
+        def summary(row):
+            counts = row[5] or {}
+            return {
+                "count": row[2],
+                "mean": round(float(row[3]), 2) if row[3] is not None else None,
+                "percentiles": {
+                    f"p{int(p * 100)}": round(v, 2) for p, v in zip(GRADE_PERCENTILES, row[4] or [])
+                },
+                "histogram": [counts.get(str(i), 0) for i in range(1, bins + 1)]
             }
+
+        overall = {"count": 0, "mean": None, "percentiles": {}, "histogram": [0] * bins}
+        courses = []
+        for row in rows:
+            if row[0] is None:
+                overall = summary(row)
+            else:
+                courses.append({"course_id": str(row[0]), "title": row[1], **summary(row)})
+
+        return jsonify({
+            "success": True,
+            "bins": [{"lower": round(i * width, 2), "upper": round((i + 1) * width, 2)} for i in range(bins)],
+            "overall": overall,
+            "courses": courses
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+# =============================
+# LIVE INSIGHTS
+# =============================
+
+def insight_enrollment_status(cur, course_id):
+    counts = fetch_course_status_counts(cur, course_id)
+    return [
+        {"name": "Enrolled", "count": counts["enrolled"], "fill": "#475569"},
+        {"name": "Completed", "count": counts["completed"], "fill": "#64748b"},
+        {"name": "Ongoing", "count": counts["ongoing"], "fill": "#94a3b8"},
+    ]
+
+
+# query_spec.kind -> chart_data builder. Every source reads enrolled_in, so
+# course_stats_version tells the refresher when a result is out of date.
+INSIGHT_QUERIES = {
+    "grade_distribution": fetch_course_grade_distribution,
+    "enrollment_status": insight_enrollment_status,
+}
+INSIGHT_REFRESH_SECONDS = int(os.getenv("INSIGHT_REFRESH_SECONDS", "30"))
+INSIGHT_REFRESH_BATCH = 100
+
+
+def compute_insight(cur, course_id, query_spec):
+    """chart_data for a query spec; ValueError if the spec is invalid"""
+    kind = query_spec.get("kind") if isinstance(query_spec, dict) else None
+    if kind not in INSIGHT_QUERIES:
+        raise ValueError(f"query_spec.kind must be one of: {', '.join(INSIGHT_QUERIES)}")
+    return INSIGHT_QUERIES[kind](cur, course_id)
+
+
+@jobs.every(INSIGHT_REFRESH_SECONDS)
+def refresh_live_insights():
+    """Recompute live insights whose course data changed since they were computed"""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        # SKIP LOCKED lets every worker run this without double work
+        cur.execute("""
+            SELECT i.insight_id, i.course_id, i.title, i.query_spec, COALESCE(v.version, 0)
+            FROM public.course_insight i
+            LEFT JOIN public.course_stats_version v ON v.course_id = i.course_id
+            WHERE i.query_spec IS NOT NULL
+              AND i.source_version IS DISTINCT FROM COALESCE(v.version, 0)
+            ORDER BY i.course_id
+            LIMIT %s
+            FOR UPDATE OF i SKIP LOCKED
+        """, (INSIGHT_REFRESH_BATCH,))
+        stale = cur.fetchall()
+
+        results = {}
+        for insight_id, course_id, title, query_spec, version in stale:
+            key = (course_id, json.dumps(query_spec, sort_keys=True))
+            if key not in results:
+                try:
+                    results[key] = json.dumps(compute_insight(cur, course_id, query_spec), default=str)
+                except ValueError:
+                    results[key] = None
+            cur.execute("""
+                UPDATE public.course_insight
+                SET chart_data = COALESCE(%s::jsonb, chart_data), source_version = %s, refreshed_at = now()
+                WHERE insight_id = %s
+            """, (results[key], version, insight_id))
+            notify(cur, "insight", course_id, insight_id=insight_id, title=title, refreshed=True)
+        conn.commit()
+        cur.close()
+        return len(stale)
+    finally:
+        conn.close()
+
+
 @app.route("/api/analyst/insights/post", methods=["POST"])
 def analyst_post_insight():
     """Analyst posts an insight to a course (students enrolled can then see it)"""
@@ -2163,6 +3278,7 @@ def analyst_post_insight():
         title = data.get("title")
         chart_type = data.get("chart_type")
         chart_data = data.get("chart_data")
+        query_spec = data.get("query_spec")  # e.g. {"kind": "grade_distribution"}: kept current
         summary = data.get("summary", "")
 
         if not all([posted_by, course_id, title, chart_type]):
@@ -2177,13 +3293,39 @@ def analyst_post_insight():
             conn.close()
             return jsonify({"error": "Only analysts can post insights"}), 403
 
-        chart_data_json = json.dumps(chart_data) if chart_data is not None else None
+        source_version = None
+        if query_spec is not None:
+            cur.execute("""
+                SELECT COALESCE(v.version, 0)
+                FROM public.course c
+                LEFT JOIN public.course_stats_version v ON v.course_id = c.course_id
+                WHERE c.course_id = %s::uuid
+            """, (course_id,))
+            version = cur.fetchone()
+            if not version:
+                cur.close()
+                conn.close()
+                return jsonify({"error": "Course not found"}), 404
+            try:
+                chart_data = compute_insight(cur, course_id, query_spec)
+            except ValueError as e:
+                cur.close()
+                conn.close()
+                return jsonify({"error": str(e)}), 400
+            source_version = version[0]
+
+        chart_data_json = json.dumps(chart_data, default=str) if chart_data is not None else None
         cur.execute("""
-            INSERT INTO public.course_insight (course_id, posted_by, title, chart_type, chart_data, summary)
-            VALUES (%s::uuid, %s::uuid, %s, %s, %s::jsonb, %s)
+            INSERT INTO public.course_insight
+                (course_id, posted_by, title, chart_type, chart_data, summary,
+                 query_spec, source_version, refreshed_at)
+            VALUES (%s::uuid, %s::uuid, %s, %s, %s::jsonb, %s, %s::jsonb, %s,
+                    CASE WHEN %s IS NOT NULL THEN now() END)
             RETURNING insight_id, created_at
-        """, (course_id, posted_by, title, chart_type, chart_data_json, summary))
+        """, (course_id, posted_by, title, chart_type, chart_data_json, summary,
+              json.dumps(query_spec) if query_spec is not None else None, source_version, source_version))
         out = cur.fetchone()
+        notify(cur, "insight", course_id, insight_id=out[0], title=title)
         conn.commit()
         cur.close()
         conn.close()
@@ -2206,7 +3348,8 @@ def analyst_insights_by_course():
         conn = get_connection()
         cur = conn.cursor()
         cur.execute("""
-            SELECT insight_id, course_id, posted_by, title, chart_type, chart_data, summary, created_at
+            SELECT insight_id, course_id, posted_by, title, chart_type, chart_data, summary, created_at,
+                   query_spec, refreshed_at
             FROM public.course_insight WHERE course_id = %s ORDER BY created_at DESC
         """, (course_id,))
         rows = cur.fetchall()
@@ -2222,7 +3365,9 @@ def analyst_insights_by_course():
                 "chart_type": r[4],
                 "chart_data": r[5],
                 "summary": r[6],
-                "created_at": str(r[7]) if r[7] else None
+                "created_at": str(r[7]) if r[7] else None,
+                "query_spec": r[8],
+                "refreshed_at": str(r[9]) if r[9] else None
             })
         return jsonify({"success": True, "insights": insights})
     except Exception as e:
@@ -2247,7 +3392,7 @@ def student_course_insights(course_id):
             conn.close()
             return jsonify({"error": "Not enrolled in this course"}), 403
         cur.execute("""
-            SELECT insight_id, title, chart_type, chart_data, summary, created_at
+            SELECT insight_id, title, chart_type, chart_data, summary, created_at, refreshed_at
             FROM public.course_insight WHERE course_id = %s ORDER BY created_at DESC
         """, (course_id,))
         rows = cur.fetchall()
@@ -2261,13 +3406,61 @@ def student_course_insights(course_id):
                 "chart_type": r[2],
                 "chart_data": r[3],
                 "summary": r[4],
-                "created_at": str(r[5]) if r[5] else None
+                "created_at": str(r[5]) if r[5] else None,
+                "refreshed_at": str(r[6]) if r[6] else None
             })
         return jsonify({"success": True, "insights": insights})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+# =============================
+# EVENTS (Server-Sent Events)
+# =============================
+
+EVENTS_HEARTBEAT_SECONDS = int(os.getenv("EVENTS_HEARTBEAT_SECONDS", "25"))
+
+
+@app.route("/api/events", methods=["GET"])
+def events_stream():
+    """SSE stream of announcement, grade and insight events for a student's enrolled courses"""
+    try:
+        user_id = request.args.get("user_id")
+        if not user_id:
+            return jsonify({"error": "user_id is required"}), 400
+
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT course_id FROM public.enrolled_in
+            WHERE user_id = %s AND status != 'dropped'
+        """, (user_id,))
+        course_ids = [row[0] for row in cur.fetchall()]
+        cur.close()
+        # Don't hold a DB connection for the life of the stream
+        conn.close()
+
+        sub = broker.subscribe(user_id, course_ids)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = sub.queue.get(timeout=EVENTS_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['kind']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            broker.unsubscribe(sub)
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 # =============================
 # HEALTH CHECK
 # =============================
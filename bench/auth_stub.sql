@@ -0,0 +1,21 @@
+-- Minimal stand-in for the Supabase auth schema, so schema.sql and the
+-- migrations load into a plain local Postgres for benchmarking.
+-- Applied by: python bench/run.py setup
+
+CREATE EXTENSION IF NOT EXISTS pgcrypto;
+
+CREATE SCHEMA IF NOT EXISTS auth;
+
+CREATE TABLE IF NOT EXISTS auth.users (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    email text UNIQUE,
+    encrypted_password text,
+    raw_user_meta_data jsonb DEFAULT '{}'::jsonb,
+    created_at timestamptz DEFAULT now()
+);
+
+-- Policies in schema.sql call auth.uid(); the app connects as the table
+-- owner, so they are never evaluated, but the function must exist
+CREATE OR REPLACE FUNCTION auth.uid() RETURNS uuid AS $$
+    SELECT NULLIF(current_setting('request.jwt.claim.sub', true), '')::uuid
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,337 @@
+"""
+Synthetic data at benchmark scale, loaded with COPY from parallel workers.
+
+    python bench/datagen.py --create --students 2000000 --enrollments 10000000 --workers 8
+
+Skew: course popularity is Zipf-like (--course-skew), so a handful of
+courses hold a large share of enrollments; enrollments per student are
+lognormal, so most students take one or two courses and a long tail takes
+dozens. Enrollment dates lean towards --as-of.
+
+Output is a function of --seed, the sizes, --chunk-students and --as-of
+only: worker count and scheduling do not change a single row. Ids are
+synthetic UUIDs (kind in the first group, row number in the last).
+
+Rows are loaded with session_replication_role = replica, which skips
+triggers and foreign-key checks and needs a superuser. The derived tables
+the triggers normally maintain (rollups, platform stats, course counts,
+activity sketches, materialized views) are rebuilt once at the end.
+Connection settings come from PG* variables, as for bench/run.py.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from datetime import date
+from multiprocessing import Pool
+import numpy as np
+import psycopg2
+from run import ROOT, create_database, finish_load
+
+sys.path.insert(0, ROOT)
+
+KINDS = {"student": 1, "instructor": 2, "course": 3, "university": 4,
+         "assignment": 5, "enroller": 6, "staff": 7, "submission": 8, "content": 9}
+GRADES = ["A+", "A", "A-", "B+", "B", "B-", "C+", "C", "C-", "D", "F"]
+GRADE_SCORES = ["98", "95", "91", "88", "85", "81", "78", "75", "71", "65", "40"]  # public.grade_to_score
+GRADE_WEIGHTS = np.array([4, 10, 10, 12, 14, 12, 10, 9, 7, 7, 5], float)
+LEVELS = ["beginner", "intermediate", "advanced"]
+COUNTRIES = ["India", "USA", "UK", "Germany", "Japan", "Brazil", "Canada", "Nigeria"]
+BRANCHES = ["CSE", "ECE", "ME", "CE", "EE", "IT"]
+MAX_MARKS = [10, 20, 50, 100]
+
+DROP_RATE = 0.10
+COMPLETE_RATE = 0.35
+UNGRADED_RATE = 0.2
+
+
+def uid(kind, n):
+    return f"{KINDS[kind]:08x}-0000-4000-8000-{n:012x}"
+
+
+def uids(kind, numbers):
+    prefix = f"{KINDS[kind]:08x}-0000-4000-8000-"
+    return [f"{prefix}{n:012x}" for n in numbers.tolist()]
+
+
+def _dates(as_of, days_ago):
+    return np.datetime_as_string(np.datetime64(as_of) - days_ago.astype("timedelta64[D]"))
+
+
+def copy_rows(cur, table, columns, rows):
+    """COPY rows (tuples of str or None) into table in text format"""
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join("\\N" if v is None else v for v in row))
+        buf.write("\n")
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
+
+
+class Plan:
+    """Catalog-level choices shared by every worker, derived from the seed"""
+
+    def __init__(self, cfg):
+        rng = np.random.default_rng([cfg["seed"], 1])
+        courses = cfg["courses"]
+        ranks = rng.permutation(courses)
+        weights = 1.0 / (ranks + 1.0) ** cfg["course_skew"]
+        self.course_p = weights / weights.sum()
+        self.course_university = rng.integers(0, cfg["universities"], courses)
+        self.course_level = rng.integers(0, len(LEVELS), courses)
+        self.course_fees = rng.integers(2, 40, courses) * 500
+        self.modules = rng.integers(4, 11, courses)
+        self.assignments = rng.integers(1, 5, courses)
+        self.assignment_offset = np.concatenate(([0], np.cumsum(self.assignments)[:-1]))
+        self.max_marks = np.array(MAX_MARKS)[rng.integers(0, len(MAX_MARKS), int(self.assignments.sum()))]
+        self.course_instructor = rng.integers(0, cfg["instructors"], courses)
+        # Every third course is co-taught
+        self.co_instructor = np.where(np.arange(courses) % 3 == 0,
+                                      rng.integers(0, cfg["instructors"], courses), -1)
+
+
+def load_catalog(conn, cfg, plan):
+    """Universities, courses, staff, modules and assignments (main process)"""
+    rng = np.random.default_rng([cfg["seed"], 3])
+    cur = conn.cursor()
+    n_uni, n_courses, n_inst = cfg["universities"], cfg["courses"], cfg["instructors"]
+
+    copy_rows(cur, "public.university", ["university_id", "name", "country", "ranking", "website"], (
+        (uid("university", u), f"University {u}", COUNTRIES[u % len(COUNTRIES)], str(u + 1),
+         f"https://university{u}.example") for u in range(n_uni)))
+
+    copy_rows(cur, "public.course", ["course_id", "title", "fees", "duration", "level", "description",
+                                     "total_vacancies", "program", "university_id"], (
+        (uid("course", c), f"Course {c}", str(plan.course_fees[c]), f"{4 * (1 + c % 3)} weeks",
+         LEVELS[plan.course_level[c]], f"Synthetic course {c}", "1000", "B.Tech",
+         uid("university", int(plan.course_university[c]))) for c in range(n_courses)))
+
+    accounts = [(uid("instructor", i), f"instructor{i}@bench.local", f"Instructor {i}", "instructor")
+                for i in range(n_inst)]
+    accounts += [(uid("enroller", i), f"enroller{i}@bench.local", f"Enroller {i}", "student")
+                 for i in range(cfg["enrollers"])]
+    accounts += [(uid("staff", 0), "analyst1@bench.local", "Analyst 1", "data_analyst"),
+                 (uid("staff", 1), "admin1@bench.local", "Admin 1", "administrator")]
+    copy_accounts(cur, [(a[0], a[1], a[2], a[3], "2024-01-01") for a in accounts])
+
+    teaches = [(c, int(plan.course_instructor[c])) for c in range(n_courses)]
+    teaches += [(c, int(i)) for c, i in enumerate(plan.co_instructor)
+                if i >= 0 and i != plan.course_instructor[c]]
+    course_counts = np.bincount([i for _, i in teaches], minlength=n_inst)
+    copy_rows(cur, "public.instructor", ["user_id", "branch", "specialization", "hire_year", "total_courses"], (
+        (uid("instructor", i), BRANCHES[i % len(BRANCHES)], "Computer Science",
+         str(2000 + i % 25), str(course_counts[i])) for i in range(n_inst)))
+    copy_rows(cur, "public.teaches", ["instructor_id", "course_id"],
+              ((uid("instructor", i), uid("course", c)) for c, i in teaches))
+    copy_rows(cur, "public.student", ["user_id", "branch", "country"], (
+        (uid("enroller", i), BRANCHES[i % len(BRANCHES)], COUNTRIES[i % len(COUNTRIES)])
+        for i in range(cfg["enrollers"])))
+
+    copy_rows(cur, "public.module", ["course_id", "module_number", "duration", "name"], (
+        (uid("course", c), str(m), "1 week", f"Module {m}")
+        for c in range(n_courses) for m in range(1, plan.modules[c] + 1)))
+
+    def content():
+        n = 0
+        for c in range(n_courses):
+            for m in range(1, plan.modules[c] + 1):
+                for k in range(int(rng.integers(2, 5))):
+                    yield (uid("content", n), uid("course", c), str(m), f"Lesson {m}.{k + 1}",
+                           ("video", "pdf", "link")[k % 3], f"https://content.example/{c}/{m}/{k}")
+                    n += 1
+    copy_rows(cur, "public.module_content", ["content_id", "course_id", "module_number", "title", "type", "url"],
+              content())
+
+    copy_rows(cur, "public.assignment", ["assignment_id", "course_id", "module_number", "instructor_id",
+                                         "title", "due_date", "max_marks"], (
+        (uid("assignment", int(plan.assignment_offset[c]) + k), uid("course", c), str(k + 1),
+         uid("instructor", int(plan.course_instructor[c])), f"Assignment {k + 1}",
+         f"{cfg['as_of']} 23:59:00", str(plan.max_marks[plan.assignment_offset[c] + k]))
+        for c in range(n_courses) for k in range(plan.assignments[c])))
+    cur.close()
+
+
+def copy_accounts(cur, accounts):
+    """auth.users + public.users rows: (id, email, name, role, created_at)"""
+    copy_rows(cur, "auth.users", ["id", "email", "raw_user_meta_data", "created_at"],
+              ((a[0], a[1], json.dumps({"name": a[2]}), a[4]) for a in accounts))
+    copy_rows(cur, "public.users", ["user_id", "name", "email", "role", "approved", "created_at"],
+              ((a[0], a[2], a[1], a[3], "t", a[4]) for a in accounts))
+
+
+_worker = {}
+
+
+def _init_worker(cfg, db_name):
+    conn = psycopg2.connect(dbname=db_name)
+    cur = conn.cursor()
+    cur.execute("SET session_replication_role = replica")
+    cur.close()
+    conn.commit()
+    _worker.update(conn=conn, cfg=cfg, plan=Plan(cfg))
+
+
+def load_student_chunk(chunk):
+    """Students [chunk * size, ...) with their enrollments and submissions, one transaction"""
+    cfg, plan, conn = _worker["cfg"], _worker["plan"], _worker["conn"]
+    rng = np.random.default_rng([cfg["seed"], 2, chunk])
+    first = chunk * cfg["chunk_students"]
+    n = min(cfg["chunk_students"], cfg["students"] - first)
+    n_courses = cfg["courses"]
+
+    # Enrollments per student: lognormal with the requested mean, at least one
+    mean = cfg["enrollments"] / cfg["students"]
+    sigma = cfg["student_sigma"]
+    per_student = np.clip(np.rint(rng.lognormal(np.log(mean) - sigma * sigma / 2, sigma, n)),
+                          1, min(cfg["max_per_student"], n_courses)).astype(np.int64)
+    # Oversample course picks, drop repeats (hot courses come up often), then
+    # keep each student's first per_student distinct picks
+    student = np.repeat(np.arange(n), per_student + per_student // 2 + 2)
+    course = rng.choice(n_courses, size=student.size, p=plan.course_p)
+    _, first_pick = np.unique(student * n_courses + course, return_index=True)
+    first_pick.sort()
+    student, course = student[first_pick], course[first_pick]
+    rank = np.arange(student.size) - np.searchsorted(student, student)
+    keep = rank < per_student[student]
+    student, course = student[keep], course[keep]
+    m = student.size
+
+    days_ago = (cfg["days"] * (1 - np.sqrt(rng.random(m)))).astype(np.int64)
+    roll = rng.random(m)
+    dropped = roll < DROP_RATE
+    completed = ~dropped & (roll < DROP_RATE + COMPLETE_RATE) & (days_ago >= 30)
+    completion_ago = np.maximum(days_ago - rng.integers(30, 121, m), 0)
+    grade = rng.choice(len(GRADES), m, p=GRADE_WEIGHTS / GRADE_WEIGHTS.sum())
+    status = np.where(dropped, "dropped", np.where(completed, "completed", "ongoing"))
+    enroll_dates = _dates(cfg["as_of"], days_ago)
+    completion_dates = _dates(cfg["as_of"], completion_ago)
+
+    student_ids = uids("student", first + np.arange(n))
+    starts = np.searchsorted(student, np.arange(n))
+    first_enroll = _dates(cfg["as_of"], np.maximum.reduceat(days_ago, starts) + 1)
+    enrolled_counts = np.bincount(student[~dropped], minlength=n)
+    completed_counts = np.bincount(student[completed], minlength=n)
+
+    cur = conn.cursor()
+    copy_accounts(cur, [(student_ids[i], f"student{first + i}@bench.local", f"Student {first + i}",
+                         "student", first_enroll[i]) for i in range(n)])
+    copy_rows(cur, "public.student", ["user_id", "branch", "country", "total_courses_enrolled",
+                                      "total_courses_completed"], (
+        (student_ids[i], BRANCHES[(first + i) % len(BRANCHES)], COUNTRIES[(first + i) % len(COUNTRIES)],
+         str(enrolled_counts[i]), str(completed_counts[i])) for i in range(n)))
+
+    course_ids = uids("course", np.arange(n_courses))
+    copy_rows(cur, "public.enrolled_in", ["user_id", "course_id", "enroll_date", "status", "grade",
+                                          "grade_score", "completion_date"], (
+        (student_ids[student[j]], course_ids[course[j]], enroll_dates[j], status[j],
+         GRADES[grade[j]] if completed[j] else None,
+         GRADE_SCORES[grade[j]] if completed[j] else None,
+         completion_dates[j] if completed[j] else None) for j in range(m)))
+
+    # Each active enrollment submits each of its course's assignments with --submit-rate
+    active = np.flatnonzero(~dropped)
+    counts = plan.assignments[course[active]]
+    enrollment = np.repeat(active, counts)
+    nth = np.arange(enrollment.size) - np.repeat(np.cumsum(counts) - counts, counts)
+    keep = rng.random(enrollment.size) < cfg["submit_rate"]
+    enrollment, nth = enrollment[keep], nth[keep]
+    assignment = plan.assignment_offset[course[enrollment]] + nth
+    submitted_ago = np.maximum(days_ago[enrollment] - rng.integers(1, 60, enrollment.size), 0)
+    submitted = _dates(cfg["as_of"], submitted_ago)
+    seconds = rng.integers(0, 86400, enrollment.size)
+    marks = np.round(rng.random(enrollment.size) * plan.max_marks[assignment], 1)
+    graded = rng.random(enrollment.size) >= UNGRADED_RATE
+    submission_ids = uids("submission", (chunk << 28) + np.arange(enrollment.size))
+    assignment_ids = uids("assignment", assignment)
+    copy_rows(cur, "public.assignment_submission", ["submission_id", "assignment_id", "student_id",
+                                                    "submission_url", "submitted_at", "marks_obtained"], (
+        (submission_ids[j], assignment_ids[j], student_ids[student[enrollment[j]]],
+         f"https://submissions.example/{submission_ids[j]}",
+         f"{submitted[j]} {seconds[j] // 3600:02d}:{seconds[j] // 60 % 60:02d}:{seconds[j] % 60:02d}",
+         str(marks[j]) if graded[j] else None) for j in range(enrollment.size)))
+
+    conn.commit()
+    cur.close()
+    return n, m, int(enrollment.size)
+
+
+def rebuild_derived(conn, sketches=True):
+    """Recompute what the skipped triggers would have maintained"""
+    import hll
+
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE public.course c SET total_enrollments = e.n
+        FROM (SELECT course_id, COUNT(*) AS n FROM public.enrolled_in
+              WHERE status != 'dropped' GROUP BY course_id) e
+        WHERE e.course_id = c.course_id
+    """)
+    cur.execute("SELECT public.backfill_enrollment_rollups()")
+    conn.commit()
+    if sketches:
+        hll.backfill(conn)
+    conn.autocommit = True
+    finish_load(cur)
+    cur.close()
+
+
+def generate(cfg, db_name, workers, sketches=True):
+    started = time.monotonic()
+    plan = Plan(cfg)
+    conn = psycopg2.connect(dbname=db_name)
+    cur = conn.cursor()
+    cur.execute("SET session_replication_role = replica")
+    load_catalog(conn, cfg, plan)
+    conn.commit()
+    print(f"catalog loaded in {time.monotonic() - started:.1f}s", file=sys.stderr)
+
+    chunks = range((cfg["students"] + cfg["chunk_students"] - 1) // cfg["chunk_students"])
+    totals = np.zeros(3, np.int64)
+    with Pool(workers, initializer=_init_worker, initargs=(cfg, db_name)) as pool:
+        for done, result in enumerate(pool.imap_unordered(load_student_chunk, chunks), 1):
+            totals += result
+            print(f"chunk {done}/{len(chunks)}: {totals[0]} students, {totals[1]} enrollments, "
+                  f"{totals[2]} submissions, {time.monotonic() - started:.0f}s", file=sys.stderr)
+
+    cur.execute("SET session_replication_role = DEFAULT")
+    cur.close()
+    conn.commit()
+    rebuild_derived(conn, sketches)
+    conn.close()
+    print(f"done in {time.monotonic() - started:.0f}s", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark data")
+    parser.add_argument("--db-name", default="mooc_bench")
+    parser.add_argument("--create", action="store_true", help="recreate the database and schema first")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--as-of", default=date.today().isoformat(), help="latest enrollment date")
+    parser.add_argument("--universities", type=int, default=200)
+    parser.add_argument("--courses", type=int, default=5000)
+    parser.add_argument("--instructors", type=int, default=2000)
+    parser.add_argument("--students", type=int, default=2000000)
+    parser.add_argument("--enrollers", type=int, default=2000, help="students without enrollments, for bench enroll")
+    parser.add_argument("--enrollments", type=int, default=10000000, help="target total (approximate)")
+    parser.add_argument("--days", type=int, default=730, help="enrollment history length")
+    parser.add_argument("--course-skew", type=float, default=1.1, help="Zipf exponent of course popularity")
+    parser.add_argument("--student-sigma", type=float, default=1.0, help="spread of enrollments per student")
+    parser.add_argument("--max-per-student", type=int, default=60)
+    parser.add_argument("--submit-rate", type=float, default=0.3)
+    parser.add_argument("--chunk-students", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--no-sketches", action="store_true", help="skip the activity sketch backfill")
+    args = parser.parse_args()
+
+    cfg = {key: getattr(args, key) for key in (
+        "seed", "as_of", "universities", "courses", "instructors", "students", "enrollers", "enrollments",
+        "days", "course_skew", "student_sigma", "max_per_student", "submit_rate", "chunk_students")}
+    if args.create:
+        create_database(args.db_name)
+    generate(cfg, args.db_name, args.workers, sketches=not args.no_sketches)
+
+
+if __name__ == "__main__":
+    main()
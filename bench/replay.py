@@ -0,0 +1,160 @@
+"""
+Replay captured traffic (see traffic.py) against a staging instance.
+
+    python bench/replay.py captures/ --url http://staging:8000 --speed 5 --out replay.json
+
+Requests are issued at their captured offsets from the first request,
+divided by --speed, so inter-arrival times keep their shape at 1x, 5x or
+10x. Per route the report compares replayed latency (measured here, so it
+includes the network) with the captured server-side duration (captured_*
+vs replay_*) and counts status codes that differ from the capture. Masked
+fields (passwords, tokens) are sent as captured, so auth routes are
+expected to fail unless --password is given.
+Scheduling lag (how late requests left the replayer) is reported so an
+overloaded client is not mistaken for a slow server.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import requests
+from run import _git_revision, percentile
+
+MASK = "***"
+
+
+def load_capture(paths):
+    """Captured requests from files or directories, ordered by start time"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += glob.glob(os.path.join(path, "traffic-*.jsonl*"))
+        else:
+            files.append(path)
+    records = []
+    for name in files:
+        with open(name) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+def _unmask(value, password):
+    if isinstance(value, dict):
+        return {k: _unmask(v, password) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_unmask(v, password) for v in value]
+    return password if value == MASK and password is not None else value
+
+
+def replay(records, base_url, speed, concurrency, password=None, limit=None):
+    """Issue records on their (scaled) schedule; returns per-record results"""
+    if limit:
+        records = records[:limit]
+    results = [None] * len(records)
+    local = threading.local()
+
+    def send(i, record, due):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        lag = time.monotonic() - due
+        t0 = time.perf_counter()
+        try:
+            response = session.request(record["method"], base_url + record["path"], params=record.get("args"),
+                                       json=_unmask(record.get("body"), password), timeout=60)
+            status = response.status_code
+        except requests.RequestException:
+            status = None
+        results[i] = (status, time.perf_counter() - t0, lag)
+
+    first = records[0]["ts"] if records else 0
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, record in enumerate(records):
+            due = start + (record["ts"] - first) / speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, i, record, due)
+    return records, results, time.monotonic() - start
+
+
+def summarize(records, results, elapsed):
+    by_route = {}
+    for record, (status, seconds, lag) in zip(records, results):
+        route = record.get("route") or record["path"]
+        entry = by_route.setdefault(route, {"captured": [], "replayed": [], "lag": [], "errors": 0, "mismatch": 0})
+        entry["captured"].append(record["duration_ms"])
+        entry["replayed"].append(seconds * 1000)
+        entry["lag"].append(lag * 1000)
+        if status is None or status >= 500:
+            entry["errors"] += 1
+        if status != record.get("status"):
+            entry["mismatch"] += 1
+
+    routes = {}
+    for route, entry in sorted(by_route.items()):
+        captured, replayed = sorted(entry["captured"]), sorted(entry["replayed"])
+        row = {"requests": len(replayed), "errors": entry["errors"], "status_mismatch": entry["mismatch"]}
+        for q in (50, 95, 99):
+            c, r = percentile(captured, q), percentile(replayed, q)
+            row[f"captured_p{q}_ms"] = round(c, 2)
+            row[f"replay_p{q}_ms"] = round(r, 2)
+            row[f"delta_p{q}_ms"] = round(r - c, 2)
+        row["max_lag_ms"] = round(max(entry["lag"]), 2)
+        routes[route] = row
+    lags = sorted(lag * 1000 for _, _, lag in results)
+    return {
+        "requests": len(results),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else None,
+        "lag_p99_ms": round(percentile(lags, 99), 2) if lags else None,
+        "routes": routes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured traffic")
+    parser.add_argument("capture", nargs="+", help="capture files or directories")
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression: 1, 5, 10, ...")
+    parser.add_argument("--concurrency", type=int, default=64, help="max requests in flight")
+    parser.add_argument("--password", help="sent in place of masked fields")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    records = load_capture(args.capture)
+    if not records:
+        raise SystemExit("No captured requests found")
+    records, results, elapsed = replay(records, args.url.rstrip("/"), args.speed, args.concurrency,
+                                       args.password, args.limit)
+    report = {
+        "revision": _git_revision(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "url": args.url,
+        "speed": args.speed,
+        **summarize(records, results, elapsed),
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    print(f"{report['requests']} requests in {report['elapsed_s']}s, "
+          f"scheduling lag p99 {report['lag_p99_ms']} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+"""
+Endpoint benchmarks against a seeded local Postgres.
+
+    python bench/run.py setup                      # (re)create mooc_bench: auth stub, schema, migrations, fixture
+    python bench/run.py run --out before.json      # start stub + app, drive every family, write JSON
+    python bench/run.py compare before.json after.json
+    python bench/run.py serving                    # gunicorn defaults vs gunicorn.conf.py
+
+For production-scale data, load with bench/datagen.py instead of setup.
+
+Postgres connection settings come from the usual PG* variables (PGHOST must
+be localhost/127.0.0.1 so the app skips SSL). Supabase Auth is replaced by
+bench/supabase_stub.py. The app is started with the Procfile's web command
+unless --server-cmd or --url is given.
+
+Each family runs for --duration seconds at --concurrency client threads after
+an unrecorded --warmup. Results are per route (URL rule), so numbers line up
+across commits as long as setup is re-run with the same sizes.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+import psycopg2
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH = os.path.join(ROOT, "bench")
+
+# Creation order; later files build on earlier ones
+MIGRATIONS = [
+    "add_approved_column.sql",
+    "add_announcements_table.sql",
+    "add_course_content_version.sql",
+    "add_assignment_tables.sql",
+    "add_platform_stats.sql",
+    "add_analytics_views.sql",
+    "add_enrollment_rollups.sql",
+    "add_enrollment_change_log.sql",
+    "add_grade_score.sql",
+    "add_live_insights.sql",
+    "add_funnel_indexes.sql",
+    "add_activity_sketches.sql",
+]
+
+DEFAULT_SIZES = {"students": 2000, "enrollers": 2000, "instructors": 20, "courses": 50, "per_student": 3}
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def _connect(db_name):
+    return psycopg2.connect(dbname=db_name)
+
+
+def create_database(db_name):
+    """Drop and recreate the benchmark database with the schema and migrations"""
+    admin = _connect("postgres")
+    admin.autocommit = True
+    cur = admin.cursor()
+    cur.execute(f'DROP DATABASE IF EXISTS "{db_name}"')
+    cur.execute(f'CREATE DATABASE "{db_name}"')
+    cur.close()
+    admin.close()
+
+    conn = _connect(db_name)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(_read(os.path.join(BENCH, "auth_stub.sql")))
+    cur.execute(_read(os.path.join(ROOT, "schema.sql")))
+    for name in MIGRATIONS:
+        cur.execute(_read(os.path.join(ROOT, "migrations", name)))
+    print(f"Schema and {len(MIGRATIONS)} migrations applied to {db_name}")
+    cur.close()
+    conn.close()
+
+
+def setup(db_name, sizes):
+    """Recreate the benchmark database and load the fixture"""
+    create_database(db_name)
+    conn = _connect(db_name)
+    conn.autocommit = True
+    load_fixture(conn, sizes)
+    conn.close()
+
+
+def load_fixture(conn, sizes):
+    cur = conn.cursor()
+    cur.execute(_read(os.path.join(BENCH, "seed.sql")), sizes)
+    finish_load(cur)
+    cur.close()
+
+
+def finish_load(cur):
+    """Bring derived tables and views up to date after a bulk load"""
+    cur.execute("SELECT public.recount_platform_stats()")
+    cur.execute("SELECT public.merge_enrollment_rollups(NULL)")
+    cur.execute("REFRESH MATERIALIZED VIEW public.course_stats_mv")
+    cur.execute("REFRESH MATERIALIZED VIEW public.level_enrollment_mv")
+    cur.execute("UPDATE public.analytics_refresh SET refreshed_at = now(), dirty = false")
+    cur.execute("ANALYZE")
+
+
+class Fixture:
+    """Ids the scenarios draw from, read once from the benchmark database"""
+
+    def __init__(self, db_name):
+        conn = _connect(db_name)
+        cur = conn.cursor()
+        # Enrollments made by a previous run are removed first, so runs start
+        # equal and none of them are drawn into self.enrollments below
+        cur.execute("DELETE FROM public.enrolled_in WHERE user_id IN "
+                    "(SELECT user_id FROM public.users WHERE email LIKE 'enroller%')")
+        cur.execute("SELECT course_id::text FROM public.course ORDER BY title")
+        self.courses = [r[0] for r in cur.fetchall()]
+        cur.execute("SELECT instructor_id::text, course_id::text FROM public.teaches ORDER BY 1, 2")
+        self.teaching = cur.fetchall()
+        cur.execute("""
+            SELECT user_id::text, course_id::text FROM public.enrolled_in
+            WHERE status != 'dropped' ORDER BY 1, 2 LIMIT 5000
+        """)
+        self.enrollments = cur.fetchall()
+        cur.execute("""
+            SELECT assignment_id::text, instructor_id::text FROM public.assignment
+            ORDER BY 1
+        """)
+        self.assignments = cur.fetchall()
+        cur.execute("SELECT email FROM public.users WHERE role = 'student' ORDER BY email LIMIT 1000")
+        self.student_emails = [r[0] for r in cur.fetchall()]
+        cur.execute("SELECT user_id::text FROM public.users WHERE email LIKE 'enroller%' ORDER BY email")
+        enrollers = [r[0] for r in cur.fetchall()]
+        # Each enroll request takes the next unused (student, course) pair;
+        # the pool holds enrollers x courses pairs (setup --enrollers)
+        self._enroll_pairs = iter([(u, c) for u in enrollers for c in self.courses])
+        self.enroll_pairs_exhausted = 0
+        self._lock = threading.Lock()
+        conn.commit()
+        cur.close()
+        conn.close()
+
+    def next_enroll_pair(self):
+        """Next unused pair, or None (counted) once the pool is used up"""
+        with self._lock:
+            pair = next(self._enroll_pairs, None)
+            if pair is None:
+                self.enroll_pairs_exhausted += 1
+            return pair
+
+
+# family -> [(route rule, request builder)]; builders return (method, path, params, json)
+def _scenarios(fx):
+    def pick(items, rng):
+        return items[rng.randrange(len(items))]
+
+    def enroll(rng):
+        # Past the pool this re-enrolls an existing pair (the 400 path); run()
+        # reports how often that happened
+        pair = fx.next_enroll_pair() or pick(fx.enrollments, rng)
+        return "POST", "/api/courses/enroll", None, {"user_id": pair[0], "course_id": pair[1]}
+
+    def student_modules(rng):
+        user_id, course_id = pick(fx.enrollments, rng)
+        return "GET", f"/api/student/courses/{course_id}/modules", {"user_id": user_id}, None
+
+    def my_courses(rng):
+        return "GET", "/api/courses/my-courses", {"user_id": pick(fx.enrollments, rng)[0]}, None
+
+    def roster(rng):
+        instructor_id, course_id = pick(fx.teaching, rng)
+        return "GET", f"/api/instructor/courses/{course_id}/students", {"instructor_id": instructor_id}, None
+
+    def submissions(rng):
+        assignment_id, instructor_id = pick(fx.assignments, rng)
+        return ("GET", f"/api/instructor/assignments/{assignment_id}/submissions",
+                {"instructor_id": instructor_id}, None)
+
+    def login(rng):
+        return "POST", "/api/login", None, {"email": pick(fx.student_emails, rng), "password": "bench"}
+
+    def get(path, params=None):
+        return lambda rng: ("GET", path, params, None)
+
+    return {
+        "catalog": [("/api/courses", get("/api/courses"))],
+        "auth": [("/api/login", login)],
+        "enroll": [("/api/courses/enroll", enroll)],
+        "student": [
+            ("/api/student/courses/<course_id>/modules", student_modules),
+            ("/api/courses/my-courses", my_courses),
+        ],
+        "instructor": [("/api/instructor/courses/<course_id>/students", roster)],
+        "submissions": [("/api/instructor/assignments/<assignment_id>/submissions", submissions)],
+        "analyst": [
+            ("/api/analyst/overview", get("/api/analyst/overview")),
+            ("/api/analyst/courses", get("/api/analyst/courses")),
+            ("/api/analyst/trends", get("/api/analyst/trends", {"grain": "week"})),
+            ("/api/analyst/grade-histogram", get("/api/analyst/grade-histogram")),
+            ("/api/analyst/funnel", get("/api/analyst/funnel")),
+        ],
+    }
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def drive(base_url, routes, concurrency, duration, warmup, seed):
+    """Run routes round-robin from concurrency threads; returns {rule: [(ok, seconds)]}"""
+    samples = {rule: [] for rule, _ in routes}
+    lock = threading.Lock()
+    start = time.monotonic()
+    record_from = start + warmup
+    stop_at = record_from + duration
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        session = requests.Session()
+        local = {rule: [] for rule, _ in routes}
+        i = index
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+            rule, build = routes[i % len(routes)]
+            i += 1
+            method, path, params, body = build(rng)
+            t0 = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, params=params, json=body, timeout=60)
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - t0
+            if now >= record_from:
+                local[rule].append((ok, elapsed))
+        with lock:
+            for rule, values in local.items():
+                samples[rule].extend(values)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples
+
+
+def summarize(samples, duration):
+    result = {}
+    for rule, values in samples.items():
+        latencies = sorted(s for ok, s in values)
+        errors = sum(1 for ok, _ in values if not ok)
+        result[rule] = {
+            "requests": len(values),
+            "errors": errors,
+            "throughput_rps": round(len(values) / duration, 2),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+            "p50_ms": _ms(percentile(latencies, 50)),
+            "p95_ms": _ms(percentile(latencies, 95)),
+            "p99_ms": _ms(percentile(latencies, 99)),
+        }
+    return result
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def _git_revision():
+    try:
+        rev = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD", "--", "*.py", "*.sql"], cwd=ROOT) != 0
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def procfile_command():
+    for line in _read(os.path.join(ROOT, "Procfile")).splitlines():
+        if line.startswith("web:"):
+            return line[len("web:"):].strip()
+    raise SystemExit("Procfile has no web process")
+
+
+def app_env(db_name, port, stub_port):
+    env = dict(os.environ)
+    env.update({
+        "PORT": str(port),
+        "DB_HOST": os.getenv("PGHOST", "localhost"),
+        "DB_PORT": os.getenv("PGPORT", "5432"),
+        "DB_NAME": db_name,
+        "DB_USER": os.getenv("PGUSER", os.getenv("USER", "postgres")),
+        "DB_PASSWORD": os.getenv("PGPASSWORD", ""),
+        "SUPABASE_URL": f"http://127.0.0.1:{stub_port}",
+        "SUPABASE_ANON_KEY": "bench",
+        "SUPABASE_SERVICE_KEY": "bench",
+    })
+    return env
+
+
+def _wait_healthy(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"Server exited with status {process.returncode}")
+        try:
+            if requests.get(url + "/api/health", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"Server at {url} did not become healthy")
+
+
+def run(args):
+    fixture = Fixture(args.db_name)
+    scenarios = _scenarios(fixture)
+    families = args.families or list(scenarios)
+    unknown = set(families) - set(scenarios)
+    if unknown:
+        raise SystemExit(f"Unknown families: {', '.join(sorted(unknown))}")
+
+    processes = []
+    try:
+        if args.url:
+            base_url, server_cmd = args.url.rstrip("/"), None
+        else:
+            processes.append(subprocess.Popen(
+                [sys.executable, os.path.join(BENCH, "supabase_stub.py"),
+                 "--port", str(args.stub_port), "--db-name", args.db_name]))
+            server_cmd = args.server_cmd or procfile_command()
+            processes.append(subprocess.Popen(
+                server_cmd, shell=True, cwd=ROOT, env=app_env(args.db_name, args.port, args.stub_port)))
+            base_url = f"http://127.0.0.1:{args.port}"
+        _wait_healthy(base_url, processes[-1] if processes else None)
+
+        report = {
+            "revision": _git_revision(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "server_cmd": server_cmd,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "seed": args.seed,
+            "families": {},
+            "routes": {},
+        }
+        for family in families:
+            samples = drive(base_url, scenarios[family], args.concurrency, args.duration, args.warmup, args.seed)
+            routes = summarize(samples, args.duration)
+            total = sum(r["requests"] for r in routes.values())
+            report["families"][family] = {
+                "requests": total,
+                "errors": sum(r["errors"] for r in routes.values()),
+                "throughput_rps": round(total / args.duration, 2),
+            }
+            if family == "enroll":
+                report["families"][family]["enroll_pairs_exhausted"] = fixture.enroll_pairs_exhausted
+                if fixture.enroll_pairs_exhausted:
+                    print(f"enroll: {fixture.enroll_pairs_exhausted} requests re-enrolled existing pairs; "
+                          "re-run setup with more --enrollers", file=sys.stderr)
+            report["routes"].update(routes)
+            print(f"{family}: {report['families'][family]['throughput_rps']} req/s", file=sys.stderr)
+    finally:
+        for p in reversed(processes):
+            p.terminate()
+            try:
+                p.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+def compare(before_path, after_path):
+    """Print throughput and latency change per route between two run reports"""
+    before = json.loads(_read(before_path))
+    after = json.loads(_read(after_path))
+    print(f"{before.get('revision')} -> {after.get('revision')}")
+
+    def delta(a, b):
+        if not a or b is None:
+            return "    n/a"
+        return f"{(b - a) / a * 100:+6.1f}%"
+
+    print(f"{'route':58} {'rps':>9} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for rule in sorted(set(before["routes"]) & set(after["routes"])):
+        a, b = before["routes"][rule], after["routes"][rule]
+        print(f"{rule:58} {delta(a['throughput_rps'], b['throughput_rps']):>9} "
+              f"{delta(a['p50_ms'], b['p50_ms']):>8} {delta(a['p95_ms'], b['p95_ms']):>8} "
+              f"{delta(a['p99_ms'], b['p99_ms']):>8}")
+
+
+SERVING_PROFILES = {
+    "default": "gunicorn app:app",
+    "tuned": "gunicorn -c gunicorn.conf.py app:app",
+}
+
+
+def serving(args):
+    """Run the suite under gunicorn's defaults and the serving profile, then compare"""
+    os.makedirs(args.out_dir, exist_ok=True)
+    paths = []
+    for name, cmd in SERVING_PROFILES.items():
+        path = os.path.join(args.out_dir, f"serving-{name}.json")
+        run(argparse.Namespace(**{**vars(args), "server_cmd": cmd, "url": None, "out": path}))
+        paths.append(path)
+    compare(*paths)
+
+
+def _add_run_options(parser):
+    parser.add_argument("--db-name", default="mooc_bench")
+    parser.add_argument("--families", nargs="+")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8055)
+    parser.add_argument("--stub-port", type=int, default=54321)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endpoint benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_setup = sub.add_parser("setup", help="recreate and seed the benchmark database")
+    p_setup.add_argument("--db-name", default="mooc_bench")
+    for key, value in DEFAULT_SIZES.items():
+        p_setup.add_argument(f"--{key.replace('_', '-')}", type=int, default=value)
+
+    p_run = sub.add_parser("run", help="benchmark the endpoint families")
+    _add_run_options(p_run)
+    p_run.add_argument("--server-cmd", help="command that serves the app on $PORT (default: Procfile web)")
+    p_run.add_argument("--url", help="benchmark an already running server instead")
+    p_run.add_argument("--out")
+
+    p_compare = sub.add_parser("compare", help="diff two run reports")
+    p_compare.add_argument("before")
+    p_compare.add_argument("after")
+
+    p_serving = sub.add_parser("serving", help="compare gunicorn defaults with gunicorn.conf.py")
+    _add_run_options(p_serving)
+    p_serving.add_argument("--out-dir", default="bench-results")
+
+    args = parser.parse_args()
+    if args.command == "setup":
+        setup(args.db_name, {key: getattr(args, key) for key in DEFAULT_SIZES})
+    elif args.command == "run":
+        run(args)
+    elif args.command == "serving":
+        serving(args)
+    else:
+        compare(args.before, args.after)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+-- Deterministic benchmark fixture. Ids are md5-derived and every choice is a
+-- function of the row number, so each setup (and each commit) gets the same
+-- rows. Sizes are psycopg2 parameters supplied by bench/run.py.
+-- Enrollment dates are relative to current_date so the trend/funnel windows
+-- always have data.
+
+INSERT INTO public.university (university_id, name, country, ranking, website)
+SELECT md5('university' || n)::uuid, 'University ' || n,
+       (ARRAY['India', 'USA', 'UK', 'Germany', 'Japan'])[mod(n, 5) + 1],
+       n * 10, 'https://university' || n || '.example'
+FROM generate_series(1, 10) n;
+
+-- Accounts: auth.users rows create public.users through on_auth_user_created
+INSERT INTO auth.users (id, email, raw_user_meta_data)
+SELECT md5('student' || n)::uuid, 'student' || n || '@bench.local', jsonb_build_object('name', 'Student ' || n)
+FROM generate_series(1, %(students)s) n;
+
+-- Students with no enrollments, reserved for the enroll scenario
+INSERT INTO auth.users (id, email, raw_user_meta_data)
+SELECT md5('enroller' || n)::uuid, 'enroller' || n || '@bench.local', jsonb_build_object('name', 'Enroller ' || n)
+FROM generate_series(1, %(enrollers)s) n;
+
+INSERT INTO auth.users (id, email, raw_user_meta_data)
+SELECT md5('instructor' || n)::uuid, 'instructor' || n || '@bench.local', jsonb_build_object('name', 'Instructor ' || n)
+FROM generate_series(1, %(instructors)s) n;
+
+INSERT INTO auth.users (id, email, raw_user_meta_data) VALUES
+    (md5('analyst1')::uuid, 'analyst1@bench.local', '{"name": "Analyst 1"}'),
+    (md5('admin1')::uuid, 'admin1@bench.local', '{"name": "Admin 1"}');
+
+UPDATE public.users SET approved = true,
+    role = CASE
+        WHEN email LIKE 'instructor%%' THEN 'instructor'
+        WHEN email LIKE 'analyst%%' THEN 'data_analyst'
+        WHEN email LIKE 'admin%%' THEN 'administrator'
+        ELSE 'student'
+    END;
+
+INSERT INTO public.student (user_id, branch, country)
+SELECT user_id, (ARRAY['CSE', 'ECE', 'ME', 'CE'])[mod(abs(hashtext(email)), 4) + 1], 'India'
+FROM public.users WHERE role = 'student';
+
+INSERT INTO public.instructor (user_id, branch, specialization, hire_year)
+SELECT user_id, 'CSE', 'Computer Science', 2015
+FROM public.users WHERE role = 'instructor';
+
+INSERT INTO public.course (course_id, title, fees, duration, level, description, total_vacancies, program, university_id)
+SELECT md5('course' || n)::uuid, 'Course ' || n, 1000 + mod(n * 37, 9) * 500,
+       (ARRAY['4 weeks', '8 weeks', '12 weeks'])[mod(n, 3) + 1],
+       (ARRAY['beginner', 'intermediate', 'advanced'])[mod(n, 3) + 1],
+       'Benchmark course ' || n, 500, 'B.Tech', md5('university' || (mod(n, 10) + 1))::uuid
+FROM generate_series(1, %(courses)s) n;
+
+INSERT INTO public.teaches (instructor_id, course_id)
+SELECT md5('instructor' || (mod(n - 1, %(instructors)s) + 1))::uuid, md5('course' || n)::uuid
+FROM generate_series(1, %(courses)s) n;
+
+-- Student s takes per_student distinct courses; 30%% completed, 10%% dropped
+INSERT INTO public.enrolled_in (user_id, course_id, enroll_date, status, grade, completion_date)
+SELECT md5('student' || s)::uuid,
+       md5('course' || (mod(s * 7 + j * 13, %(courses)s) + 1))::uuid,
+       current_date - mod(s * 31 + j * 17, 365),
+       CASE WHEN mod(s + j, 10) < 3 THEN 'completed' WHEN mod(s + j, 10) = 3 THEN 'dropped' ELSE 'ongoing' END,
+       CASE WHEN mod(s + j, 10) < 3 THEN (ARRAY['A', 'B', 'C', 'D'])[mod(s * j, 4) + 1] END,
+       CASE WHEN mod(s + j, 10) < 3 THEN current_date - mod(s * 31 + j * 17, 365) + 30 END
+FROM generate_series(1, %(students)s) s
+CROSS JOIN generate_series(0, %(per_student)s - 1) j
+ON CONFLICT DO NOTHING;
+
+UPDATE public.enrolled_in SET grade_score = public.grade_to_score(grade) WHERE grade IS NOT NULL;
+
+INSERT INTO public.module (course_id, module_number, duration, name)
+SELECT md5('course' || c)::uuid, m, '1 week', 'Module ' || m
+FROM generate_series(1, %(courses)s) c CROSS JOIN generate_series(1, 5) m;
+
+INSERT INTO public.module_content (course_id, module_number, title, type, url)
+SELECT md5('course' || c)::uuid, m, 'Lesson ' || m || '.' || k,
+       (ARRAY['video', 'pdf', 'link'])[k], 'https://content.example/' || c || '/' || m || '/' || k
+FROM generate_series(1, %(courses)s) c CROSS JOIN generate_series(1, 5) m CROSS JOIN generate_series(1, 3) k;
+
+INSERT INTO public.assignment (assignment_id, course_id, module_number, instructor_id, title, due_date, max_marks)
+SELECT md5('assignment' || c || '-' || k)::uuid, md5('course' || c)::uuid, k,
+       md5('instructor' || (mod(c - 1, %(instructors)s) + 1))::uuid,
+       'Assignment ' || k, now() + interval '30 days', 20
+FROM generate_series(1, %(courses)s) c CROSS JOIN generate_series(1, 3) k;
+
+-- About 70%% of active enrollments submit each assignment
+INSERT INTO public.assignment_submission (assignment_id, student_id, submission_url, submitted_at, marks_obtained)
+SELECT a.assignment_id, e.user_id, 'https://submissions.example/' || a.assignment_id || '/' || e.user_id,
+       e.enroll_date + 7, mod(abs(hashtext(a.assignment_id::text || e.user_id::text)), 21)
+FROM public.enrolled_in e
+JOIN public.assignment a ON a.course_id = e.course_id
+WHERE e.status != 'dropped'
+  AND mod(abs(hashtext(e.user_id::text || a.assignment_id::text)), 10) < 7;
+
+INSERT INTO public.announcement (course_id, instructor_id, title, content)
+SELECT md5('course' || c)::uuid, md5('instructor' || (mod(c - 1, %(instructors)s) + 1))::uuid,
+       'Announcement ' || k, 'Benchmark announcement ' || k
+FROM generate_series(1, %(courses)s) c CROSS JOIN generate_series(1, 2) k;
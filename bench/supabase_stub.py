@@ -0,0 +1,103 @@
+"""
+Local stand-in for the Supabase Auth endpoints the app calls, backed by the
+auth.users table from bench/auth_stub.sql. Any password is accepted.
+
+    python bench/supabase_stub.py --port 54321 --db-name mooc_bench
+"""
+import argparse
+import json
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+_USER_PATH = re.compile(r"^/auth/v1/admin/users/([0-9a-f-]{36})$")
+
+
+class AuthStub(BaseHTTPRequestHandler):
+    pool = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _query(self, sql, params=()):
+        conn = self.pool.getconn()
+        try:
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            rows = cur.fetchall() if cur.description else []
+            conn.commit()
+            cur.close()
+            return rows
+        except psycopg2.Error:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self._body()
+        if path == "/auth/v1/token":
+            rows = self._query("SELECT id, email FROM auth.users WHERE email = %s", (body.get("email"),))
+            if not rows:
+                return self._reply(400, {"error": "invalid_grant", "error_description": "Invalid login credentials"})
+            user = {"id": str(rows[0][0]), "email": rows[0][1]}
+            return self._reply(200, {"access_token": "bench", "token_type": "bearer", "user": user})
+        if path == "/auth/v1/admin/users":
+            try:
+                rows = self._query("""
+                    INSERT INTO auth.users (email, raw_user_meta_data)
+                    VALUES (%s, %s::jsonb)
+                    RETURNING id, email
+                """, (body.get("email"), json.dumps(body.get("user_metadata") or {})))
+            except psycopg2.errors.UniqueViolation:
+                return self._reply(422, {"msg": "A user with this email address has already been registered"})
+            return self._reply(200, {"id": str(rows[0][0]), "email": rows[0][1]})
+        self._reply(404, {"msg": "not found"})
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/auth/v1/admin/users":
+            rows = self._query("SELECT id, email FROM auth.users ORDER BY created_at LIMIT 1000")
+            return self._reply(200, {"users": [{"id": str(r[0]), "email": r[1]} for r in rows]})
+        self._reply(404, {"msg": "not found"})
+
+    def do_DELETE(self):
+        match = _USER_PATH.match(urlparse(self.path).path)
+        if not match:
+            return self._reply(404, {"msg": "not found"})
+        self._query("DELETE FROM auth.users WHERE id = %s", (match.group(1),))
+        self._reply(200, {})
+
+
+def serve(port, db_name):
+    # Connection settings other than the database name come from PG* variables
+    AuthStub.pool = ThreadedConnectionPool(1, 8, dbname=db_name)
+    server = ThreadingHTTPServer(("127.0.0.1", port), AuthStub)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Supabase Auth stub for benchmarks")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--db-name", default="mooc_bench")
+    args = parser.parse_args()
+    serve(args.port, args.db_name)
+
+
+if __name__ == "__main__":
+    main()
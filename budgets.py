@@ -0,0 +1,60 @@
+"""
+Per-route database time budgets.
+
+Each routed request gets a budget for the time its statements may spend in
+Postgres: DB_BUDGET_MS for OLTP routes, DB_BUDGET_ANALYST_MS for
+/api/analyst/... A route can declare its own with @db_budget(ms), placed
+under @app.route. Every transaction the request opens runs with
+SET LOCAL statement_timeout = the budget left (lowered again as it is spent),
+and once the budget is spent further statements fail without reaching the
+server (db.QueryBudgetExceeded).
+Analyst routes also borrow from their own pool (DB_ANALYST_POOL_MAX).
+
+Violations are counted in db_budget_exceeded_total{route,reason}, reason
+statement_timeout (Postgres cancelled the statement) or exhausted.
+Sub-requests of /api/batch each get their own budget but run on the batch's
+connection. Background jobs have no budget.
+"""
+import os
+from flask import current_app, request
+from db import add_budget_hook, start_budget
+from metrics import DB_BUDGET_EXCEEDED, route_label
+
+DB_BUDGET_MS = int(os.getenv("DB_BUDGET_MS", "5000"))  # 0 disables the default budget
+DB_BUDGET_ANALYST_MS = int(os.getenv("DB_BUDGET_ANALYST_MS", "60000"))
+
+# Long-lived streams and probes hold no budget
+EXEMPT = {"/api/events", "/api/metrics", "/api/admin/profiles/<name>"}
+
+
+def db_budget(ms):
+    """Declare a route's DB time budget in milliseconds (None for unlimited)"""
+    def decorator(view):
+        view.db_budget_ms = ms
+        return view
+    return decorator
+
+
+def budget_for(rule, view):
+    """(budget in seconds or None, pool name) for a route"""
+    analyst = rule.startswith("/api/analyst/")
+    default = DB_BUDGET_ANALYST_MS if analyst else DB_BUDGET_MS
+    ms = getattr(view, "db_budget_ms", default)
+    return (ms / 1000 if ms else None), ("analyst" if analyst else "default")
+
+
+def apply_budget():
+    rule = request.url_rule.rule if request.url_rule is not None else None
+    if rule is None or rule in EXEMPT:
+        return
+    start_budget(*budget_for(rule, current_app.view_functions.get(request.endpoint)))
+
+
+@add_budget_hook
+def _count_violation(reason):
+    DB_BUDGET_EXCEEDED.labels(route_label(), reason).inc()
+
+
+def init_app(app):
+    """Apply per-route DB budgets to every request"""
+    app.before_request(apply_budget)
@@ -1,20 +1,72 @@
 import psycopg2
 import os
+import threading
+import time
+from contextlib import contextmanager
+from psycopg2 import errors, pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, cursor as _cursor
 from dotenv import load_dotenv
+from flask import g, has_app_context, has_request_context, request
 
 load_dotenv()
 
-def get_connection():
+# Under gevent workers, make psycopg2 yield to other greenlets while it
+# waits on the network instead of blocking the whole worker.
+try:
+    from gevent import monkey
+    if monkey.is_module_patched("socket"):
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+except ImportError:
+    pass
+
+# Connections kept open per worker process. DB_POOL_MAX=0 disables pooling
+# and opens a fresh connection for every get_connection() call.
+# DB_POOL_MIN is also the most idle connections psycopg2 keeps: any returned
+# beyond it are closed, so below DB_POOL_MAX busy workers reconnect (and
+# renegotiate TLS) on most requests. It defaults to DB_POOL_MAX.
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_MIN = min(int(os.getenv("DB_POOL_MIN", str(DB_POOL_MAX))), DB_POOL_MAX)
+# Analyst routes borrow from their own pool so long aggregates cannot take
+# every OLTP connection. Its connections are all kept open, for the same reason.
+DB_ANALYST_POOL_MAX = int(os.getenv("DB_ANALYST_POOL_MAX", "4"))
+POOL_SIZES = {"default": (DB_POOL_MIN, DB_POOL_MAX), "analyst": (DB_ANALYST_POOL_MAX, DB_ANALYST_POOL_MAX)}
+# Longest wait for a free pooled connection, in seconds (0 waits forever)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+
+# Set in the WSGI environ of a request whose pool wait timed out, so
+# admission control can answer 503 whatever the route made of the error
+POOL_TIMEOUT_KEY = "app.pool_timeout"
+# The request's DB time budget and connection class; see start_budget()
+BUDGET_KEY = "app.db_budget"
+# A transaction's statement_timeout is lowered again once this share of the
+# budget has been spent since it was set, bounding any overrun to it
+BUDGET_TIMEOUT_SLACK = 0.1
+
+
+class PoolTimeout(pool.PoolError):
+    """No pooled connection became free within DB_POOL_TIMEOUT"""
+
+
+class QueryBudgetExceeded(errors.QueryCanceled):
+    """The request spent its DB time budget before this statement ran"""
+
+_pools = {}
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def connection_params():
     """
-    Establishes connection to PostgreSQL database.
-    Automatically handles SSL for cloud databases (like Supabase) 
+    Connection settings for PostgreSQL database.
+    Automatically handles SSL for cloud databases (like Supabase)
     and disables SSL for local databases.
     """
     # Check if using cloud database (Supabase, AWS RDS, etc.)
     # Local databases typically use 'localhost' or '127.0.0.1'
     host = os.getenv("DB_HOST", "localhost")
     is_local = host in ["localhost", "127.0.0.1"]
-    
+
     connection_params = {
         "host": host,
         "database": os.getenv("DB_NAME"),
@@ -22,13 +74,249 @@ def get_connection():
         "password": os.getenv("DB_PASSWORD"),
         "port": os.getenv("DB_PORT", "5432"),
     }
-    
+
     # Only require SSL for cloud databases
     if not is_local:
         connection_params["sslmode"] = "require"
     else:
         connection_params["sslmode"] = "disable"
-    
-    return psycopg2.connect(**connection_params)
+
+    return connection_params
+
+
+# Callables run after every statement on app connections:
+# hook(sql, params, seconds, cursor). See add_query_hook().
+QUERY_HOOKS = []
+
+
+def add_query_hook(hook):
+    """Register hook(sql, params, seconds, cursor), called after each execute"""
+    QUERY_HOOKS.append(hook)
+    return hook
+
+
+# Callables run when a statement is stopped by the request's budget:
+# hook(reason), reason "statement_timeout" or "exhausted". See add_budget_hook().
+BUDGET_HOOKS = []
+
+
+def add_budget_hook(hook):
+    """Register hook(reason), called when a statement is stopped by the request's budget"""
+    BUDGET_HOOKS.append(hook)
+    return hook
+
+
+def start_budget(seconds, pool_name="default"):
+    """
+    Give the current request a DB time budget (None for unlimited) and the
+    pool its connections come from. Transactions the request opens run with
+    SET LOCAL statement_timeout = the budget left (autocommit statements get
+    no server-side timeout); once it is spent, statements raise
+    QueryBudgetExceeded without reaching the server.
+    """
+    # timeouts: id(connection) -> budget spent when its timeout was last set
+    request.environ[BUDGET_KEY] = {"seconds": seconds, "spent": 0.0, "pool": pool_name, "timeouts": {}}
+
+
+def _budget():
+    if not has_request_context():
+        return None
+    return request.environ.get(BUDGET_KEY)
+
+
+def _budget_exceeded(reason):
+    for hook in BUDGET_HOOKS:
+        hook(reason)
+
+
+class InstrumentedCursor(_cursor):
+    """
+    Cursor that times execute()/executemany(), reports to QUERY_HOOKS and
+    holds statements to the request's DB time budget
+    """
+
+    def execute(self, query, vars=None):
+        budget = self._apply_budget()
+        start = time.perf_counter()
+        try:
+            return self._checked(budget, super().execute, query, vars)
+        finally:
+            self._report(budget, query, vars, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        budget = self._apply_budget()
+        start = time.perf_counter()
+        try:
+            return self._checked(budget, super().executemany, query, vars_list)
+        finally:
+            self._report(budget, query, None, time.perf_counter() - start)
+
+    def _apply_budget(self):
+        budget = _budget()
+        if budget is None or budget["seconds"] is None:
+            return None
+        remaining = budget["seconds"] - budget["spent"]
+        if remaining <= 0:
+            _budget_exceeded("exhausted")
+            raise QueryBudgetExceeded(f"request exceeded its {budget['seconds']:g}s database budget")
+        conn = self.connection
+        # Autocommit has no transaction to scope SET LOCAL, and a session
+        # SET would outlive the request on a pooler-shared backend
+        if conn.autocommit:
+            return budget
+        # SET LOCAL costs a round trip, so it is issued by the transaction's
+        # first statement and then only once enough budget has been spent
+        # that the timeout in force would let a statement overrun it
+        set_at = budget["timeouts"].get(id(conn))
+        if (conn.get_transaction_status() == TRANSACTION_STATUS_IDLE or set_at is None
+                or budget["spent"] - set_at > budget["seconds"] * BUDGET_TIMEOUT_SLACK):
+            with conn.cursor(cursor_factory=_cursor) as cur:
+                cur.execute("SET LOCAL statement_timeout = %s", (max(1, int(remaining * 1000)),))
+            budget["timeouts"][id(conn)] = budget["spent"]
+        return budget
+
+    @staticmethod
+    def _checked(budget, method, *args):
+        try:
+            return method(*args)
+        except errors.QueryCanceled:
+            if budget is not None:
+                _budget_exceeded("statement_timeout")
+            raise
+
+    def _report(self, budget, query, vars, seconds):
+        if budget is not None:
+            budget["spent"] += seconds
+        for hook in QUERY_HOOKS:
+            hook(query, vars, seconds, self)
+
+
+def _get_pool(name="default"):
+    """Return this process's pool for a connection class, creating it on first use (and after a fork)."""
+    global _pools, _pool_pid
+    if name not in _pools or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool_pid != os.getpid():
+                # Pools inherited from the parent process share its sockets;
+                # drop them without closing anything.
+                _pools, _pool_pid = {}, os.getpid()
+            if name not in _pools:
+                minconn, maxconn = POOL_SIZES[name]
+                _pools[name] = (pool.ThreadedConnectionPool(minconn, maxconn, cursor_factory=InstrumentedCursor,
+                                                            **connection_params()),
+                                threading.BoundedSemaphore(maxconn))
+    return _pools[name]
+
+
+def init_pool():
+    """Open this process's pools now rather than on the first request (gunicorn post_worker_init)"""
+    if DB_POOL_MAX > 0:
+        for name in POOL_SIZES:
+            _get_pool(name)
+
+
+def close_pool():
+    """Close this process's pooled connections (worker shutdown)"""
+    global _pools, _pool_pid
+    with _pool_lock:
+        if _pool_pid == os.getpid():
+            for conn_pool, _ in _pools.values():
+                conn_pool.closeall()
+        _pools, _pool_pid = {}, None
+
+
+class PooledConnection:
+    """A psycopg2 connection borrowed from the pool. close() hands it back."""
+
+    def __init__(self, conn, conn_pool, slots):
+        self._conn = conn
+        self._pool = conn_pool
+        self._slots = slots
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return getattr(self._conn, name)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            # putconn rolls back any open transaction before reuse
+            self._pool.putconn(conn, close=bool(conn.closed))
+        except psycopg2.Error:
+            self._pool.putconn(conn, close=True)
+        finally:
+            self._slots.release()
+
+
+class SharedConnection:
+    """View of a connection shared by several callers; close() is a no-op."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        pass
+
+
+def _borrow():
+    if DB_POOL_MAX <= 0:
+        return psycopg2.connect(cursor_factory=InstrumentedCursor, **connection_params())
+
+    budget = _budget()
+    name = budget["pool"] if budget is not None else "default"
+    conn_pool, slots = _get_pool(name)
+    if not slots.acquire(timeout=DB_POOL_TIMEOUT or None):
+        if has_request_context():
+            request.environ[POOL_TIMEOUT_KEY] = True
+        raise PoolTimeout(f"no {name} database connection free within {DB_POOL_TIMEOUT:g}s")
+    try:
+        conn = conn_pool.getconn()
+        if conn.closed:
+            conn_pool.putconn(conn, close=True)
+            conn = conn_pool.getconn()
+    except Exception:
+        slots.release()
+        raise
+    return PooledConnection(conn, conn_pool, slots)
+
+
+def get_connection():
+    """
+    Borrow a connection to the PostgreSQL database.
+    Callers close() it as before, which returns it to the pool; anything a
+    request forgets to close is returned by release_connections().
+    Inside shared_connection() every call gets the same connection.
+    """
+    if has_app_context():
+        shared = g.get("_db_shared_connection")
+        if shared is not None:
+            return SharedConnection(shared)
+
+    conn = _borrow()
+    if has_app_context() and DB_POOL_MAX > 0:
+        g.setdefault("_db_connections", []).append(conn)
+    return conn
+
+
+@contextmanager
+def shared_connection():
+    """Serve every get_connection() in this app context from one connection."""
+    conn = _borrow()
+    g._db_shared_connection = conn
+    try:
+        yield conn
+    finally:
+        g.pop("_db_shared_connection", None)
+        conn.close()
 
 
+def release_connections(exc=None):
+    """Request teardown hook: return every connection the request borrowed."""
+    for conn in g.pop("_db_connections", []):
+        conn.close()
@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+import psycopg2
+from db import connection_params
+
+log = logging.getLogger(__name__)
+
+# Routes raise events with notify(); every worker process LISTENs on the
+# channel and fans each event out to its own SSE subscribers.
+CHANNEL = "course_events"
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def notify(cur, kind, course_id, user_id=None, **data):
+    """Queue an event on cur's transaction. Postgres delivers it on commit."""
+    payload = json.dumps({
+        "kind": kind,
+        "course_id": str(course_id),
+        "user_id": str(user_id) if user_id else None,
+        "data": data
+    }, default=str)
+    cur.execute("SELECT pg_notify(%s, %s)", (CHANNEL, payload))
+
+
+class Subscriber:
+    """One SSE client: a bounded queue plus the audiences it belongs to."""
+
+    def __init__(self, user_id, course_ids):
+        self.user_id = str(user_id)
+        self.course_ids = frozenset(str(c) for c in course_ids)
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # A client that stops reading loses events rather than memory
+            pass
+
+
+class Broker:
+    """
+    Per-process fan-out of NOTIFY events to subscribers.
+    Events with a user_id go to that user only; other events go to users
+    enrolled in the event's course.
+    """
+
+    def __init__(self):
+        self._by_course = {}
+        self._by_user = {}
+        self._lock = threading.Lock()
+        self._listener_pid = None
+
+    def subscribe(self, user_id, course_ids):
+        self._ensure_listener()
+        sub = Subscriber(user_id, course_ids)
+        with self._lock:
+            self._by_user.setdefault(sub.user_id, set()).add(sub)
+            for course_id in sub.course_ids:
+                self._by_course.setdefault(course_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._discard(self._by_user, sub.user_id, sub)
+            for course_id in sub.course_ids:
+                self._discard(self._by_course, course_id, sub)
+
+    @staticmethod
+    def _discard(index, key, sub):
+        subs = index.get(key)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del index[key]
+
+    def publish(self, event):
+        with self._lock:
+            if event.get("user_id"):
+                targets = [s for s in self._by_user.get(event["user_id"], ())
+                           if event.get("course_id") in s.course_ids]
+            else:
+                targets = list(self._by_course.get(event.get("course_id"), ()))
+        for sub in targets:
+            sub.put(event)
+
+    def _ensure_listener(self):
+        # Started lazily so each forked worker runs its own listener
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid != os.getpid():
+                threading.Thread(target=self._listen, name="events-listener", daemon=True).start()
+                self._listener_pid = os.getpid()
+
+    def _listen(self):
+        params = connection_params()
+        # LISTEN needs a session connection; a transaction-mode pooler
+        # (e.g. Supabase on port 6543) will not deliver notifications.
+        params["host"] = os.getenv("DB_LISTEN_HOST", params["host"])
+        params["port"] = os.getenv("DB_LISTEN_PORT", params["port"])
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**params)
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {CHANNEL}")
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notification = conn.notifies.pop(0)
+                        try:
+                            self.publish(json.loads(notification.payload))
+                        except ValueError:
+                            pass
+            except Exception:
+                # Anything escaping here would end the thread for good while
+                # _listener_pid still claims it is running
+                log.exception("event listener failed; reconnecting in 5s")
+                if conn is not None:
+                    conn.close()
+                time.sleep(5)
+
+
+broker = Broker()
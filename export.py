@@ -0,0 +1,326 @@
+"""
+Export analyst datasets to Parquet or Arrow IPC files.
+
+Rows are read from a server-side cursor and written in row-group-sized
+batches, so memory stays bounded by --batch-rows whatever the table size.
+
+    python export.py enrollments --format parquet --out exports/
+    python export.py submissions --partition month --out exports/
+"""
+import argparse
+import os
+import zipfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DEFAULT_BATCH_ROWS = 50000
+FORMATS = {
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "arrow": ("arrow", "application/vnd.apache.arrow.file"),
+}
+# partition -> hive-style directory key
+PARTITIONS = {"course": "course_id", "month": "month"}
+
+
+class Dataset:
+    """
+    A query with an explicit Arrow schema and the columns it can be
+    partitioned on, named as the query outputs them
+    """
+
+    def __init__(self, query, schema, course_column=None, month_column=None):
+        self.query = query
+        self.schema = schema
+        self.partition_columns = {"course": course_column, "month": month_column}
+
+
+DATASETS = {
+    "enrollments": Dataset(
+        """
+        SELECT e.user_id::text, e.course_id::text, e.enroll_date, e.status,
+               e.grade, e.completion_date
+        FROM public.enrolled_in e
+        """,
+        pa.schema([
+            ("user_id", pa.string()),
+            ("course_id", pa.string()),
+            ("enroll_date", pa.date32()),
+            ("status", pa.string()),
+            ("grade", pa.string()),
+            ("completion_date", pa.date32()),
+        ]),
+        course_column="course_id",
+        month_column="enroll_date",
+    ),
+    "submissions": Dataset(
+        """
+        SELECT s.submission_id::text, s.assignment_id::text, a.course_id::text,
+               s.student_id::text, s.submitted_at, s.marks_obtained, a.max_marks
+        FROM public.assignment_submission s
+        JOIN public.assignment a ON a.assignment_id = s.assignment_id
+        """,
+        pa.schema([
+            ("submission_id", pa.string()),
+            ("assignment_id", pa.string()),
+            ("course_id", pa.string()),
+            ("student_id", pa.string()),
+            ("submitted_at", pa.timestamp("us")),
+            ("marks_obtained", pa.float64()),
+            ("max_marks", pa.int32()),
+        ]),
+        course_column="course_id",
+        month_column="submitted_at",
+    ),
+    "courses": Dataset(
+        """
+        SELECT c.course_id::text, c.title, c.level, c.duration, c.program,
+               c.fees, c.total_enrollments, c.total_vacancies,
+               c.university_id::text, u.name
+        FROM public.course c
+        LEFT JOIN public.university u ON u.university_id = c.university_id
+        """,
+        pa.schema([
+            ("course_id", pa.string()),
+            ("title", pa.string()),
+            ("level", pa.string()),
+            ("duration", pa.string()),
+            ("program", pa.string()),
+            ("fees", pa.float64()),
+            ("total_enrollments", pa.int32()),
+            ("total_vacancies", pa.int32()),
+            ("university_id", pa.string()),
+            ("university_name", pa.string()),
+        ]),
+        course_column="course_id",
+    ),
+    "insights": Dataset(
+        """
+        SELECT i.insight_id::text, i.course_id::text, i.posted_by::text, i.title,
+               i.chart_type, i.chart_data::text, i.summary, i.created_at
+        FROM public.course_insight i
+        """,
+        pa.schema([
+            ("insight_id", pa.string()),
+            ("course_id", pa.string()),
+            ("posted_by", pa.string()),
+            ("title", pa.string()),
+            ("chart_type", pa.string()),
+            ("chart_data", pa.string()),  # JSON text
+            ("summary", pa.string()),
+            ("created_at", pa.timestamp("us")),
+        ]),
+        course_column="course_id",
+        month_column="created_at",
+    ),
+}
+
+
+def _dataset(name, partition_by):
+    dataset = DATASETS.get(name)
+    if dataset is None:
+        raise ValueError(f"Unknown dataset: {name}")
+    if partition_by and not dataset.partition_columns.get(partition_by):
+        raise ValueError(f"{name} cannot be partitioned by {partition_by}")
+    return dataset
+
+
+def _to_batch(rows, schema):
+    columns = list(zip(*rows))
+    arrays = [pa.array([float(v) if v is not None else None for v in col], field.type)
+              if pa.types.is_floating(field.type) else pa.array(col, field.type)
+              for col, field in zip(columns, schema)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def iter_batches(conn, name, partition_by=None, batch_rows=DEFAULT_BATCH_ROWS):
+    """
+    Yield (partition value, RecordBatch) from a server-side cursor.
+    Partitioned exports are ordered by partition, so each partition arrives
+    as one contiguous run.
+    """
+    dataset = _dataset(name, partition_by)
+    column = dataset.partition_columns.get(partition_by)
+    # The subquery hides table aliases; partition on its output columns
+    if partition_by == "course":
+        key = f"q.{column}::text"
+    elif partition_by == "month":
+        key = f"to_char(q.{column}, 'YYYY-MM')"
+    else:
+        key = "NULL"
+    query = f"SELECT {key} AS _partition, q.* FROM ({dataset.query}) q"
+    if partition_by:
+        query += " ORDER BY 1"
+
+    cur = conn.cursor(name=f"export_{name}")
+    cur.itersize = batch_rows
+    cur.execute(query)
+    try:
+        while True:
+            rows = cur.fetchmany(batch_rows)
+            if not rows:
+                break
+            start = 0
+            for i in range(1, len(rows) + 1):
+                if i == len(rows) or rows[i][0] != rows[start][0]:
+                    yield rows[start][0], _to_batch([r[1:] for r in rows[start:i]], dataset.schema)
+                    start = i
+    finally:
+        cur.close()
+
+
+def _open_writer(sink, schema, fmt):
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, schema, compression="zstd")
+    return pa.ipc.new_file(sink, schema)
+
+
+class _Partition:
+    """Writer for one output file; buffers fragments into full row groups"""
+
+    def __init__(self, sink, schema, fmt, batch_rows):
+        self.writer = _open_writer(sink, schema, fmt)
+        self.batch_rows = batch_rows
+        self.pending = []
+        self.pending_rows = 0
+
+    def write(self, batch):
+        self.pending.append(batch)
+        self.pending_rows += batch.num_rows
+        if self.pending_rows >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            table = pa.Table.from_batches(self.pending)
+            if isinstance(self.writer, pq.ParquetWriter):
+                self.writer.write_table(table, row_group_size=self.batch_rows)
+            else:
+                self.writer.write_table(table, max_chunksize=self.batch_rows)
+            self.pending, self.pending_rows = [], 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def partition_path(name, partition_by, value, fmt):
+    """Relative path of one output file, hive-style when partitioned"""
+    ext = FORMATS[fmt][0]
+    if not partition_by:
+        return f"{name}.{ext}"
+    return f"{name}/{PARTITIONS[partition_by]}={value or 'null'}/part-0.{ext}"
+
+
+def export_to_dir(conn, name, out_dir, fmt="parquet", partition_by=None, batch_rows=DEFAULT_BATCH_ROWS):
+    """Write a dataset under out_dir. Returns the paths written"""
+    dataset = _dataset(name, partition_by)
+    paths = []
+    current, value = None, object()
+
+    def open_partition(v):
+        path = os.path.join(out_dir, partition_path(name, partition_by, v, fmt))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        paths.append(path)
+        return _Partition(path, dataset.schema, fmt, batch_rows)
+
+    for partition, batch in iter_batches(conn, name, partition_by, batch_rows):
+        if current is None or partition != value:
+            if current is not None:
+                current.close()
+            current, value = open_partition(partition), partition
+        current.write(batch)
+    if current is None:
+        # Empty dataset: still write a file with the schema
+        current = open_partition(None)
+    current.close()
+    return paths
+
+
+class _ChunkSink:
+    """Write-only file object whose contents are drained by a generator"""
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+        self._position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return b"".join(chunks)
+
+
+def stream_export(conn, name, fmt="parquet", partition_by=None, batch_rows=DEFAULT_BATCH_ROWS):
+    """
+    Yield the export as bytes: one file, or a zip of hive-style partition
+    files when partition_by is set. At most one row group is held in memory.
+    """
+    dataset = _dataset(name, partition_by)
+    sink = _ChunkSink()
+    archive = zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) if partition_by else None
+    current, entry, value = None, None, object()
+
+    def open_partition(v):
+        if archive is None:
+            return _Partition(pa.PythonFile(sink, mode="w"), dataset.schema, fmt, batch_rows), None
+        zip_entry = archive.open(partition_path(name, partition_by, v, fmt), "w", force_zip64=True)
+        return _Partition(pa.PythonFile(zip_entry, mode="w"), dataset.schema, fmt, batch_rows), zip_entry
+
+    def close_partition():
+        current.close()
+        if entry is not None:
+            entry.close()
+
+    for partition, batch in iter_batches(conn, name, partition_by, batch_rows):
+        if current is None or partition != value:
+            if current is not None:
+                close_partition()
+            (current, entry), value = open_partition(partition), partition
+        current.write(batch)
+        yield sink.drain()
+    if current is None:
+        current, entry = open_partition(None)
+    close_partition()
+    if archive is not None:
+        archive.close()
+    yield sink.drain()
+
+
+def main():
+    from db import connection_params
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description="Export analyst datasets to Parquet/Arrow")
+    parser.add_argument("datasets", nargs="+", choices=sorted(DATASETS))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    parser.add_argument("--partition", choices=sorted(PARTITIONS))
+    parser.add_argument("--out", default="exports")
+    parser.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**connection_params())
+    try:
+        conn.set_session(readonly=True)
+        for name in args.datasets:
+            paths = export_to_dir(conn, name, args.out, args.format, args.partition, args.batch_rows)
+            conn.rollback()
+            print(f"{name}: {len(paths)} file(s) under {args.out}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
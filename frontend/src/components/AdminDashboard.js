@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { dashboardAPI, adminAPI } from '../services/api';
+import { bootstrapAPI, dashboardAPI, adminAPI } from '../services/api';
 import ThemeToggle from './ThemeToggle';
 import './Dashboard.css';
 
@@ -39,12 +39,26 @@ function AdminDashboard({ user, onLogout }) {
   const [courseSearch, setCourseSearch] = useState('');
 
   useEffect(() => {
-    loadDashboardData();
-    loadUsers();
-    loadCourses();
-    loadInstructors();
+    loadBootstrap();
   }, []);
 
+  const loadBootstrap = async () => {
+    try {
+      const response = await bootstrapAPI.get(user.user_id, user.role);
+      if (response.success) {
+        const data = response.data;
+        setDashboardData(data.dashboard);
+        setUsers(data.users);
+        setCourses(data.courses);
+        setInstructors(data.instructors);
+      }
+    } catch (error) {
+      console.error('Error loading dashboard:', error);
+    } finally {
+      setLoading(false);
+    }
+  };
+
   const loadDashboardData = async () => {
     try {
       const response = await dashboardAPI.getDashboardData(user.user_id, user.role);
@@ -80,17 +94,6 @@ function AdminDashboard({ user, onLogout }) {
     }
   };
 
-  const loadInstructors = async () => {
-    try {
-      const response = await adminAPI.getInstructors();
-      if (response.success) {
-        setInstructors(response.instructors);
-      }
-    } catch (error) {
-      console.error('Error loading instructors:', error);
-    }
-  };
-
   const handleApproveUser = async (userId) => {
     try {
       const response = await adminAPI.approveUser(userId);
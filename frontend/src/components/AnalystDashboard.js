@@ -13,7 +13,7 @@ import {
   Legend,
   CartesianGrid,
 } from 'recharts';
-import { analystAPI } from '../services/api';
+import { analystAPI, bootstrapAPI } from '../services/api';
 import './Dashboard.css';
 import './AnalystDashboard.css';
 
@@ -34,6 +34,7 @@ function AnalystDashboard({ user, onLogout }) {
     summary: '',
   });
   const [postedInsights, setPostedInsights] = useState([]);
+  const [gradeHistogram, setGradeHistogram] = useState(null);
 
   useEffect(() => {
     loadData();
@@ -41,21 +42,39 @@ function AnalystDashboard({ user, onLogout }) {
 
   const loadData = async () => {
     try {
-      const [overviewRes, coursesRes, insightsRes] = await Promise.all([
-        analystAPI.getOverview(),
-        analystAPI.getCourses(),
-        analystAPI.getInsights(),
-      ]);
-      if (overviewRes.success) setOverview(overviewRes.data);
-      if (coursesRes.success) setCourses(coursesRes.courses);
-      if (insightsRes.success) setInsights(insightsRes.insights);
+      const response = await bootstrapAPI.get(user.user_id, user.role);
+      if (response.success) {
+        setOverview(response.data.overview);
+        setCourses(response.data.courses);
+        setInsights(response.data.insights);
+      }
     } catch (error) {
       console.error('Error loading analyst data:', error);
     } finally {
       setLoading(false);
     }
+    loadGradeHistogram();
   };
 
+  // Grade histograms for every course in one request
+  const loadGradeHistogram = async () => {
+    try {
+      const res = await analystAPI.getGradeHistogram({ bins: 10 });
+      if (res.success) setGradeHistogram(res);
+    } catch (e) {
+      setGradeHistogram(null);
+    }
+  };
+
+  const medianScoreByCourse = {};
+  (gradeHistogram?.courses || []).forEach((c) => {
+    medianScoreByCourse[c.course_id] = c.percentiles.p50;
+  });
+  const overallGradeBins = (gradeHistogram?.bins || []).map((b, i) => ({
+    range: `${b.lower}-${b.upper}`,
+    count: gradeHistogram.overall.histogram[i],
+  }));
+
   const loadCourseStats = async (courseId) => {
     if (!courseId) return;
     try {
@@ -99,7 +118,8 @@ function AnalystDashboard({ user, onLogout }) {
         postInsightForm.title,
         postInsightForm.chart_type,
         chart_data,
-        postInsightForm.summary
+        postInsightForm.summary,
+        { kind: postInsightForm.chart_type }
       );
       if (res.success) {
         alert('Insight posted! Students enrolled in this course can now see it.');
@@ -182,6 +202,7 @@ function AnalystDashboard({ user, onLogout }) {
                       <th>Completed</th>
                       <th>Completion Rate</th>
                       <th>Assignments</th>
+                      <th>Median Score</th>
                     </tr>
                   </thead>
                   <tbody>
@@ -194,6 +215,7 @@ function AnalystDashboard({ user, onLogout }) {
                         <td>{c.completed}</td>
                         <td>{c.completion_rate}%</td>
                         <td>{c.assignment_count}</td>
+                        <td>{medianScoreByCourse[c.course_id] ?? '–'}</td>
                       </tr>
                     ))}
                   </tbody>
@@ -248,6 +270,29 @@ function AnalystDashboard({ user, onLogout }) {
                     <p className="no-data">No user data yet.</p>
                   )}
                 </div>
+                <div className="analyst-card analyst-card-wide">
+                  <h3>Grade Distribution – All Courses</h3>
+                  {gradeHistogram?.overall?.count > 0 ? (
+                    <>
+                      <ResponsiveContainer width="100%" height={260}>
+                        <BarChart data={overallGradeBins} margin={{ top: 8, right: 8, left: 8, bottom: 8 }}>
+                          <CartesianGrid strokeDasharray="3 3" stroke="#334155" />
+                          <XAxis dataKey="range" stroke="#94a3b8" fontSize={12} />
+                          <YAxis stroke="#94a3b8" fontSize={12} />
+                          <Tooltip contentStyle={{ background: '#1e293b', border: 'none', borderRadius: 8 }} />
+                          <Bar dataKey="count" fill="#475569" radius={[4, 4, 0, 0]} name="Students" />
+                        </BarChart>
+                      </ResponsiveContainer>
+                      <p className="analyst-hint">
+                        Mean {gradeHistogram.overall.mean} · P25 {gradeHistogram.overall.percentiles.p25} ·
+                        Median {gradeHistogram.overall.percentiles.p50} · P75 {gradeHistogram.overall.percentiles.p75} ·
+                        P90 {gradeHistogram.overall.percentiles.p90}
+                      </p>
+                    </>
+                  ) : (
+                    <p className="no-data">No graded enrollments yet.</p>
+                  )}
+                </div>
                 <div className="analyst-card analyst-card-wide">
                   <h3>Top 5 Courses by Enrollment</h3>
                   {insights?.top_courses_by_enrollment?.length > 0 ? (
@@ -382,7 +427,10 @@ function AnalystDashboard({ user, onLogout }) {
                   <h3>Posted insights for this course</h3>
                   <ul>
                     {postedInsights.map((i) => (
-                      <li key={i.insight_id}><strong>{i.title}</strong> – {new Date(i.created_at).toLocaleDateString()}</li>
+                      <li key={i.insight_id}>
+                        <strong>{i.title}</strong> – {new Date(i.created_at).toLocaleDateString()}
+                        {i.query_spec && ' · live'}
+                      </li>
                     ))}
                   </ul>
                 </div>
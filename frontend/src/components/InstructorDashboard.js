@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { dashboardAPI, instructorAPI } from '../services/api';
+import { batchAPI, bootstrapAPI, dashboardAPI, instructorAPI } from '../services/api';
 import ThemeToggle from './ThemeToggle';
 import './Dashboard.css';
 
@@ -26,16 +26,17 @@ function InstructorDashboard({ user, onLogout }) {
   const [announcementForm, setAnnouncementForm] = useState({ title: '', content: '' });
 
   useEffect(() => {
-    loadDashboardData();
-    loadCourses();
-    loadProfile();
+    loadBootstrap();
   }, []);
 
-  const loadDashboardData = async () => {
+  const loadBootstrap = async () => {
     try {
-      const response = await dashboardAPI.getDashboardData(user.user_id, user.role);
+      const response = await bootstrapAPI.get(user.user_id, user.role);
       if (response.success) {
-        setDashboardData(response.data);
+        const data = response.data;
+        setDashboardData(data.dashboard);
+        setCourses(data.courses);
+        if (data.profile) applyProfile(data.profile);
       }
     } catch (error) {
       console.error('Error loading dashboard:', error);
@@ -44,14 +45,16 @@ function InstructorDashboard({ user, onLogout }) {
     }
   };
 
-  const loadCourses = async () => {
+  const loadDashboardData = async () => {
     try {
-      const response = await instructorAPI.getCourses(user.user_id);
+      const response = await dashboardAPI.getDashboardData(user.user_id, user.role);
       if (response.success) {
-        setCourses(response.courses);
+        setDashboardData(response.data);
       }
     } catch (error) {
-      console.error('Error loading courses:', error);
+      console.error('Error loading dashboard:', error);
+    } finally {
+      setLoading(false);
     }
   };
 
@@ -59,19 +62,23 @@ function InstructorDashboard({ user, onLogout }) {
     try {
       const response = await instructorAPI.getProfile(user.user_id);
       if (response.success) {
-        setProfile(response.profile);
-        setEditForm({
-          branch: response.profile.branch || '',
-          specialization: response.profile.specialization || '',
-          hire_year: response.profile.hire_year || '',
-          phone_number: response.profile.phone_number || ''
-        });
+        applyProfile(response.profile);
       }
     } catch (error) {
       console.error('Error loading profile:', error);
     }
   };
 
+  const applyProfile = (profileData) => {
+    setProfile(profileData);
+    setEditForm({
+      branch: profileData.branch || '',
+      specialization: profileData.specialization || '',
+      hire_year: profileData.hire_year || '',
+      phone_number: profileData.phone_number || ''
+    });
+  };
+
   const handleUpdateProfile = async (e) => {
     e.preventDefault();
     try {
@@ -120,11 +127,26 @@ function InstructorDashboard({ user, onLogout }) {
     }
   };
 
-  const handleSelectCourse = (courseId) => {
+  const handleSelectCourse = async (courseId) => {
     setSelectedCourse(courseId);
-    loadCourseStudents(courseId);
-    loadCourseModules(courseId);
-    loadAnnouncements(courseId);
+    try {
+      const params = { instructor_id: user.user_id };
+      const [studentsRes, modulesRes, announcementsRes] = await batchAPI.run([
+        { path: `/instructor/courses/${courseId}/students`, params },
+        { path: `/instructor/courses/${courseId}/modules`, params },
+        { path: `/instructor/courses/${courseId}/announcements`, params },
+      ]);
+      if (studentsRes.body?.success) {
+        setStudents(studentsRes.body.students);
+      } else {
+        alert(studentsRes.body?.error || 'Failed to load students');
+      }
+      if (modulesRes.body?.success) setModules(modulesRes.body.modules);
+      if (announcementsRes.body?.success) setAnnouncements(announcementsRes.body.announcements);
+    } catch (error) {
+      console.error('Error loading course:', error);
+      alert(error.response?.data?.error || 'Failed to load course');
+    }
   };
 
   const handleGradeStudent = async (e) => {
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import ThemeToggle from './ThemeToggle';
 import { BarChart, Bar, XAxis, YAxis, Tooltip, ResponsiveContainer, PieChart, Pie, Cell, Legend } from 'recharts';
-import { dashboardAPI, coursesAPI, studentAPI, studentCourseAPI } from '../services/api';
+import { batchAPI, bootstrapAPI, dashboardAPI, coursesAPI, eventsAPI, studentAPI, studentCourseAPI } from '../services/api';
 import './Dashboard.css';
 
 function StudentDashboard({ user, onLogout }) {
@@ -26,19 +26,32 @@ function StudentDashboard({ user, onLogout }) {
   const [browseLevelFilter, setBrowseLevelFilter] = useState('all');
 
   useEffect(() => {
-    loadDashboardData();
-    loadCourses();
-    loadAllEnrolledCourses();
-    loadActiveCourses();
-    loadCompletedCourses();
-    loadProfile();
+    loadBootstrap();
   }, []);
 
-  const loadDashboardData = async () => {
+  // Refresh the open course when the server pushes an event for it
+  useEffect(() => {
+    if (!selectedActiveCourse) return undefined;
+    const source = eventsAPI.open(user.user_id);
+    const handleEvent = (e) => {
+      const event = JSON.parse(e.data);
+      if (event.course_id === selectedActiveCourse) loadActiveCourse(selectedActiveCourse);
+    };
+    ['announcement', 'grade', 'insight'].forEach((kind) => source.addEventListener(kind, handleEvent));
+    return () => source.close();
+  }, [selectedActiveCourse]);
+
+  const loadBootstrap = async () => {
     try {
-      const response = await dashboardAPI.getDashboardData(user.user_id, user.role);
+      const response = await bootstrapAPI.get(user.user_id, user.role);
       if (response.success) {
-        setDashboardData(response.data);
+        const data = response.data;
+        setDashboardData(data.dashboard);
+        setCourses(data.courses);
+        setAllEnrolledCourses(data.my_courses);
+        setActiveCourses(data.my_courses.filter((c) => c.status === 'ongoing'));
+        setCompletedCourses(data.my_courses.filter((c) => c.status === 'completed'));
+        if (data.profile) applyProfile(data.profile);
       }
     } catch (error) {
       console.error('Error loading dashboard:', error);
@@ -47,14 +60,16 @@ function StudentDashboard({ user, onLogout }) {
     }
   };
 
-  const loadCourses = async () => {
+  const loadDashboardData = async () => {
     try {
-      const response = await coursesAPI.getAll();
+      const response = await dashboardAPI.getDashboardData(user.user_id, user.role);
       if (response.success) {
-        setCourses(response.courses);
+        setDashboardData(response.data);
       }
     } catch (error) {
-      console.error('Error loading courses:', error);
+      console.error('Error loading dashboard:', error);
+    } finally {
+      setLoading(false);
     }
   };
 
@@ -80,35 +95,28 @@ function StudentDashboard({ user, onLogout }) {
     }
   };
 
-  const loadCompletedCourses = async () => {
-    try {
-      const response = await coursesAPI.getMyCourses(user.user_id, 'completed');
-      if (response.success) {
-        setCompletedCourses(response.courses);
-      }
-    } catch (error) {
-      console.error('Error loading completed courses:', error);
-    }
-  };
-
   const loadProfile = async () => {
     try {
       const response = await studentAPI.getProfile(user.user_id);
       if (response.success) {
-        setProfile(response.profile);
-        setEditForm({
-          name: response.profile.name || '',
-          branch: response.profile.branch || '',
-          country: response.profile.country || '',
-          dob: response.profile.dob || '',
-          phone_number: response.profile.phone_number || '',
-        });
+        applyProfile(response.profile);
       }
     } catch (error) {
       console.error('Error loading profile:', error);
     }
   };
 
+  const applyProfile = (profileData) => {
+    setProfile(profileData);
+    setEditForm({
+      name: profileData.name || '',
+      branch: profileData.branch || '',
+      country: profileData.country || '',
+      dob: profileData.dob || '',
+      phone_number: profileData.phone_number || '',
+    });
+  };
+
   const handleEnroll = async (courseId) => {
     try {
       const response = await coursesAPI.enroll(user.user_id, courseId);
@@ -151,12 +159,23 @@ function StudentDashboard({ user, onLogout }) {
     });
   };
 
-  const loadCourseContent = async (courseId) => {
+  const loadActiveCourse = async (courseId) => {
     try {
-      const response = await studentCourseAPI.getCourseModules(user.user_id, courseId);
-      if (response.success) {
-        setCourseModules(response.modules);
+      const params = { user_id: user.user_id };
+      const [modulesRes, assignmentsRes, announcementsRes, insightsRes] = await batchAPI.run([
+        { path: `/student/courses/${courseId}/modules`, params },
+        { path: `/student/courses/${courseId}/assignments`, params },
+        { path: `/student/courses/${courseId}/announcements`, params },
+        { path: `/student/courses/${courseId}/insights`, params },
+      ]);
+      if (modulesRes.body?.success) {
+        setCourseModules(modulesRes.body.modules);
+      } else {
+        alert(modulesRes.body?.error || 'Failed to load course content');
       }
+      if (assignmentsRes.body?.success) setAssignments(assignmentsRes.body.assignments);
+      setAnnouncements(announcementsRes.body?.success ? announcementsRes.body.announcements : []);
+      setCourseInsights(insightsRes.body?.success ? insightsRes.body.insights : []);
     } catch (error) {
       console.error('Error loading course content:', error);
       alert(error.response?.data?.error || 'Failed to load course content');
@@ -173,27 +192,6 @@ function StudentDashboard({ user, onLogout }) {
     }
   };
 
-  const loadAnnouncements = async (courseId) => {
-    try {
-      const response = await studentCourseAPI.getAnnouncements(user.user_id, courseId);
-      if (response.success) setAnnouncements(response.announcements);
-    } catch (error) {
-      console.error('Error loading announcements:', error);
-      setAnnouncements([]);
-    }
-  };
-
-  const loadCourseInsights = async (courseId) => {
-    try {
-      const response = await studentCourseAPI.getCourseInsights(user.user_id, courseId);
-      if (response.success) setCourseInsights(response.insights);
-      else setCourseInsights([]);
-    } catch (error) {
-      console.error('Error loading insights:', error);
-      setCourseInsights([]);
-    }
-  };
-
   const handleSubmitAssignment = async (e) => {
     e.preventDefault();
     if (!submittingFor || !submitUrl.trim()) return;
@@ -395,7 +393,7 @@ function StudentDashboard({ user, onLogout }) {
               ) : !selectedActiveCourse ? (
                 <div className="courses-grid">
                   {activeCourses.map((course) => (
-                    <div key={course.course_id} className="course-card course-card-clickable" onClick={() => { setSelectedActiveCourse(course.course_id); loadCourseContent(course.course_id); loadAssignments(course.course_id); loadAnnouncements(course.course_id); loadCourseInsights(course.course_id); }}>
+                    <div key={course.course_id} className="course-card course-card-clickable" onClick={() => { setSelectedActiveCourse(course.course_id); loadActiveCourse(course.course_id); }}>
                       <h3>{course.title}</h3>
                       {course.university_name && (
                         <p className="course-meta">Offered by: {course.university_name}{course.university_ranking != null ? ` (Rank #${course.university_ranking})` : ''}</p>
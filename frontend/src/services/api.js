@@ -32,6 +32,31 @@ export const dashboardAPI = {
   },
 };
 
+// Bootstrap API: everything a dashboard needs on first paint in one request
+export const bootstrapAPI = {
+  get: async (user_id, role) => {
+    const response = await api.get('/bootstrap', {
+      params: { user_id, role },
+    });
+    return response.data;
+  },
+};
+
+// Batch API: several GETs in one round-trip. Paths are relative to the API base.
+// Resolves to [{ status, body }] in request order.
+export const batchAPI = {
+  run: async (requests) => {
+    const response = await api.post('/batch', { requests });
+    return response.data.responses;
+  },
+};
+
+// Live events: an EventSource emitting 'announcement', 'grade' and 'insight'
+// events for the user's enrolled courses
+export const eventsAPI = {
+  open: (user_id) => new EventSource(`${API_BASE_URL}/events?user_id=${encodeURIComponent(user_id)}`),
+};
+
 // Courses API
 export const coursesAPI = {
   getAll: async () => {
@@ -307,6 +332,14 @@ export const studentCourseAPI = {
     return response.data;
   },
 
+  // Announcements across all enrolled courses. page: { limit, cursor, since }
+  getAnnouncementFeed: async (user_id, page = {}) => {
+    const response = await api.get('/student/announcements', {
+      params: { user_id, ...page },
+    });
+    return response.data;
+  },
+
   getCourseInsights: async (user_id, course_id) => {
     const response = await api.get(`/student/courses/${course_id}/insights`, {
       params: { user_id },
@@ -337,7 +370,8 @@ export const analystAPI = {
     const response = await api.get(`/analyst/courses/${course_id}/grade-distribution`);
     return response.data;
   },
-  postInsight: async (posted_by, course_id, title, chart_type, chart_data, summary = '') => {
+  // query_spec (e.g. { kind: 'grade_distribution' }) makes the server keep chart_data current
+  postInsight: async (posted_by, course_id, title, chart_type, chart_data, summary = '', query_spec = null) => {
     const response = await api.post('/analyst/insights/post', {
       posted_by,
       course_id,
@@ -345,6 +379,7 @@ export const analystAPI = {
       chart_type,
       chart_data,
       summary,
+      query_spec,
     });
     return response.data;
   },
@@ -354,6 +389,49 @@ export const analystAPI = {
     });
     return response.data;
   },
+  // options: { metric, grain, group_by, from, to, window, course_ids }
+  getTrends: async ({ course_ids = [], ...options } = {}) => {
+    const params = new URLSearchParams();
+    Object.entries(options).forEach(([key, value]) => {
+      if (value !== undefined && value !== null) params.append(key, value);
+    });
+    course_ids.forEach((id) => params.append('course_id', id));
+    const response = await api.get('/analyst/trends', { params });
+    return response.data;
+  },
+  // One call for every course (or course_ids) plus the overall histogram
+  getGradeHistogram: async ({ bins = 10, course_ids = [] } = {}) => {
+    const params = new URLSearchParams({ bins });
+    course_ids.forEach((id) => params.append('course_id', id));
+    const response = await api.get('/analyst/grade-histogram', { params });
+    return response.data;
+  },
+  // options: { group_by, from, to, course_ids }
+  getFunnel: async ({ course_ids = [], ...options } = {}) => {
+    const params = new URLSearchParams(options);
+    course_ids.forEach((id) => params.append('course_id', id));
+    const response = await api.get('/analyst/funnel', { params });
+    return response.data;
+  },
+  // options: { from, to, weeks, course_ids }
+  getCohorts: async ({ course_ids = [], ...options } = {}) => {
+    const params = new URLSearchParams(options);
+    course_ids.forEach((id) => params.append('course_id', id));
+    const response = await api.get('/analyst/cohorts', { params });
+    return response.data;
+  },
+  // options: { group_by, from, to, mode: 'approx' | 'exact', course_ids }
+  getActiveStudents: async ({ course_ids = [], ...options } = {}) => {
+    const params = new URLSearchParams(options);
+    course_ids.forEach((id) => params.append('course_id', id));
+    const response = await api.get('/analyst/active-students', { params });
+    return response.data;
+  },
+  // spec: { filters, group_by, metrics, fee_bands, order_by, limit }
+  query: async (spec) => {
+    const response = await api.post('/analyst/query', spec);
+    return response.data;
+  },
 };
 
 export default api;
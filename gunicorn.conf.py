@@ -0,0 +1,73 @@
+"""
+Gunicorn serving profile (Procfile: gunicorn -c gunicorn.conf.py app:app).
+
+Requests spend most of their time waiting on Postgres and Supabase, so
+workers are concurrent: gevent (default) or gthread via
+GUNICORN_WORKER_CLASS. The app is preloaded once in the master and each
+worker opens its own DB pool and job threads after fork. Workers are
+recycled after GUNICORN_MAX_REQUESTS (jittered) and get
+GUNICORN_GRACEFUL_TIMEOUT seconds to finish in-flight requests.
+
+Compare with gunicorn's defaults (one sync worker):
+    python bench/run.py serving
+"""
+import multiprocessing
+import os
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+if worker_class not in ("gevent", "gthread"):
+    raise RuntimeError("GUNICORN_WORKER_CLASS must be gevent or gthread")
+
+if worker_class == "gevent":
+    # Patch before the preloaded app imports db.py, which installs the
+    # psycopg2 wait callback only when sockets are already patched
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+_cpus = multiprocessing.cpu_count()
+workers = int(os.getenv("WEB_CONCURRENCY", str(_cpus + 1 if worker_class == "gevent" else 2 * _cpus + 1)))
+# gevent: concurrent requests per worker; DB work is still capped by DB_POOL_MAX
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+# gthread: threads per worker; keep DB_POOL_MAX >= threads
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+preload_app = True
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+
+def on_starting(server):
+    # Prometheus multiprocess files from a previous run would be summed in
+    multiproc_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        os.makedirs(multiproc_dir, exist_ok=True)
+        for name in os.listdir(multiproc_dir):
+            if name.endswith(".db"):
+                os.remove(os.path.join(multiproc_dir, name))
+
+
+def post_worker_init(worker):
+    # After fork and (for gevent) patching: open this worker's pool, start
+    # its jobs and load the analyst snapshot instead of waiting for the
+    # first request
+    import analytics
+    import db
+    import jobs
+    db.init_pool()
+    jobs.start()
+    analytics.warm()
+
+
+def worker_exit(server, worker):
+    import db
+    db.close_pool()
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
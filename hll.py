@@ -0,0 +1,208 @@
+"""
+HyperLogLog sketches of distinct active students.
+
+Sketches are built in Postgres (see migrations/add_activity_sketches.sql):
+4096 one-byte registers (precision p = 12) per course per day and per week.
+Merging is a register-wise max, so any set of buckets can be combined at
+query time. Writes only queue activity (student_activity_pending); the
+hll_merge job folds the queue into the sketches every HLL_MERGE_SECONDS, so
+approximate counts trail writes by up to that long.
+
+Error: the relative standard error is 1.04 / sqrt(4096), about 1.6%. About 95%
+of estimates fall within 3.3% of the true count. Below about 10,000 the
+small-range correction (linear counting) is usually much closer. Sketches
+only grow: deleted enrollments stay counted.
+
+    python hll.py backfill    # rebuild all sketches from student_activity
+"""
+import math
+import os
+from datetime import timedelta
+import numpy as np
+import jobs
+from db import get_connection
+
+HLL_MERGE_SECONDS = int(os.getenv("HLL_MERGE_SECONDS", "30"))
+HLL_MERGE_BATCH = int(os.getenv("HLL_MERGE_BATCH", "50000"))
+# Held by whoever writes sketches (merge, backfill) for their transaction
+_SKETCH_LOCK = "hll_sketches"
+
+P = 12
+M = 1 << P
+RELATIVE_ERROR = 1.04 / math.sqrt(M)
+_ALPHA = 0.7213 / (1 + 1.079 / M)
+
+
+def empty():
+    return np.zeros(M, np.uint8)
+
+
+def merge_into(registers, sketch):
+    """Fold a stored sketch (bytes/memoryview) into registers in place"""
+    np.maximum(registers, np.frombuffer(sketch, np.uint8), out=registers)
+    return registers
+
+
+def estimate(registers):
+    """Estimated number of distinct items in a sketch"""
+    zeros = int(np.count_nonzero(registers == 0))
+    if zeros == M:
+        return 0
+    raw = _ALPHA * M * M / float(np.sum(np.ldexp(1.0, -registers.astype(np.int32))))
+    if raw <= 2.5 * M and zeros:
+        # Small-range correction: linear counting over the empty registers
+        return round(M * math.log(M / zeros))
+    return round(raw)
+
+
+def error_bounds(value):
+    """(low, high) for roughly 95% confidence (two standard errors)"""
+    margin = 2 * RELATIVE_ERROR * value
+    return max(0, math.floor(value - margin)), math.ceil(value + margin)
+
+
+def backfill(conn, batch_rows=10000):
+    """
+    Rebuild active_students_daily/weekly from student_activity. Registers
+    are computed set-based in SQL; sketches are assembled here one course at
+    a time.
+    """
+    from psycopg2.extras import execute_values
+
+    write = conn.cursor()
+    write.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (_SKETCH_LOCK,))
+    # Queued activity is also in student_activity; adding a user twice is harmless
+    write.execute("DELETE FROM public.student_activity_pending")
+    write.execute("DELETE FROM public.active_students_daily")
+    write.execute("DELETE FROM public.active_students_weekly")
+
+    read = conn.cursor(name="hll_backfill")
+    read.itersize = batch_rows
+    read.execute("""
+        SELECT a.course_id, a.day, r.idx, MAX(r.rank)
+        FROM public.student_activity a
+        JOIN public.course c ON c.course_id = a.course_id
+        CROSS JOIN LATERAL public.hll_register(a.user_id) r
+        GROUP BY a.course_id, a.day, r.idx
+        ORDER BY a.course_id, a.day
+    """)
+
+    daily, weekly = [], {}
+    course, day, registers = None, None, None
+
+    def flush_day():
+        if registers is not None:
+            daily.append((course, day, registers.tobytes()))
+            week = day - timedelta(days=day.weekday())
+            np.maximum(weekly.setdefault(week, empty()), registers, out=weekly[week])
+        if len(daily) >= 1000:
+            execute_values(write, "INSERT INTO public.active_students_daily (course_id, day, sketch) VALUES %s", daily)
+            daily.clear()
+
+    def flush_course():
+        if weekly:
+            execute_values(write, "INSERT INTO public.active_students_weekly (course_id, week, sketch) VALUES %s",
+                           [(course, week, regs.tobytes()) for week, regs in weekly.items()])
+            weekly.clear()
+
+    for course_id, activity_day, idx, rank in read:
+        if (course_id, activity_day) != (course, day):
+            flush_day()
+            if course_id != course:
+                flush_course()
+            course, day, registers = course_id, activity_day, empty()
+        registers[idx] = rank
+    flush_day()
+    flush_course()
+    if daily:
+        execute_values(write, "INSERT INTO public.active_students_daily (course_id, day, sketch) VALUES %s", daily)
+    read.close()
+    write.close()
+    conn.commit()
+
+
+def _merge_sketches(cur, table, column, sketches):
+    """Register-wise max of sketches {(course_id, bucket): registers} into table"""
+    from psycopg2.extras import execute_values
+
+    if not sketches:
+        return
+    cur.execute(f"SELECT course_id, {column}, sketch FROM public.{table} WHERE (course_id, {column}) IN %s",
+                (tuple(sketches),))
+    for course_id, bucket, sketch in cur.fetchall():
+        merge_into(sketches[(course_id, bucket)], sketch)
+    execute_values(cur, f"""
+        INSERT INTO public.{table} (course_id, {column}, sketch) VALUES %s
+        ON CONFLICT (course_id, {column}) DO UPDATE SET sketch = EXCLUDED.sketch
+    """, [(course_id, bucket, registers.tobytes()) for (course_id, bucket), registers in sketches.items()])
+
+
+def merge_pending(conn, batch_rows=HLL_MERGE_BATCH):
+    """
+    Fold one batch of queued activity into the daily and weekly sketches.
+    Returns the number of queued rows consumed; 0 if the queue is empty or
+    another process is merging.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s))", (_SKETCH_LOCK,))
+    if not cur.fetchone()[0]:
+        conn.rollback()
+        return 0
+    cur.execute("""
+        WITH moved AS (
+            DELETE FROM public.student_activity_pending
+            WHERE id IN (SELECT id FROM public.student_activity_pending ORDER BY id LIMIT %s)
+            RETURNING course_id, day, user_id
+        ), registers AS (
+            SELECT m.course_id, m.day, r.idx, MAX(r.rank) AS rank
+            FROM moved m
+            JOIN public.course c ON c.course_id = m.course_id
+            CROSS JOIN LATERAL public.hll_register(m.user_id) r
+            GROUP BY m.course_id, m.day, r.idx
+        )
+        SELECT course_id::text, day, idx, rank, (SELECT count(*) FROM moved) FROM registers
+    """, (batch_rows,))
+    daily, weekly, consumed = {}, {}, 0
+    for course_id, day, idx, rank, consumed in cur.fetchall():
+        registers = daily.setdefault((course_id, day), empty())
+        registers[idx] = max(registers[idx], rank)
+    for (course_id, day), registers in daily.items():
+        week = weekly.setdefault((course_id, day - timedelta(days=day.weekday())), empty())
+        np.maximum(week, registers, out=week)
+    _merge_sketches(cur, "active_students_daily", "day", daily)
+    _merge_sketches(cur, "active_students_weekly", "week", weekly)
+    conn.commit()
+    cur.close()
+    return consumed
+
+
+@jobs.every(HLL_MERGE_SECONDS, name="hll_merge")
+def merge_pending_job():
+    """Drain the activity queue into the sketches"""
+    conn = get_connection()
+    try:
+        while merge_pending(conn) == HLL_MERGE_BATCH:
+            pass
+    finally:
+        conn.close()
+
+
+def main():
+    import argparse
+    import psycopg2
+    from db import connection_params
+
+    parser = argparse.ArgumentParser(description="HyperLogLog activity sketches")
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+
+    conn = psycopg2.connect(**connection_params())
+    try:
+        backfill(conn)
+        print("Sketches rebuilt")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
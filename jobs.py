@@ -0,0 +1,58 @@
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# (name, interval_seconds, func) registered with @every
+_jobs = []
+_started_pid = None
+_lock = threading.Lock()
+
+
+def every(seconds, name=None):
+    """
+    Register func to run every `seconds` in a background thread of each
+    worker process. seconds <= 0 registers nothing. Jobs that must run once
+    per cluster take a Postgres advisory lock themselves.
+    """
+    def decorator(func):
+        if seconds and seconds > 0:
+            _jobs.append((name or func.__name__, seconds, func))
+        return func
+    return decorator
+
+
+def start():
+    """Start registered jobs in this process. Cheap to call on every request."""
+    global _started_pid
+    # Started lazily so each forked worker runs its own threads
+    if _started_pid == os.getpid():
+        return
+    with _lock:
+        if _started_pid == os.getpid():
+            return
+        for name, interval, func in _jobs:
+            threading.Thread(target=_loop, args=(name, interval, func),
+                             name=f"job-{name}", daemon=True).start()
+        _started_pid = os.getpid()
+
+
+def run_in_background(func, *args, **kwargs):
+    """Run func once on a daemon thread, logging any failure."""
+    threading.Thread(target=_run, args=(func.__name__, func) + args, kwargs=kwargs,
+                     name=f"job-{func.__name__}", daemon=True).start()
+
+
+def _run(name, func, *args, **kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        log.exception("background job %s failed", name)
+
+
+def _loop(name, interval, func):
+    while True:
+        time.sleep(interval)
+        _run(name, func)
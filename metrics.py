@@ -0,0 +1,106 @@
+import os
+import time
+from contextlib import contextmanager
+from flask import Response, has_request_context, request
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram,
+                               generate_latest, REGISTRY)
+from db import add_query_hook
+
+# Under gunicorn each worker keeps its own counters. Set PROMETHEUS_MULTIPROC_DIR
+# (an empty directory shared by the workers) so /api/metrics reports all of them.
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route",
+    ["route", "method"], buckets=LATENCY_BUCKETS)
+REQUESTS = Counter(
+    "http_requests_total", "Requests by route and status",
+    ["route", "method", "status"])
+DB_QUERIES = Histogram(
+    "db_queries_per_request", "Statements executed per request",
+    ["route"], buckets=QUERY_COUNT_BUCKETS)
+DB_TIME = Histogram(
+    "db_time_per_request_seconds", "Time spent in execute() per request",
+    ["route"], buckets=LATENCY_BUCKETS)
+SUPABASE_TIME = Histogram(
+    "supabase_request_duration_seconds", "Supabase Auth API call latency",
+    ["route", "operation"], buckets=LATENCY_BUCKETS)
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "Requests shed by admission control",
+    ["route_class", "reason"])
+DB_BUDGET_EXCEEDED = Counter(
+    "db_budget_exceeded_total", "Statements stopped by the route's DB time budget",
+    ["route", "reason"])
+
+# Per-request totals live in the WSGI environ rather than flask.g, because
+# /api/batch sub-requests share the outer request's app context.
+_STATS_KEY = "app.metrics"
+
+
+def _stats():
+    if not has_request_context():
+        return None
+    return request.environ.get(_STATS_KEY)
+
+
+def route_label():
+    """URL rule of the current request ("/api/courses/<course_id>/..."), not the raw path"""
+    rule = request.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+
+@add_query_hook
+def _count_query(sql, params, seconds, cursor):
+    stats = _stats()
+    if stats is not None:
+        stats["queries"] += 1
+        stats["db_time"] += seconds
+
+
+@contextmanager
+def supabase_timer(operation):
+    """Time a Supabase Auth call for the current route"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        route = route_label() if has_request_context() else "background"
+        SUPABASE_TIME.labels(route, operation).observe(time.perf_counter() - start)
+
+
+def start_request():
+    request.environ[_STATS_KEY] = {"start": time.perf_counter(), "queries": 0, "db_time": 0.0}
+
+
+def finish_request(response):
+    stats = request.environ.get(_STATS_KEY)
+    if stats is not None:
+        route = route_label()
+        REQUEST_LATENCY.labels(route, request.method).observe(time.perf_counter() - stats["start"])
+        REQUESTS.labels(route, request.method, str(response.status_code)).inc()
+        DB_QUERIES.labels(route).observe(stats["queries"])
+        DB_TIME.labels(route).observe(stats["db_time"])
+    return response
+
+
+def init_app(app):
+    """Install the request hooks and the /api/metrics route"""
+    app.before_request(start_request)
+    app.after_request(finish_request)
+
+    @app.route("/api/metrics", methods=["GET"])
+    def prometheus_metrics():
+        """Prometheus text exposition of the request, DB and Supabase metrics"""
+        if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+            return Response("unauthorized\n", status=401, mimetype="text/plain")
+        if MULTIPROCESS:
+            from prometheus_client import multiprocess
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
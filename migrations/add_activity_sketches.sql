@@ -0,0 +1,85 @@
+-- HyperLogLog sketches of active students per course per day/week
+-- Run this in Supabase SQL Editor (after add_assignment_tables.sql),
+-- then fill existing history with: python hll.py backfill
+
+-- A student is active on a day if they enrolled in or submitted to the course
+CREATE OR REPLACE VIEW public.student_activity AS
+SELECT e.course_id, e.enroll_date AS day, e.user_id
+FROM public.enrolled_in e
+WHERE e.enroll_date IS NOT NULL
+UNION ALL
+SELECT a.course_id, s.submitted_at::date, s.student_id
+FROM public.assignment_submission s
+JOIN public.assignment a ON a.assignment_id = s.assignment_id
+WHERE s.submitted_at IS NOT NULL;
+
+-- Sketch: 4096 one-byte registers (precision p = 12), see hll.py
+CREATE TABLE IF NOT EXISTS public.active_students_daily (
+    course_id uuid NOT NULL REFERENCES public.course(course_id) ON DELETE CASCADE,
+    day date NOT NULL,
+    sketch bytea NOT NULL,
+    PRIMARY KEY (course_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS public.active_students_weekly (
+    course_id uuid NOT NULL REFERENCES public.course(course_id) ON DELETE CASCADE,
+    week date NOT NULL,                   -- Monday of the ISO week
+    sketch bytea NOT NULL,
+    PRIMARY KEY (course_id, week)
+);
+
+CREATE INDEX IF NOT EXISTS idx_active_students_daily_day ON public.active_students_daily(day);
+CREATE INDEX IF NOT EXISTS idx_active_students_weekly_week ON public.active_students_weekly(week);
+
+-- Register a user lands in and its rank: low 12 bits of a 64-bit hash pick
+-- the register, leading zeros of the remaining 52 bits (+1) give the rank
+CREATE OR REPLACE FUNCTION public.hll_register(p_user uuid, OUT idx int, OUT rank int) AS $$
+    SELECT (h & 4095)::int, 53 - length(ltrim(((h >> 12)::bit(52))::text, '0'))
+    FROM (SELECT hashtextextended(p_user::text, 0) AS h) t
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Activity waiting to be folded into the sketches. Triggers only append
+-- here, so a write never locks or rewrites a 4 KB sketch row; the app's
+-- hll_merge job (hll.merge_pending) drains it every HLL_MERGE_SECONDS.
+CREATE TABLE IF NOT EXISTS public.student_activity_pending (
+    id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    course_id uuid NOT NULL,
+    day date NOT NULL,
+    user_id uuid NOT NULL
+);
+
+-- Older installs upserted sketches synchronously from the triggers
+DROP FUNCTION IF EXISTS public.hll_add_activity(uuid, date, uuid);
+
+CREATE OR REPLACE FUNCTION public.sketch_enrollment_activity()
+RETURNS trigger AS $$
+BEGIN
+    IF new.enroll_date IS NOT NULL THEN
+        INSERT INTO public.student_activity_pending (course_id, day, user_id)
+        VALUES (new.course_id, new.enroll_date, new.user_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.sketch_submission_activity()
+RETURNS trigger AS $$
+BEGIN
+    IF new.submitted_at IS NOT NULL THEN
+        INSERT INTO public.student_activity_pending (course_id, day, user_id)
+        SELECT a.course_id, new.submitted_at::date, new.student_id
+        FROM public.assignment a WHERE a.assignment_id = new.assignment_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_sketch_enrollment_activity ON public.enrolled_in;
+CREATE TRIGGER trigger_sketch_enrollment_activity
+AFTER INSERT ON public.enrolled_in
+FOR EACH ROW EXECUTE FUNCTION public.sketch_enrollment_activity();
+
+DROP TRIGGER IF EXISTS trigger_sketch_submission_activity ON public.assignment_submission;
+CREATE TRIGGER trigger_sketch_submission_activity
+AFTER INSERT OR UPDATE OF submitted_at ON public.assignment_submission
+FOR EACH ROW EXECUTE FUNCTION public.sketch_submission_activity();
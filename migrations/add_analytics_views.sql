@@ -0,0 +1,78 @@
+-- Materialized per-course and per-level analytics for the analyst routes
+-- Run this in Supabase SQL Editor (after add_assignment_tables.sql)
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS public.course_stats_mv AS
+SELECT c.course_id, c.title, c.level, c.duration,
+       COALESCE(e.enrolled, 0) AS enrolled,
+       COALESCE(e.completed, 0) AS completed,
+       COALESCE(e.ongoing, 0) AS ongoing,
+       COALESCE(a.assignment_count, 0) AS assignment_count
+FROM public.course c
+LEFT JOIN (
+    SELECT course_id,
+           COUNT(*) FILTER (WHERE status != 'dropped') AS enrolled,
+           COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+           COUNT(*) FILTER (WHERE status = 'ongoing') AS ongoing
+    FROM public.enrolled_in
+    GROUP BY course_id
+) e ON e.course_id = c.course_id
+LEFT JOIN (
+    SELECT course_id, COUNT(*) AS assignment_count
+    FROM public.assignment
+    GROUP BY course_id
+) a ON a.course_id = c.course_id;
+
+-- REFRESH ... CONCURRENTLY needs a unique index covering every row
+CREATE UNIQUE INDEX IF NOT EXISTS course_stats_mv_course_id ON public.course_stats_mv(course_id);
+CREATE INDEX IF NOT EXISTS course_stats_mv_enrolled ON public.course_stats_mv(enrolled DESC);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS public.level_enrollment_mv AS
+SELECT COALESCE(c.level, 'Unknown') AS level, COUNT(*) AS enrollments
+FROM public.enrolled_in e
+JOIN public.course c ON c.course_id = e.course_id
+WHERE e.status != 'dropped'
+GROUP BY COALESCE(c.level, 'Unknown');
+
+CREATE UNIQUE INDEX IF NOT EXISTS level_enrollment_mv_level ON public.level_enrollment_mv(level);
+
+-- One row per view: when it was last refreshed and whether its sources
+-- changed since. The app refreshes dirty views on a schedule.
+CREATE TABLE IF NOT EXISTS public.analytics_refresh (
+    view_name text PRIMARY KEY,
+    dirty boolean NOT NULL DEFAULT true,
+    refreshed_at timestamptz,
+    duration_ms int
+);
+
+-- Set while a refresher holds the view (a lease rather than an advisory
+-- lock: the transaction pooler can run each transaction on another backend)
+ALTER TABLE public.analytics_refresh ADD COLUMN IF NOT EXISTS refreshing_since timestamptz;
+
+INSERT INTO public.analytics_refresh (view_name, dirty, refreshed_at)
+VALUES ('course_stats_mv', false, now()), ('level_enrollment_mv', false, now())
+ON CONFLICT (view_name) DO NOTHING;
+
+-- Marks every analytics view dirty. The WHERE clause means only the first
+-- write after a refresh touches the row.
+CREATE OR REPLACE FUNCTION public.mark_analytics_dirty()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE public.analytics_refresh SET dirty = true WHERE NOT dirty;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS analytics_dirty_enrolled_in ON public.enrolled_in;
+CREATE TRIGGER analytics_dirty_enrolled_in
+AFTER INSERT OR UPDATE OR DELETE ON public.enrolled_in
+FOR EACH STATEMENT EXECUTE FUNCTION public.mark_analytics_dirty();
+
+DROP TRIGGER IF EXISTS analytics_dirty_course ON public.course;
+CREATE TRIGGER analytics_dirty_course
+AFTER INSERT OR UPDATE OR DELETE ON public.course
+FOR EACH STATEMENT EXECUTE FUNCTION public.mark_analytics_dirty();
+
+DROP TRIGGER IF EXISTS analytics_dirty_assignment ON public.assignment;
+CREATE TRIGGER analytics_dirty_assignment
+AFTER INSERT OR DELETE ON public.assignment
+FOR EACH STATEMENT EXECUTE FUNCTION public.mark_analytics_dirty();
@@ -0,0 +1,29 @@
+-- Assignment and submission tables used by the assignment routes
+-- Run this in Supabase SQL Editor (no-op where the tables already exist)
+
+CREATE TABLE IF NOT EXISTS public.assignment (
+    assignment_id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    course_id uuid NOT NULL REFERENCES public.course(course_id) ON DELETE CASCADE,
+    module_number int,
+    instructor_id uuid REFERENCES public.instructor(user_id) ON DELETE SET NULL,
+    title text NOT NULL,
+    description text,
+    assignment_url text,
+    due_date timestamp,
+    max_marks int DEFAULT 20,
+    created_at timestamp DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS public.assignment_submission (
+    submission_id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    assignment_id uuid NOT NULL REFERENCES public.assignment(assignment_id) ON DELETE CASCADE,
+    student_id uuid NOT NULL REFERENCES public.student(user_id) ON DELETE CASCADE,
+    submission_url text,
+    submitted_at timestamp DEFAULT now(),
+    marks_obtained numeric,
+    feedback text,
+    UNIQUE (assignment_id, student_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_assignment_course ON public.assignment(course_id);
+CREATE INDEX IF NOT EXISTS idx_submission_student ON public.assignment_submission(student_id);
@@ -0,0 +1,6 @@
+-- Version stamp for a course's module/content tree
+-- Run this in Supabase SQL Editor
+
+-- Bumped by the API whenever a module or module content is added, so the
+-- per-course module tree served to students can be cached and reused.
+ALTER TABLE public.course ADD COLUMN IF NOT EXISTS content_version int NOT NULL DEFAULT 0;
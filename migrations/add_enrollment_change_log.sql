@@ -0,0 +1,45 @@
+-- Change tracking on enrolled_in (updated_at + deletion log) for incremental readers
+-- Run this in Supabase SQL Editor
+
+ALTER TABLE public.enrolled_in ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS idx_enrolled_in_updated_at ON public.enrolled_in(updated_at);
+
+CREATE OR REPLACE FUNCTION public.touch_enrolled_in()
+RETURNS trigger AS $$
+BEGIN
+    new.updated_at = now();
+    RETURN new;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_touch_enrolled_in ON public.enrolled_in;
+CREATE TRIGGER trigger_touch_enrolled_in
+BEFORE UPDATE ON public.enrolled_in
+FOR EACH ROW
+EXECUTE FUNCTION public.touch_enrolled_in();
+
+-- Deleted enrollments, kept for a day so incremental readers can drop them
+CREATE TABLE IF NOT EXISTS public.enrolled_in_deleted (
+    user_id uuid NOT NULL,
+    course_id uuid NOT NULL,
+    deleted_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_enrolled_in_deleted_at ON public.enrolled_in_deleted(deleted_at);
+
+CREATE OR REPLACE FUNCTION public.log_enrolled_in_delete()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO public.enrolled_in_deleted (user_id, course_id)
+    SELECT user_id, course_id FROM old_rows;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_log_enrolled_in_delete ON public.enrolled_in;
+CREATE TRIGGER trigger_log_enrolled_in_delete
+AFTER DELETE ON public.enrolled_in
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.log_enrolled_in_delete();
@@ -0,0 +1,142 @@
+-- Daily and weekly enrollment/completion counts per course for trend charts
+-- Run this in Supabase SQL Editor
+
+CREATE TABLE IF NOT EXISTS public.enrollment_daily (
+    course_id uuid NOT NULL REFERENCES public.course(course_id) ON DELETE CASCADE,
+    day date NOT NULL,
+    enrollments int NOT NULL DEFAULT 0,   -- rows with this enroll_date
+    completions int NOT NULL DEFAULT 0,   -- completed rows with this completion_date
+    PRIMARY KEY (course_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS public.enrollment_weekly (
+    course_id uuid NOT NULL REFERENCES public.course(course_id) ON DELETE CASCADE,
+    week date NOT NULL,                   -- Monday of the ISO week
+    enrollments int NOT NULL DEFAULT 0,
+    completions int NOT NULL DEFAULT 0,
+    PRIMARY KEY (course_id, week)
+);
+
+-- Cross-course range scans (group_by university/level)
+CREATE INDEX IF NOT EXISTS idx_enrollment_daily_day ON public.enrollment_daily(day);
+CREATE INDEX IF NOT EXISTS idx_enrollment_weekly_week ON public.enrollment_weekly(week);
+
+-- Deltas waiting to be folded into the rollups. Triggers only append here,
+-- so concurrent enrollments into one course never queue on its bucket rows;
+-- the app's merge_enrollment_rollups job drains it every ROLLUP_MERGE_SECONDS.
+CREATE TABLE IF NOT EXISTS public.enrollment_rollup_pending (
+    id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    course_id uuid NOT NULL,
+    day date NOT NULL,
+    enrollments int NOT NULL DEFAULT 0,
+    completions int NOT NULL DEFAULT 0
+);
+
+-- Queue sign (+1/-1) for the buckets an enrollment row counts towards
+CREATE OR REPLACE FUNCTION public.bump_enrollment_rollups(p_course uuid, p_enrolled date, p_completed date, p_sign int)
+RETURNS void AS $$
+BEGIN
+    IF p_course IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO public.enrollment_rollup_pending (course_id, day, enrollments, completions)
+    SELECT p_course, d.day, d.enrollments, d.completions
+    FROM (VALUES (p_enrolled, p_sign, 0), (p_completed, 0, p_sign)) d(day, enrollments, completions)
+    WHERE d.day IS NOT NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Fold up to p_batch queued deltas into the daily and weekly rollups.
+-- Returns the number consumed; 0 if the queue is empty or another merge
+-- (or a backfill) is running. Deltas for deleted courses are dropped.
+CREATE OR REPLACE FUNCTION public.merge_enrollment_rollups(p_batch int DEFAULT 50000)
+RETURNS int AS $$
+DECLARE
+    consumed int;
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('enrollment_rollups')) THEN
+        RETURN 0;
+    END IF;
+    WITH moved AS (
+        DELETE FROM public.enrollment_rollup_pending
+        WHERE id IN (SELECT id FROM public.enrollment_rollup_pending ORDER BY id LIMIT p_batch)
+        RETURNING course_id, day, enrollments, completions
+    ), daily AS (
+        SELECT m.course_id, m.day, SUM(m.enrollments)::int AS enrollments, SUM(m.completions)::int AS completions
+        FROM moved m
+        JOIN public.course c ON c.course_id = m.course_id
+        GROUP BY m.course_id, m.day
+    ), merged_daily AS (
+        INSERT INTO public.enrollment_daily AS r (course_id, day, enrollments, completions)
+        SELECT course_id, day, enrollments, completions FROM daily ORDER BY course_id, day
+        ON CONFLICT (course_id, day) DO UPDATE
+        SET enrollments = r.enrollments + excluded.enrollments,
+            completions = r.completions + excluded.completions
+    ), merged_weekly AS (
+        INSERT INTO public.enrollment_weekly AS r (course_id, week, enrollments, completions)
+        SELECT course_id, date_trunc('week', day)::date, SUM(enrollments)::int, SUM(completions)::int
+        FROM daily GROUP BY 1, 2 ORDER BY 1, 2
+        ON CONFLICT (course_id, week) DO UPDATE
+        SET enrollments = r.enrollments + excluded.enrollments,
+            completions = r.completions + excluded.completions
+    )
+    SELECT count(*) INTO consumed FROM moved;
+    RETURN consumed;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.update_enrollment_rollups()
+RETURNS trigger AS $$
+BEGIN
+    IF tg_op IN ('UPDATE', 'DELETE') THEN
+        PERFORM public.bump_enrollment_rollups(
+            old.course_id, old.enroll_date,
+            CASE WHEN old.status = 'completed' THEN old.completion_date END, -1);
+    END IF;
+    IF tg_op IN ('INSERT', 'UPDATE') THEN
+        PERFORM public.bump_enrollment_rollups(
+            new.course_id, new.enroll_date,
+            CASE WHEN new.status = 'completed' THEN new.completion_date END, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_update_enrollment_rollups ON public.enrolled_in;
+CREATE TRIGGER trigger_update_enrollment_rollups
+AFTER INSERT OR DELETE OR UPDATE OF course_id, enroll_date, status, completion_date ON public.enrolled_in
+FOR EACH ROW
+EXECUTE FUNCTION public.update_enrollment_rollups();
+
+-- Rebuild both tables from enrolled_in (first install, or after a bulk load
+-- with triggers disabled). Blocks enrollment writes while it runs.
+CREATE OR REPLACE FUNCTION public.backfill_enrollment_rollups()
+RETURNS void AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('enrollment_rollups'));
+    LOCK TABLE public.enrolled_in IN SHARE MODE;
+    -- Queued deltas are already reflected in enrolled_in
+    DELETE FROM public.enrollment_rollup_pending;
+    DELETE FROM public.enrollment_daily;
+    DELETE FROM public.enrollment_weekly;
+
+    INSERT INTO public.enrollment_daily (course_id, day, enrollments, completions)
+    SELECT course_id, day, SUM(enrollments), SUM(completions)
+    FROM (
+        SELECT course_id, enroll_date AS day, 1 AS enrollments, 0 AS completions
+        FROM public.enrolled_in WHERE enroll_date IS NOT NULL
+        UNION ALL
+        SELECT course_id, completion_date, 0, 1
+        FROM public.enrolled_in WHERE status = 'completed' AND completion_date IS NOT NULL
+    ) t
+    WHERE course_id IS NOT NULL
+    GROUP BY course_id, day;
+
+    INSERT INTO public.enrollment_weekly (course_id, week, enrollments, completions)
+    SELECT course_id, date_trunc('week', day)::date, SUM(enrollments), SUM(completions)
+    FROM public.enrollment_daily
+    GROUP BY course_id, date_trunc('week', day)::date;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT public.backfill_enrollment_rollups();
@@ -0,0 +1,10 @@
+-- Indexes for the funnel and cohort analyses (/api/analyst/funnel, /api/analyst/cohorts)
+-- Run this in Supabase SQL Editor
+
+-- Date-range scans of enrollments without touching the heap
+CREATE INDEX IF NOT EXISTS idx_enrolled_in_enroll_date
+    ON public.enrolled_in(enroll_date) INCLUDE (user_id, course_id, status, completion_date);
+
+-- First submission per (student, course): grouped via assignment
+CREATE INDEX IF NOT EXISTS idx_submission_student_assignment
+    ON public.assignment_submission(student_id, assignment_id) INCLUDE (submitted_at);
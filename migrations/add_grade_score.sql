@@ -0,0 +1,39 @@
+-- Numeric grade (0-100) alongside the free-text enrolled_in.grade
+-- Run this in Supabase SQL Editor
+
+ALTER TABLE public.enrolled_in ADD COLUMN IF NOT EXISTS grade_score numeric(5,2)
+    CHECK (grade_score BETWEEN 0 AND 100);
+
+-- Map a grade as instructors type it to a 0-100 score:
+-- '87', '87.5%', '17/20', or a letter grade (band midpoints). NULL otherwise.
+CREATE OR REPLACE FUNCTION public.grade_to_score(grade text)
+RETURNS numeric AS $$
+    SELECT CASE
+        WHEN g ~ '^\d+(\.\d+)?\s*/\s*\d+(\.\d+)?$' THEN (
+            SELECT CASE WHEN d > 0 AND n <= d THEN round(100 * n / d, 2) END
+            FROM (SELECT split_part(g, '/', 1)::numeric AS n, split_part(g, '/', 2)::numeric AS d) f
+        )
+        WHEN g ~ '^\d+(\.\d+)?\s*%?$' THEN (
+            SELECT CASE WHEN v <= 100 THEN round(v, 2) END
+            FROM (SELECT rtrim(g, '% ')::numeric AS v) p
+        )
+        ELSE CASE upper(g)
+            WHEN 'A+' THEN 98 WHEN 'A' THEN 95 WHEN 'A-' THEN 91
+            WHEN 'B+' THEN 88 WHEN 'B' THEN 85 WHEN 'B-' THEN 81
+            WHEN 'C+' THEN 78 WHEN 'C' THEN 75 WHEN 'C-' THEN 71
+            WHEN 'D+' THEN 68 WHEN 'D' THEN 65 WHEN 'D-' THEN 61
+            WHEN 'E' THEN 55 WHEN 'F' THEN 40
+        END
+    END
+    FROM (SELECT btrim(grade) AS g) t
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Histograms and percentiles per course read only scored rows
+CREATE INDEX IF NOT EXISTS idx_enrolled_in_grade_score
+    ON public.enrolled_in(course_id, grade_score) WHERE grade_score IS NOT NULL;
+
+-- Backfill existing grades (fires the enrolled_in update triggers once per row)
+UPDATE public.enrolled_in
+SET grade_score = public.grade_to_score(grade)
+WHERE grade IS NOT NULL AND grade <> ''
+  AND grade_score IS DISTINCT FROM public.grade_to_score(grade);
@@ -0,0 +1,54 @@
+-- Insights defined by a query spec and recomputed when their course's data changes
+-- Run this in Supabase SQL Editor
+
+ALTER TABLE public.course_insight ADD COLUMN IF NOT EXISTS query_spec jsonb;         -- NULL = static chart_data
+ALTER TABLE public.course_insight ADD COLUMN IF NOT EXISTS source_version bigint;     -- course_stats_version.version chart_data reflects
+ALTER TABLE public.course_insight ADD COLUMN IF NOT EXISTS refreshed_at timestamptz;
+
+-- Bumped whenever the course's enrollments change. Kept beside course rather
+-- than on it so enrollment writes neither lock the course row nor fire its
+-- triggers. A course without a row is at version 0. No foreign key: deleting
+-- a course cascades to enrolled_in, whose trigger then bumps the version.
+CREATE TABLE IF NOT EXISTS public.course_stats_version (
+    course_id uuid PRIMARY KEY,
+    version bigint NOT NULL DEFAULT 0
+);
+
+-- Older installs kept the counter on course
+ALTER TABLE public.course DROP COLUMN IF EXISTS stats_version;
+
+CREATE INDEX IF NOT EXISTS idx_course_insight_live
+    ON public.course_insight(course_id) WHERE query_spec IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION public.bump_course_stats_version()
+RETURNS trigger AS $$
+BEGIN
+    -- Sorted so concurrent multi-course statements lock rows in the same order
+    IF tg_op = 'INSERT' THEN
+        INSERT INTO public.course_stats_version AS v (course_id, version)
+        SELECT DISTINCT course_id, 1 FROM new_rows ORDER BY course_id
+        ON CONFLICT (course_id) DO UPDATE SET version = v.version + 1;
+    ELSIF tg_op = 'DELETE' THEN
+        INSERT INTO public.course_stats_version AS v (course_id, version)
+        SELECT DISTINCT course_id, 1 FROM old_rows ORDER BY course_id
+        ON CONFLICT (course_id) DO UPDATE SET version = v.version + 1;
+    ELSE
+        INSERT INTO public.course_stats_version AS v (course_id, version)
+        SELECT course_id, 1 FROM (SELECT course_id FROM new_rows UNION SELECT course_id FROM old_rows) c
+        ORDER BY course_id
+        ON CONFLICT (course_id) DO UPDATE SET version = v.version + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables allow one event per trigger
+DROP TRIGGER IF EXISTS course_stats_version_ins ON public.enrolled_in;
+DROP TRIGGER IF EXISTS course_stats_version_upd ON public.enrolled_in;
+DROP TRIGGER IF EXISTS course_stats_version_del ON public.enrolled_in;
+CREATE TRIGGER course_stats_version_ins AFTER INSERT ON public.enrolled_in
+REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION public.bump_course_stats_version();
+CREATE TRIGGER course_stats_version_upd AFTER UPDATE ON public.enrolled_in
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION public.bump_course_stats_version();
+CREATE TRIGGER course_stats_version_del AFTER DELETE ON public.enrolled_in
+REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION public.bump_course_stats_version();
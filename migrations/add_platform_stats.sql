@@ -0,0 +1,173 @@
+-- Platform-wide counters kept current by triggers
+-- Run this in Supabase SQL Editor (after add_assignment_tables.sql)
+
+-- Counters are split over 16 shard rows so concurrent writers rarely wait on
+-- the same row lock; each session updates the shard picked by its backend pid.
+-- The platform_stats view (read by /api/analyst/overview and /api/dashboard)
+-- sums them.
+CREATE TABLE IF NOT EXISTS public.platform_stats_shard (
+    shard smallint PRIMARY KEY CHECK (shard BETWEEN 0 AND 15),
+    total_users bigint NOT NULL DEFAULT 0,
+    total_courses bigint NOT NULL DEFAULT 0,
+    total_enrollment_rows bigint NOT NULL DEFAULT 0,  -- every enrolled_in row, dropped included
+    active_enrollments bigint NOT NULL DEFAULT 0,     -- status != 'dropped'
+    completed_enrollments bigint NOT NULL DEFAULT 0,  -- status = 'completed'
+    total_assignments bigint NOT NULL DEFAULT 0,
+    updated_at timestamp DEFAULT now(),
+    recounted_at timestamp
+);
+
+INSERT INTO public.platform_stats_shard (shard)
+SELECT generate_series(0, 15) ON CONFLICT DO NOTHING;
+
+-- Older installs kept a single platform_stats row; the view takes its name
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('public.platform_stats') AND relkind = 'r') THEN
+        DROP TABLE public.platform_stats;
+    END IF;
+END $$;
+
+CREATE OR REPLACE VIEW public.platform_stats AS
+SELECT sum(total_users)::bigint AS total_users,
+       sum(total_courses)::bigint AS total_courses,
+       sum(total_enrollment_rows)::bigint AS total_enrollment_rows,
+       sum(active_enrollments)::bigint AS active_enrollments,
+       sum(completed_enrollments)::bigint AS completed_enrollments,
+       sum(total_assignments)::bigint AS total_assignments,
+       max(updated_at) AS updated_at,
+       max(recounted_at) AS recounted_at
+FROM public.platform_stats_shard;
+
+-- Statement-level triggers: one counter update per statement, whatever the row count
+CREATE OR REPLACE FUNCTION public.platform_stats_count()
+RETURNS trigger AS $$
+DECLARE
+    delta bigint;
+BEGIN
+    IF tg_op = 'INSERT' THEN
+        SELECT count(*) INTO delta FROM new_rows;
+    ELSE
+        SELECT -count(*) INTO delta FROM old_rows;
+    END IF;
+    IF delta <> 0 THEN
+        EXECUTE format('UPDATE public.platform_stats_shard SET %I = %I + $1, updated_at = now() WHERE shard = $2',
+                       tg_argv[0], tg_argv[0])
+        USING delta, pg_backend_pid() % 16;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.platform_stats_enrolled_in()
+RETURNS trigger AS $$
+DECLARE
+    d_rows bigint := 0;
+    d_active bigint := 0;
+    d_completed bigint := 0;
+BEGIN
+    IF tg_op IN ('INSERT', 'UPDATE') THEN
+        SELECT count(*),
+               count(*) FILTER (WHERE status != 'dropped'),
+               count(*) FILTER (WHERE status = 'completed')
+        INTO d_rows, d_active, d_completed
+        FROM new_rows;
+    END IF;
+    IF tg_op IN ('DELETE', 'UPDATE') THEN
+        SELECT d_rows - count(*),
+               d_active - count(*) FILTER (WHERE status != 'dropped'),
+               d_completed - count(*) FILTER (WHERE status = 'completed')
+        INTO d_rows, d_active, d_completed
+        FROM old_rows;
+    END IF;
+    IF d_rows <> 0 OR d_active <> 0 OR d_completed <> 0 THEN
+        UPDATE public.platform_stats_shard
+        SET total_enrollment_rows = total_enrollment_rows + d_rows,
+            active_enrollments = active_enrollments + d_active,
+            completed_enrollments = completed_enrollments + d_completed,
+            updated_at = now()
+        WHERE shard = pg_backend_pid() % 16;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables allow one event per trigger
+DROP TRIGGER IF EXISTS platform_stats_users_ins ON public.users;
+DROP TRIGGER IF EXISTS platform_stats_users_del ON public.users;
+CREATE TRIGGER platform_stats_users_ins AFTER INSERT ON public.users
+REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION public.platform_stats_count('total_users');
+CREATE TRIGGER platform_stats_users_del AFTER DELETE ON public.users
+REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION public.platform_stats_count('total_users');
+
+DROP TRIGGER IF EXISTS platform_stats_course_ins ON public.course;
+DROP TRIGGER IF EXISTS platform_stats_course_del ON public.course;
+CREATE TRIGGER platform_stats_course_ins AFTER INSERT ON public.course
+REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION public.platform_stats_count('total_courses');
+CREATE TRIGGER platform_stats_course_del AFTER DELETE ON public.course
+REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION public.platform_stats_count('total_courses');
+
+DROP TRIGGER IF EXISTS platform_stats_assignment_ins ON public.assignment;
+DROP TRIGGER IF EXISTS platform_stats_assignment_del ON public.assignment;
+CREATE TRIGGER platform_stats_assignment_ins AFTER INSERT ON public.assignment
+REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION public.platform_stats_count('total_assignments');
+CREATE TRIGGER platform_stats_assignment_del AFTER DELETE ON public.assignment
+REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION public.platform_stats_count('total_assignments');
+
+DROP TRIGGER IF EXISTS platform_stats_enrolled_ins ON public.enrolled_in;
+DROP TRIGGER IF EXISTS platform_stats_enrolled_upd ON public.enrolled_in;
+DROP TRIGGER IF EXISTS platform_stats_enrolled_del ON public.enrolled_in;
+CREATE TRIGGER platform_stats_enrolled_ins AFTER INSERT ON public.enrolled_in
+REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION public.platform_stats_enrolled_in();
+CREATE TRIGGER platform_stats_enrolled_upd AFTER UPDATE ON public.enrolled_in
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION public.platform_stats_enrolled_in();
+CREATE TRIGGER platform_stats_enrolled_del AFTER DELETE ON public.enrolled_in
+REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION public.platform_stats_enrolled_in();
+
+-- Exact recount for reconciliation (TRUNCATE, bulk loads, drift).
+-- Returns false without doing anything if another recount holds the lock or
+-- one finished less than min_age ago (so one worker per interval does it).
+-- The correction is applied as an increment computed from the same snapshot
+-- as the counts, so triggers committing meanwhile are not overwritten.
+DROP FUNCTION IF EXISTS public.recount_platform_stats();
+CREATE OR REPLACE FUNCTION public.recount_platform_stats(min_age interval DEFAULT interval '0')
+RETURNS boolean AS $$
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('recount_platform_stats')) THEN
+        RETURN false;
+    END IF;
+    IF min_age > interval '0' AND
+       (SELECT max(recounted_at) FROM public.platform_stats_shard) > now() - min_age THEN
+        RETURN false;
+    END IF;
+    WITH actual AS (
+        SELECT (SELECT count(*) FROM public.users) AS total_users,
+               (SELECT count(*) FROM public.course) AS total_courses,
+               (SELECT count(*) FROM public.enrolled_in) AS total_enrollment_rows,
+               (SELECT count(*) FROM public.enrolled_in WHERE status != 'dropped') AS active_enrollments,
+               (SELECT count(*) FROM public.enrolled_in WHERE status = 'completed') AS completed_enrollments,
+               (SELECT count(*) FROM public.assignment) AS total_assignments
+    ), tracked AS (
+        SELECT sum(total_users) AS total_users, sum(total_courses) AS total_courses,
+               sum(total_enrollment_rows) AS total_enrollment_rows,
+               sum(active_enrollments) AS active_enrollments,
+               sum(completed_enrollments) AS completed_enrollments,
+               sum(total_assignments) AS total_assignments
+        FROM public.platform_stats_shard
+    )
+    UPDATE public.platform_stats_shard s
+    SET total_users = s.total_users + (a.total_users - t.total_users),
+        total_courses = s.total_courses + (a.total_courses - t.total_courses),
+        total_enrollment_rows = s.total_enrollment_rows + (a.total_enrollment_rows - t.total_enrollment_rows),
+        active_enrollments = s.active_enrollments + (a.active_enrollments - t.active_enrollments),
+        completed_enrollments = s.completed_enrollments + (a.completed_enrollments - t.completed_enrollments),
+        total_assignments = s.total_assignments + (a.total_assignments - t.total_assignments),
+        updated_at = now(),
+        recounted_at = now()
+    FROM actual a, tracked t
+    WHERE s.shard = 0;
+    RETURN true;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT public.recount_platform_stats();
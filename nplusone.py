@@ -0,0 +1,53 @@
+"""
+N+1 query detector.
+
+Counts SELECTs per request by normalized SQL. When the same statement runs
+more than NPLUSONE_THRESHOLD times in one request it is reported:
+
+    NPLUSONE_MODE=warn    log a warning (staging)
+    NPLUSONE_MODE=raise   raise NPlusOneError from execute() (tests)
+    NPLUSONE_MODE=off     no hook installed (default)
+"""
+import logging
+import os
+from flask import has_request_context, request
+from db import QUERY_HOOKS, add_query_hook
+from metrics import route_label
+from slowlog import fingerprint, normalize_sql
+
+NPLUSONE_MODE = os.getenv("NPLUSONE_MODE", "off").lower()
+NPLUSONE_THRESHOLD = int(os.getenv("NPLUSONE_THRESHOLD", "5"))
+
+_log = logging.getLogger("nplusone")
+_COUNTS_KEY = "app.nplusone"
+
+
+class NPlusOneError(RuntimeError):
+    pass
+
+
+def _on_query(sql, params, seconds, cursor):
+    if not has_request_context():
+        return
+    normalized = normalize_sql(sql)
+    if not normalized.lstrip("( ").upper().startswith(("SELECT", "WITH")):
+        # Bulk writes issue one INSERT/UPDATE per row by design
+        return
+    counts = request.environ.setdefault(_COUNTS_KEY, {})
+    fp = fingerprint(normalized)
+    counts[fp] = counts.get(fp, 0) + 1
+    if counts[fp] != NPLUSONE_THRESHOLD + 1:
+        return
+    message = (f"N+1 query on {request.method} {route_label()}: statement {fp} ran more than "
+               f"{NPLUSONE_THRESHOLD} times in one request: {normalized[:200]}")
+    if NPLUSONE_MODE == "raise":
+        raise NPlusOneError(message)
+    _log.warning(message)
+
+
+def install():
+    """Install the detector unless NPLUSONE_MODE is off"""
+    if NPLUSONE_MODE not in ("warn", "raise"):
+        return
+    if _on_query not in QUERY_HOOKS:
+        add_query_hook(_on_query)
@@ -0,0 +1,86 @@
+"""
+On-demand profiling of single requests.
+
+A request that sends an X-Profile-Token header matching PROFILE_TOKEN runs under pyinstrument's sampling profiler. The profile is
+written to PROFILE_DIR as a speedscope file (open at https://speedscope.app)
+and named in the X-Profile-File response header. With X-Profile-Output:
+inline (or ?_profile_output=inline) the profile is returned instead of the
+route's response; add X-Profile-Format: html for pyinstrument's HTML view.
+The token is only accepted as a header, so it never ends up in URLs, access
+logs or traffic captures. Profile downloads are never profiled themselves,
+and /api/batch is profiled as a whole rather than per sub-request.
+
+Other requests pay only for the header lookup: pyinstrument is imported on
+the first profiled request. Under gevent workers, samples can include other
+greenlets that ran on the worker thread while the request was profiled.
+"""
+import hmac
+import os
+import re
+import time
+from flask import Response, abort, g, request, send_from_directory
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")  # unset disables profiling
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))  # seconds between samples
+
+_PROFILER_KEY = "app.profiler"
+_SLUG = re.compile(r"[^A-Za-z0-9]+")
+_DOWNLOAD_ENDPOINT = "download_profile"
+
+
+def _requested():
+    token = request.headers.get("X-Profile-Token")
+    # compare_digest only accepts ASCII str; bytes work for any header value
+    return bool(PROFILE_TOKEN and token) and hmac.compare_digest(
+        token.encode("utf-8", "surrogateescape"), PROFILE_TOKEN.encode())
+
+
+def start_profile():
+    # /api/batch sub-requests inherit the caller's headers but already run
+    # under the batch's profiler; pyinstrument allows one per thread
+    if g.get("_batch_subrequest") or request.endpoint == _DOWNLOAD_ENDPOINT or not _requested():
+        return
+    from pyinstrument import Profiler
+    profiler = Profiler(interval=PROFILE_INTERVAL)
+    profiler.start()
+    request.environ[_PROFILER_KEY] = profiler
+
+
+def finish_profile(response):
+    profiler = request.environ.pop(_PROFILER_KEY, None)
+    if profiler is None:
+        return response
+    profiler.stop()
+    output = request.headers.get("X-Profile-Output") or request.args.get("_profile_output")
+    fmt = request.headers.get("X-Profile-Format") or request.args.get("_profile_format", "speedscope")
+
+    if fmt == "html":
+        body, mimetype, ext = profiler.output_html(), "text/html", "html"
+    else:
+        from pyinstrument.renderers import SpeedscopeRenderer
+        body, mimetype, ext = profiler.output(SpeedscopeRenderer()), "application/json", "speedscope.json"
+
+    if output == "inline":
+        return Response(body, mimetype=mimetype)
+
+    route = request.url_rule.rule if request.url_rule is not None else request.path
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{_SLUG.sub('_', route).strip('_')}.{ext}"
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, name), "w") as f:
+        f.write(body)
+    response.headers["X-Profile-File"] = name
+    return response
+
+
+def init_app(app):
+    """Install the profiling hooks and the stored-profile download route"""
+    app.before_request(start_profile)
+    app.after_request(finish_profile)
+
+    @app.route("/api/admin/profiles/<name>", methods=["GET"], endpoint=_DOWNLOAD_ENDPOINT)
+    def download_profile(name):
+        """Download a stored profile (requires the profile token)"""
+        if not _requested():
+            abort(404)
+        return send_from_directory(os.path.abspath(PROFILE_DIR), name, as_attachment=True)
@@ -0,0 +1,251 @@
+"""
+Slow-query log.
+
+Statements slower than SLOW_QUERY_MS are written as JSON lines to
+SLOW_QUERY_LOG with their route, normalized SQL and redacted parameters.
+A sample of slow SELECTs is re-run under EXPLAIN (ANALYZE, BUFFERS) on a
+separate connection, in a background thread and inside a rolled-back
+transaction, and the plan is logged next to them.
+
+    python slowlog.py report [--log PATH] [--top 20]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from logging.handlers import RotatingFileHandler
+from flask import has_request_context
+import psycopg2
+from cache import TTLCache
+from db import add_query_hook, connection_params
+from metrics import route_label
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))  # 0 disables the log
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "logs/slow_queries.jsonl")
+# Share of slow SELECTs that get an EXPLAIN ANALYZE, and at most one plan per
+# statement fingerprint per EXPLAIN_COOLDOWN seconds
+EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.2"))
+EXPLAIN_COOLDOWN = int(os.getenv("SLOW_QUERY_EXPLAIN_COOLDOWN", "600"))
+EXPLAIN_TIMEOUT_MS = 30000
+EXPLAIN_QUEUE_SIZE = 20
+
+_log = logging.getLogger("slowlog")
+_explain_queue = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+_explained = TTLCache(ttl=EXPLAIN_COOLDOWN, maxsize=4096)
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+_CALL = re.compile(r"([\w.]+)\s*\(")
+# Statements that take row locks or write must not be run by EXPLAIN ANALYZE
+_UNSAFE = re.compile(r"\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE)\b|\bFOR\s+KEY\s+SHARE\b"
+                     r"|\b(?:INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+# Keywords followed by "(" and built-ins without side effects; any other call
+# (e.g. public.recount_platform_stats()) may write, so it only gets a plain EXPLAIN
+_SAFE_CALLS = {
+    "select", "from", "join", "where", "and", "or", "not", "on", "in", "any", "all", "exists",
+    "values", "as", "over", "filter", "lateral", "by", "array", "then", "else", "when", "using",
+    "count", "sum", "avg", "min", "max", "coalesce", "nullif", "greatest", "least", "round",
+    "floor", "ceil", "abs", "lower", "upper", "length", "trim", "substring", "concat", "string_agg",
+    "array_agg", "json_agg", "jsonb_agg", "json_build_object", "jsonb_build_object", "extract",
+    "date_trunc", "to_char", "make_interval", "now", "cast", "row_number", "rank", "dense_rank",
+    "percentile_cont", "percentile_disc", "width_bucket", "generate_series", "bool_or", "bool_and",
+}
+
+
+def normalize_sql(sql):
+    """SQL with literals and placeholders replaced by ?, lists folded, whitespace collapsed"""
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    sql = _STRING.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _LIST.sub("(...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def redact(params):
+    """Parameter types and sizes only, never values"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {k: redact(v) for k, v in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [_redact_value(v) for v in params]
+    return _redact_value(params)
+
+
+def _redact_value(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def _emit(record):
+    _log.info(json.dumps(record, default=str))
+
+
+def _on_query(sql, params, seconds, cursor):
+    duration_ms = seconds * 1000
+    if duration_ms < SLOW_QUERY_MS:
+        return
+    normalized = normalize_sql(sql)
+    fp = fingerprint(normalized)
+    _emit({
+        "type": "query",
+        "ts": time.time(),
+        "route": route_label() if has_request_context() else "background",
+        "fingerprint": fp,
+        "sql": normalized,
+        "params": redact(params),
+        "duration_ms": round(duration_ms, 2),
+        "rows": cursor.rowcount,
+    })
+    if (normalized.lstrip("( ").upper().startswith(("SELECT", "WITH"))
+            and _explained.get(fp) is None and random.random() < EXPLAIN_SAMPLE_RATE):
+        _explained.set(fp, True)
+        try:
+            # cursor.query is the statement as sent, parameters bound
+            _explain_queue.put_nowait((fp, cursor.query, safe_to_analyze(normalized)))
+        except queue.Full:
+            pass
+        _ensure_worker()
+
+
+def safe_to_analyze(normalized):
+    """True if EXPLAIN ANALYZE can run the (normalized) statement without locking or writing"""
+    if _UNSAFE.search(normalized):
+        return False
+    return all(name.lower() in _SAFE_CALLS for name in _CALL.findall(normalized))
+
+
+def _ensure_worker():
+    global _worker_pid
+    if _worker_pid == os.getpid():
+        return
+    with _worker_lock:
+        if _worker_pid != os.getpid():
+            threading.Thread(target=_explain_loop, name="slowlog-explain", daemon=True).start()
+            _worker_pid = os.getpid()
+
+
+def _explain_loop():
+    conn = None
+    while True:
+        fp, statement, analyze = _explain_queue.get()
+        try:
+            if conn is None or conn.closed:
+                # Own connection, outside the pool and without the query hooks
+                conn = psycopg2.connect(**connection_params())
+            cur = conn.cursor()
+            cur.execute("SET LOCAL statement_timeout = %s", (EXPLAIN_TIMEOUT_MS,))
+            options = b"ANALYZE, BUFFERS, FORMAT JSON" if analyze else b"FORMAT JSON"
+            cur.execute(b"EXPLAIN (" + options + b") " + statement)
+            plan = cur.fetchone()[0]
+            cur.close()
+            # EXPLAIN ANALYZE really runs the statement
+            conn.rollback()
+            # Filter conditions in the plan carry the bound literals
+            plan_text = _STRING.sub("'?'", json.dumps(plan))
+            _emit({"type": "plan", "ts": time.time(), "fingerprint": fp, "analyze": analyze,
+                   "plan": json.loads(plan_text)})
+        except Exception as e:
+            # Anything escaping would end this thread for the life of the worker
+            _emit({"type": "plan_error", "ts": time.time(), "fingerprint": fp, "error": str(e).strip()})
+            if conn is not None:
+                try:
+                    conn.rollback()
+                except Exception:
+                    conn.close()
+                    conn = None
+
+
+def install():
+    """Start logging slow statements from app connections (no-op if SLOW_QUERY_MS <= 0)"""
+    if SLOW_QUERY_MS <= 0 or _log.handlers:
+        return
+    os.makedirs(os.path.dirname(SLOW_QUERY_LOG) or ".", exist_ok=True)
+    handler = RotatingFileHandler(SLOW_QUERY_LOG, maxBytes=10 * 1024 * 1024, backupCount=5)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _log.addHandler(handler)
+    _log.setLevel(logging.INFO)
+    _log.propagate = False
+    add_query_hook(_on_query)
+
+
+def _read_records(path):
+    # Rotated files first so later plans win
+    paths = [f"{path}.{i}" for i in range(5, 0, -1)] + [path]
+    for p in paths:
+        if not os.path.exists(p):
+            continue
+        with open(p) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def report(path, top=20):
+    """Worst statements by total time, with their latest captured plan"""
+    stats = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "durations": [], "routes": set(), "sql": ""})
+    plans = {}
+    for record in _read_records(path):
+        if record.get("type") == "query":
+            s = stats[record["fingerprint"]]
+            s["count"] += 1
+            s["total_ms"] += record["duration_ms"]
+            s["durations"].append(record["duration_ms"])
+            s["routes"].add(record.get("route"))
+            s["sql"] = record["sql"]
+        elif record.get("type") == "plan":
+            plans[record["fingerprint"]] = record["plan"]
+
+    ranked = sorted(stats.items(), key=lambda item: item[1]["total_ms"], reverse=True)[:top]
+    for fp, s in ranked:
+        durations = sorted(s["durations"])
+        p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+        print(f"{fp}  total {s['total_ms']:.0f} ms  count {s['count']}  "
+              f"mean {s['total_ms'] / s['count']:.1f} ms  p95 {p95:.1f} ms  max {durations[-1]:.1f} ms")
+        print(f"    routes: {', '.join(sorted(r or '?' for r in s['routes']))}")
+        print(f"    {s['sql'][:300]}")
+        plan = plans.get(fp)
+        if plan:
+            root = plan[0]["Plan"]
+            print(f"    plan: {root['Node Type']}  actual {root.get('Actual Total Time', 0):.1f} ms  "
+                  f"execution {plan[0].get('Execution Time', 0):.1f} ms  "
+                  f"shared hit/read {root.get('Shared Hit Blocks', 0)}/{root.get('Shared Read Blocks', 0)}")
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Slow-query log tools")
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("--log", default=SLOW_QUERY_LOG)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+    report(args.log, args.top)
+
+
+if __name__ == "__main__":
+    main()
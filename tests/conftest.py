@@ -0,0 +1,29 @@
+"""
+Shared fixtures: a benchmark-style database on a real Postgres.
+
+Uses the usual PG* variables (as bench/run.py does) and recreates the
+TEST_DB database (default mooc_test) with the schema, migrations and a small
+fixture once per session. Tests using it are skipped when no server is
+reachable.
+"""
+import os
+import sys
+import psycopg2
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "bench")]
+
+DB_NAME = os.getenv("TEST_DB", os.getenv("EXPORT_TEST_DB", "mooc_test"))
+SIZES = {"students": 40, "enrollers": 0, "instructors": 3, "courses": 6, "per_student": 2}
+
+
+@pytest.fixture(scope="session")
+def db_name():
+    try:
+        psycopg2.connect(dbname="postgres").close()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"no Postgres available: {e}")
+    import run
+    run.setup(DB_NAME, SIZES)
+    return DB_NAME
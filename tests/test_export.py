@@ -0,0 +1,47 @@
+"""
+Partitioned exports against a real Postgres (see conftest.py).
+"""
+import io
+import zipfile
+import psycopg2
+import pyarrow.parquet as pq
+import pytest
+
+import export
+
+CASES = [(name, partition_by)
+         for name, dataset in sorted(export.DATASETS.items())
+         for partition_by, column in sorted(dataset.partition_columns.items()) if column]
+
+
+@pytest.fixture(scope="module")
+def conn(db_name):
+    conn = psycopg2.connect(dbname=db_name)
+    yield conn
+    conn.close()
+
+
+def _count(conn, name):
+    cur = conn.cursor()
+    cur.execute(f"SELECT count(*) FROM ({export.DATASETS[name].query}) q")
+    count = cur.fetchone()[0]
+    conn.rollback()
+    return count
+
+
+@pytest.mark.parametrize("name,partition_by", CASES)
+def test_partitioned_export_to_dir(conn, tmp_path, name, partition_by):
+    paths = export.export_to_dir(conn, name, str(tmp_path), "parquet", partition_by, batch_rows=7)
+    conn.rollback()
+    assert all(f"/{export.PARTITIONS[partition_by]}=" in path for path in paths)
+    assert len(paths) == len(set(paths))
+    assert sum(pq.read_table(path).num_rows for path in paths) == _count(conn, name)
+
+
+@pytest.mark.parametrize("name,partition_by", CASES)
+def test_partitioned_stream_export(conn, name, partition_by):
+    body = b"".join(export.stream_export(conn, name, "parquet", partition_by, batch_rows=7))
+    conn.rollback()
+    with zipfile.ZipFile(io.BytesIO(body)) as archive:
+        rows = sum(pq.read_table(io.BytesIO(archive.read(entry))).num_rows for entry in archive.namelist())
+    assert rows == _count(conn, name)
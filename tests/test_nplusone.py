@@ -0,0 +1,67 @@
+"""
+The N+1 detector in raise mode, against a real Postgres (see conftest.py).
+"""
+import hashlib
+import os
+import uuid
+import pytest
+
+
+def _bench_id(key):
+    # bench/seed.sql ids are md5(key)::uuid
+    return str(uuid.UUID(hashlib.md5(key.encode()).hexdigest()))
+
+
+@pytest.fixture(scope="module")
+def app_module(db_name):
+    os.environ.update({
+        "DB_HOST": os.getenv("PGHOST", "localhost"),
+        "DB_PORT": os.getenv("PGPORT", "5432"),
+        "DB_NAME": db_name,
+        "DB_USER": os.getenv("PGUSER", os.getenv("USER", "postgres")),
+        "DB_PASSWORD": os.getenv("PGPASSWORD", ""),
+    })
+    import app
+    import db
+    import nplusone
+    previous = nplusone.NPLUSONE_MODE
+    nplusone.NPLUSONE_MODE = "raise"
+    nplusone.install()
+    yield app
+    db.QUERY_HOOKS.remove(nplusone._on_query)
+    nplusone.NPLUSONE_MODE = previous
+    db.close_pool()
+
+
+def test_looped_select_raises(app_module):
+    from db import get_connection
+    from nplusone import NPLUSONE_THRESHOLD, NPlusOneError
+
+    with app_module.app.test_request_context("/api/courses"):
+        conn = get_connection()
+        cur = conn.cursor()
+        for i in range(NPLUSONE_THRESHOLD):
+            cur.execute("SELECT %s::int", (i,))
+        with pytest.raises(NPlusOneError):
+            cur.execute("SELECT %s::int", (NPLUSONE_THRESHOLD,))
+        conn.close()
+
+
+def test_course_students_stays_under_threshold(app_module):
+    from nplusone import NPLUSONE_THRESHOLD
+
+    response = app_module.app.test_client().get(
+        f"/api/instructor/courses/{_bench_id('course1')}/students",
+        query_string={"instructor_id": _bench_id("instructor1")})
+    assert response.status_code == 200, response.get_json()
+    assert len(response.get_json()["students"]) > NPLUSONE_THRESHOLD
+
+
+def test_assignment_submissions_stays_under_threshold(app_module):
+    from nplusone import NPLUSONE_THRESHOLD
+
+    response = app_module.app.test_client().get(
+        f"/api/instructor/assignments/{_bench_id('assignment1-1')}/submissions",
+        query_string={"instructor_id": _bench_id("instructor1")})
+    assert response.status_code == 200, response.get_json()
+    assert len(response.get_json()["submissions"]) > NPLUSONE_THRESHOLD
@@ -0,0 +1,105 @@
+"""
+Request capture for replay (bench/replay.py).
+
+With TRAFFIC_CAPTURE_DIR set, every request is appended as a JSON line to
+<dir>/traffic-<pid>.jsonl (rotated at TRAFFIC_MAX_BYTES): start time,
+method, route rule, path, query args, JSON body, status and duration.
+Secrets (passwords, tokens, keys) are masked in bodies and args; bodies over
+TRAFFIC_MAX_BODY bytes or not JSON are dropped. TRAFFIC_SAMPLE_RATE keeps a
+fraction of requests. /api/batch sub-requests are not captured on their own.
+"""
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from flask import g, request
+
+TRAFFIC_CAPTURE_DIR = os.getenv("TRAFFIC_CAPTURE_DIR", "")  # unset disables capture
+TRAFFIC_SAMPLE_RATE = float(os.getenv("TRAFFIC_SAMPLE_RATE", "1"))
+TRAFFIC_MAX_BYTES = int(os.getenv("TRAFFIC_MAX_BYTES", str(50 * 1024 * 1024)))
+TRAFFIC_MAX_BODY = int(os.getenv("TRAFFIC_MAX_BODY", str(64 * 1024)))
+
+# Streams and operator endpoints are not part of the replayable workload
+SKIP_ROUTES = {"/api/events", "/api/metrics", "/api/admin/profiles/<name>"}
+# _profile carried the profiling token in older clients' query strings
+SECRET_KEYS = re.compile(r"password|token|secret|api_?key|authorization|^_profile$", re.IGNORECASE)
+MASK = "***"
+
+_log = logging.getLogger("traffic")
+_log.setLevel(logging.INFO)
+_log.propagate = False
+_CAPTURE_KEY = "app.traffic"
+_handler_pid = None
+_handler_lock = threading.Lock()
+
+
+def sanitize(value):
+    """Copy of a JSON value with secret-looking keys masked"""
+    if isinstance(value, dict):
+        return {k: MASK if SECRET_KEYS.search(k) else sanitize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [sanitize(v) for v in value]
+    return value
+
+
+def start_capture():
+    # /api/batch is captured as one request; replaying its sub-requests as
+    # well would run them twice
+    if g.get("_batch_subrequest"):
+        return
+    if random.random() < TRAFFIC_SAMPLE_RATE:
+        request.environ[_CAPTURE_KEY] = (time.time(), time.perf_counter())
+
+
+def finish_capture(response):
+    started = request.environ.pop(_CAPTURE_KEY, None)
+    if started is None:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else None
+    if route in SKIP_ROUTES:
+        return response
+
+    body = None
+    if request.is_json and (request.content_length or 0) <= TRAFFIC_MAX_BODY:
+        body = sanitize(request.get_json(silent=True))
+    _ensure_handler()
+    args = {k: [MASK] * len(v) if SECRET_KEYS.search(k) else v for k, v in request.args.lists()}
+    _log.info(json.dumps({
+        "ts": started[0],
+        "method": request.method,
+        "route": route,
+        "path": request.path,
+        "args": args,
+        "body": body,
+        "status": response.status_code,
+        "duration_ms": round((time.perf_counter() - started[1]) * 1000, 2),
+    }, default=str))
+    return response
+
+
+def _ensure_handler():
+    # One file per worker process, opened after fork: rotation is not safe
+    # across processes
+    global _handler_pid
+    if _handler_pid == os.getpid():
+        return
+    with _handler_lock:
+        if _handler_pid != os.getpid():
+            os.makedirs(TRAFFIC_CAPTURE_DIR, exist_ok=True)
+            handler = RotatingFileHandler(os.path.join(TRAFFIC_CAPTURE_DIR, f"traffic-{os.getpid()}.jsonl"),
+                                          maxBytes=TRAFFIC_MAX_BYTES, backupCount=10)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _log.handlers = [handler]
+            _handler_pid = os.getpid()
+
+
+def init_app(app):
+    """Install the capture hooks when TRAFFIC_CAPTURE_DIR is set"""
+    if not TRAFFIC_CAPTURE_DIR:
+        return
+    app.before_request(start_capture)
+    app.after_request(finish_capture)